@@ -0,0 +1,44 @@
+import argparse
+from src.config import Config
+from src.db.database import SessionLocal
+from src.history_logs.archive import history_log_archive
+
+
+def run(retention_months: int, months_ahead: int, dry_run: bool):
+    """
+    Add the partitions of the coming months and archive the months past the retention.
+
+    Meant to run from cron once a day; both steps do nothing when there is nothing to do.
+    """
+    with SessionLocal() as db:
+        if not history_log_archive.partitioned(db):
+            print("history_logs is not partitioned, nothing to do")
+            return
+
+        expired = history_log_archive.expired_partitions(db, retention_months)
+        if dry_run:
+            months = ", ".join(f"{month:%Y-%m}" for month in expired)
+            print(f"Would archive: {months or 'nothing'}")
+            return
+
+        created = history_log_archive.ensure_partitions(db, months_ahead)
+        print(f"Partitions created: {', '.join(created) or 'none'}")
+        for month in expired:
+            rows = history_log_archive.archive_month(db, month)
+            print(f"Archived {rows} history logs of {month:%Y-%m}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Maintain the monthly partitions of history_logs and archive old months."
+    )
+    parser.add_argument(
+        "--retention-months",
+        type=int,
+        default=Config.HISTORY_LOG_RETENTION_MONTHS,
+        help="Months, including the current one, kept in the table",
+    )
+    parser.add_argument("--months-ahead", type=int, default=2)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    run(args.retention_months, args.months_ahead, args.dry_run)
@@ -0,0 +1,68 @@
+import argparse
+import time
+from sqlalchemy import bindparam, select, update
+from src.db.database import SessionLocal
+from src.db.models import HistoryLog
+from src.history_logs.prompts import FULL, COMPRESSED, prompt_storage
+
+
+def backfill(mode: str, batch_size: int, pause: float):
+    """
+    Rewrite the prompts of existing history logs in the given storage form.
+
+    "compressed" compresses rows still stored as text; "full" restores the text of
+    compressed rows (e.g. before downgrading). Rows stored as references have no text
+    to compress and are left as they are.
+    """
+    if mode == COMPRESSED:
+        column = HistoryLog.prompt
+    else:
+        column = HistoryLog.prompt_blob
+
+    last_id, converted = 0, 0
+    started_at = time.time()
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(HistoryLog.id, HistoryLog.prompt, HistoryLog.prompt_blob)
+                .where(HistoryLog.id > last_id, column.isnot(None))
+                .order_by(HistoryLog.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            values = []
+            for row in rows:
+                if mode == COMPRESSED:
+                    text, blob = None, prompt_storage.compress(row.prompt)
+                else:
+                    text, blob = prompt_storage.decompress(row.prompt_blob), None
+                values.append({"log_id": row.id, "text": text, "blob": blob})
+            db.connection().execute(
+                update(HistoryLog.__table__)
+                .where(HistoryLog.__table__.c.id == bindparam("log_id"))
+                .values(prompt=bindparam("text"), prompt_blob=bindparam("blob")),
+                values,
+            )
+            db.commit()
+
+        last_id = rows[-1].id
+        converted += len(rows)
+        elapsed = time.time() - started_at
+        print(f"{converted} prompts rewritten (last id {last_id}, {elapsed:.0f}s)")
+        time.sleep(pause)
+
+    print(f"Backfill finished: {converted} prompts rewritten as {mode}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rewrite stored history log prompts as compressed (or back to full text)."
+    )
+    parser.add_argument("--mode", choices=[COMPRESSED, FULL], default=COMPRESSED)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--pause", type=float, default=0.1, help="Seconds to wait between batches"
+    )
+    args = parser.parse_args()
+    backfill(args.mode, args.batch_size, args.pause)
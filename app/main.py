@@ -1,6 +1,9 @@
 from fastapi import FastAPI, UploadFile
+from prometheus_client import make_asgi_app
 from src.utils.firebase import init_firebase
 from src.db.database import init_db
+from src.history_logs.writer import history_log_writer
+from src.history_logs.purge import history_log_purger
 from src.characters.controller import char_router
 from src.auth.controller import auth_router
 from src.chat.controller import chat_router
@@ -16,8 +19,12 @@ API_VERSION = "v1"
 
 def lifespan(app: FastAPI):
     init_db()
+    history_log_writer.start()
+    history_log_purger.start()
     yield
     print("server is stopping")
+    history_log_purger.stop()
+    history_log_writer.stop()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -31,4 +38,5 @@ app.include_router(
 app.include_router(auth_router, prefix=f"/api/{API_VERSION}/auth", tags=["auth"])
 app.include_router(chat_router, prefix=f"/api/{API_VERSION}/chat", tags=["chat"])
 app.include_router(log_router, prefix=f"/api/{API_VERSION}/log", tags=["log"])
-app.include_router(pay_router, prefix=f"/api/{API_VERSION}/pay", tags=["pay"])
\ No newline at end of file
+app.include_router(pay_router, prefix=f"/api/{API_VERSION}/pay", tags=["pay"])
+app.mount("/metrics", make_asgi_app())
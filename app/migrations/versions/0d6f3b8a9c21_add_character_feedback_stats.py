@@ -0,0 +1,41 @@
+"""add_character_feedback_stats
+
+Revision ID: 0d6f3b8a9c21
+Revises: e91d27b4a6f8
+Create Date: 2026-10-19 12:04:39.650183
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0d6f3b8a9c21'
+down_revision: Union[str, None] = 'e91d27b4a6f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('character_feedback_stats',
+    sa.Column('character_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('chats', sa.Integer(), nullable=False),
+    sa.Column('likes', sa.Integer(), nullable=False),
+    sa.Column('dislikes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['character_id'], ['characters.id'], ),
+    sa.PrimaryKeyConstraint('character_id', 'day')
+    )
+    # Seed the counters from the existing logs; from now on they are kept up to date incrementally
+    op.execute(
+        "INSERT INTO character_feedback_stats (character_id, day, chats, likes, dislikes) "
+        "SELECT character_id, DATE(created_at), COUNT(*), "
+        "SUM(CASE WHEN feedback = 'like' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN feedback = 'dislike' THEN 1 ELSE 0 END) "
+        "FROM history_logs GROUP BY character_id, DATE(created_at)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('character_feedback_stats')
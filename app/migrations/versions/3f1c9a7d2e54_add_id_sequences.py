@@ -0,0 +1,33 @@
+"""add_id_sequences
+
+Revision ID: 3f1c9a7d2e54
+Revises: 48b02dbc4f89
+Create Date: 2026-10-19 09:12:41.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2e54'
+down_revision: Union[str, None] = '48b02dbc4f89'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('id_sequences',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('next_id', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute(
+        "INSERT INTO id_sequences (name, next_id) "
+        "SELECT 'history_logs', COALESCE(MAX(id), 0) + 1 FROM history_logs"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('id_sequences')
@@ -0,0 +1,71 @@
+"""partition_history_logs
+
+Revision ID: 5a7c2e9d4b13
+Revises: 0d6f3b8a9c21
+Create Date: 2026-10-19 15:21:08.412577
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7c2e9d4b13'
+down_revision: Union[str, None] = '0d6f3b8a9c21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _month(day, offset=0):
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    op.create_table('history_log_archives',
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('location', sa.String(length=1024), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.PrimaryKeyConstraint('month')
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        # Only MySQL is partitioned; elsewhere the table keeps its single-column key
+        return
+
+    # Partitioned tables cannot have foreign keys, and every unique key must contain
+    # the partitioning column
+    for foreign_key in sa.inspect(bind).get_foreign_keys('history_logs'):
+        op.drop_constraint(foreign_key['name'], 'history_logs', type_='foreignkey')
+    op.execute('ALTER TABLE history_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)')
+
+    oldest = bind.execute(sa.text('SELECT MIN(created_at) FROM history_logs')).scalar()
+    month = _month(oldest or date.today())
+    last = _month(date.today(), 2)
+    partitions = []
+    while month <= last:
+        partitions.append(
+            f"PARTITION p{month:%Y%m} VALUES LESS THAN (UNIX_TIMESTAMP('{_month(month, 1)}'))"
+        )
+        month = _month(month, 1)
+    partitions.append('PARTITION pmax VALUES LESS THAN MAXVALUE')
+    op.execute(
+        'ALTER TABLE history_logs PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) ('
+        + ', '.join(partitions)
+        + ')'
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'mysql':
+        # Archived months are not restored; they stay in their Parquet files
+        op.execute('ALTER TABLE history_logs REMOVE PARTITIONING')
+        op.execute('ALTER TABLE history_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id)')
+        op.create_foreign_key(None, 'history_logs', 'user_accounts', ['user_id'], ['uid'])
+        op.create_foreign_key(None, 'history_logs', 'characters', ['character_id'], ['id'])
+    op.drop_table('history_log_archives')
@@ -0,0 +1,27 @@
+"""add_history_log_indexes
+
+Revision ID: 7b2e4d91c0a3
+Revises: 3f1c9a7d2e54
+Create Date: 2026-10-19 10:02:17.264019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e4d91c0a3'
+down_revision: Union[str, None] = '3f1c9a7d2e54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_history_logs_user_created', 'history_logs', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_history_logs_character_created', 'history_logs', ['character_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_history_logs_character_created', table_name='history_logs')
+    op.drop_index('ix_history_logs_user_created', table_name='history_logs')
@@ -0,0 +1,51 @@
+"""add_history_log_search
+
+Revision ID: 8e4b1f6c2d95
+Revises: 5a7c2e9d4b13
+Create Date: 2026-10-19 16:48:52.093114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4b1f6c2d95'
+down_revision: Union[str, None] = '5a7c2e9d4b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('history_log_search',
+    sa.Column('log_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('character_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+    sa.Column('question', sa.Text(), nullable=False),
+    sa.Column('answer', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('log_id')
+    )
+    op.create_index('ix_history_log_search_character_created', 'history_log_search', ['character_id', 'created_at'], unique=False)
+    op.create_index('ix_history_log_search_created', 'history_log_search', ['created_at', 'log_id'], unique=False)
+    op.execute(
+        'INSERT INTO history_log_search (log_id, character_id, created_at, question, answer) '
+        'SELECT id, character_id, created_at, question, answer FROM history_logs'
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'mysql':
+        # Built after the backfill, which is much faster than maintaining it row by row
+        op.create_index('ix_history_log_search_text', 'history_log_search', ['question', 'answer'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    elif bind.dialect.name == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE history_log_search_fts "
+            "USING fts5(question, answer, content='history_log_search', content_rowid='log_id')"
+        )
+        op.execute("INSERT INTO history_log_search_fts (history_log_search_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE history_log_search_fts')
+    op.drop_table('history_log_search')
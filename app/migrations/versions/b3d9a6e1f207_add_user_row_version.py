@@ -0,0 +1,25 @@
+"""add_user_row_version
+
+Revision ID: b3d9a6e1f207
+Revises: 8e4b1f6c2d95
+Create Date: 2026-10-19 18:02:17.538240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3d9a6e1f207'
+down_revision: Union[str, None] = '8e4b1f6c2d95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_accounts', sa.Column('row_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('user_accounts', 'row_version')
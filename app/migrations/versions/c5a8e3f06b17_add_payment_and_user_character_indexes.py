@@ -0,0 +1,27 @@
+"""add_payment_and_user_character_indexes
+
+Revision ID: c5a8e3f06b17
+Revises: 7b2e4d91c0a3
+Create Date: 2026-10-19 10:41:53.802716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a8e3f06b17'
+down_revision: Union[str, None] = '7b2e4d91c0a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_payments_user_created', 'payments', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_user_character_character_user', 'user_character', ['character_id', 'user_uid'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_character_character_user', table_name='user_character')
+    op.drop_index('ix_payments_user_created', table_name='payments')
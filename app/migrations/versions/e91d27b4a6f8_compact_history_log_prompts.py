@@ -0,0 +1,41 @@
+"""compact_history_log_prompts
+
+Revision ID: e91d27b4a6f8
+Revises: c5a8e3f06b17
+Create Date: 2026-10-19 11:26:08.117942
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e91d27b4a6f8'
+down_revision: Union[str, None] = 'c5a8e3f06b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('prompt_templates',
+    sa.Column('version', sa.String(length=16), nullable=False),
+    sa.Column('template', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.PrimaryKeyConstraint('version')
+    )
+    op.add_column('history_logs', sa.Column('prompt_blob', sa.LargeBinary(length=16777215), nullable=True))
+    op.add_column('history_logs', sa.Column('prompt_ref', sa.JSON(), nullable=True))
+    op.alter_column('history_logs', 'prompt',
+               existing_type=sa.Text(),
+               nullable=True)
+
+
+def downgrade() -> None:
+    # Run `python backfill_prompts.py --mode full` first so every row has its text again
+    op.alter_column('history_logs', 'prompt',
+               existing_type=sa.Text(),
+               nullable=False)
+    op.drop_column('history_logs', 'prompt_ref')
+    op.drop_column('history_logs', 'prompt_blob')
+    op.drop_table('prompt_templates')
@@ -0,0 +1,60 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from src.config import Config
+from src.db.database import SessionLocal
+from src.db.models import HistoryLog
+from src.history_logs.purge import HistoryLogPurger
+
+
+def run(days: int, batch_size: int, pause: float, dry_run: bool):
+    """
+    Delete the history logs older than `days` days, in small batches.
+    """
+    older_than = datetime.now() - timedelta(days=days)
+    if dry_run:
+        with SessionLocal() as db:
+            count = db.execute(
+                select(func.count())
+                .select_from(HistoryLog)
+                .where(HistoryLog.created_at < older_than)
+            ).scalar()
+        print(f"Would delete {count} history logs created before {older_than:%Y-%m-%d %H:%M}")
+        return
+
+    started_at = time.time()
+
+    def progress(deleted: int, last_id: int):
+        elapsed = time.time() - started_at
+        print(f"{deleted} history logs deleted (last id {last_id}, {elapsed:.0f}s)")
+
+    purger = HistoryLogPurger(batch_size=batch_size, pause=pause)
+    deleted = purger.purge(older_than, progress)
+    print(f"Purge finished: {deleted} history logs deleted")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Delete history logs older than a retention period, in small batches."
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=Config.HISTORY_LOG_RETENTION_DAYS,
+        help="Delete logs older than this many days",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=Config.HISTORY_LOG_PURGE_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=Config.HISTORY_LOG_PURGE_PAUSE_MS / 1000,
+        help="Seconds to wait between batches",
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if args.days <= 0:
+        parser.error("--days must be positive")
+    run(args.days, args.batch_size, args.pause, args.dry_run)
@@ -3,6 +3,8 @@ from src.db.database import SessionLocal
 from src.characters.service import CharacterService
 from src.characters.schemas import CharacterCreate
 from fastapi import UploadFile
+from starlette.datastructures import Headers
+import asyncio
 import mimetypes
 from tempfile import SpooledTemporaryFile
 import os
@@ -16,7 +18,12 @@ def create_upload_file(file_path: str) -> UploadFile:
     temp_file = SpooledTemporaryFile()
     temp_file.write(content)
     temp_file.seek(0)
-    upload_file = UploadFile(file=temp_file, filename=os.path.basename(file_path))
+    content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    upload_file = UploadFile(
+        file=temp_file,
+        filename=os.path.basename(file_path),
+        headers=Headers({"content-type": content_type}),
+    )
     return upload_file
 
 
@@ -47,8 +54,10 @@ def seed_characters():
             image_path = os.path.join("images/character", image_name)
             profile_image = create_upload_file(image_path)
             background_image = create_upload_file(image_path)
-            character_service.update_images(
-                created_character.id, profile_image, background_image, db
+            asyncio.run(
+                character_service.update_images(
+                    created_character.id, profile_image, background_image, db
+                )
             )
             print("Seed characters successfully!")
         except Exception as e:
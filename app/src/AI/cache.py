@@ -0,0 +1,120 @@
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Optional, Tuple
+from src.config import Config
+from .prompt import Prompt
+from src.utils.redis import redis_client
+
+CACHE_PREFIX = "answer"
+
+
+class AnswerCache:
+    """
+    Bộ nhớ đệm câu trả lời của từng nhân vật, lưu trong Redis.
+
+    Khóa cache gồm tên rút gọn của nhân vật, phiên bản dữ liệu của nhân vật và câu hỏi đã
+    chuẩn hóa. Khi dữ liệu của nhân vật thay đổi, gọi `invalidate` để tăng phiên bản và bỏ qua
+    toàn bộ câu trả lời cũ mà không cần xóa từng khóa.
+    """
+
+    def __init__(self, ttl: int = Config.ANSWER_CACHE_TTL):
+        self.ttl = ttl
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """
+        Chuẩn hóa câu hỏi để các cách viết khác nhau về khoảng trắng, chữ hoa và dấu câu
+        cuối câu dùng chung một khóa cache.
+
+        Parameters:
+        - question (str): Câu hỏi gốc.
+
+        Returns:
+        - str: Câu hỏi đã chuẩn hóa.
+        """
+        question = unicodedata.normalize("NFC", question).lower()
+        question = re.sub(r"\s+", " ", question).strip()
+        return question.rstrip(" ?!.…")
+
+    @staticmethod
+    def version(character_short_name: str) -> int:
+        """
+        Lấy phiên bản dữ liệu hiện tại của nhân vật.
+
+        Parameters:
+        - character_short_name (str): Tên rút gọn của nhân vật.
+
+        Returns:
+        - int: Phiên bản dữ liệu (0 nếu chưa từng bị vô hiệu hóa).
+        """
+        return int(redis_client.get(f"{CACHE_PREFIX}:{character_short_name}:version") or 0)
+
+    @staticmethod
+    def invalidate(character_short_name: str) -> int:
+        """
+        Vô hiệu hóa toàn bộ câu trả lời đã lưu của nhân vật.
+
+        Parameters:
+        - character_short_name (str): Tên rút gọn của nhân vật.
+
+        Returns:
+        - int: Phiên bản dữ liệu mới.
+        """
+        return redis_client.incr(f"{CACHE_PREFIX}:{character_short_name}:version")
+
+    @staticmethod
+    def digest(question: str) -> str:
+        """
+        Mã băm của câu hỏi đã chuẩn hóa, dùng làm khóa cho các câu hỏi giống nhau.
+
+        Parameters:
+        - question (str): Câu hỏi gốc.
+
+        Returns:
+        - str: Mã băm SHA-1 dạng hex.
+        """
+        return hashlib.sha1(AnswerCache.normalize(question).encode("utf-8")).hexdigest()
+
+    def _key(self, character_short_name: str, question: str) -> str:
+        version = self.version(character_short_name)
+        return f"{CACHE_PREFIX}:{character_short_name}:{version}:{self.digest(question)}"
+
+    def get(self, character_short_name: str, question: str) -> Optional[Tuple[str, str]]:
+        """
+        Tìm câu trả lời đã lưu cho câu hỏi.
+
+        Parameters:
+        - character_short_name (str): Tên rút gọn của nhân vật.
+        - question (str): Câu hỏi của người dùng.
+
+        Returns:
+        - Optional[Tuple[str, str]]: Prompt (kèm thông tin tham chiếu nếu có) và câu trả lời
+          nếu có trong cache, ngược lại None.
+        """
+        cached = redis_client.get(self._key(character_short_name, question))
+        if cached is None:
+            return None
+        data = json.loads(cached)
+        return Prompt(data["prompt"], data.get("reference")), data["answer"]
+
+    def set(self, character_short_name: str, question: str, prompt: str, answer: str) -> None:
+        """
+        Lưu câu trả lời của câu hỏi vào cache.
+
+        Parameters:
+        - character_short_name (str): Tên rút gọn của nhân vật.
+        - question (str): Câu hỏi của người dùng.
+        - prompt (str): Prompt đã dùng để sinh câu trả lời.
+        - answer (str): Câu trả lời của mô hình.
+        """
+        data = json.dumps(
+            {
+                "prompt": prompt,
+                "answer": answer,
+                "reference": getattr(prompt, "reference", None),
+            },
+            ensure_ascii=False,
+        )
+        redis_client.set(self._key(character_short_name, question), data, ex=self.ttl)
@@ -0,0 +1,66 @@
+import hashlib
+from typing import Any, Dict, List, Optional
+
+PROMPT_TEMPLATE_PATH = "src/prompt.txt"
+
+
+def load_template() -> str:
+    """
+    Đọc mẫu prompt hiện tại.
+
+    Returns:
+    - str: Nội dung mẫu prompt.
+    """
+    with open(PROMPT_TEMPLATE_PATH, "r", encoding="utf-8") as file:
+        return file.read().strip()
+
+
+def template_version(template: str) -> str:
+    """
+    Phiên bản của mẫu prompt, là mã băm của nội dung mẫu.
+
+    Parameters:
+    - template (str): Nội dung mẫu prompt.
+
+    Returns:
+    - str: 16 ký tự đầu của mã băm SHA-1.
+    """
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:16]
+
+
+class Prompt(str):
+    """
+    Prompt đã định dạng, kèm thông tin đủ để dựng lại prompt mà không cần lưu toàn văn.
+
+    `reference` gồm phiên bản mẫu prompt ("template"), id các tài liệu tìm được ("doc_ids")
+    và lịch sử hội thoại ("history"); cùng với câu hỏi và nhân vật, prompt có thể được dựng
+    lại bằng `AIService.build_prompt`.
+    """
+
+    reference: Optional[Dict[str, Any]]
+
+    def __new__(cls, text: str, reference: Optional[Dict[str, Any]] = None):
+        prompt = super().__new__(cls, text)
+        prompt.reference = reference
+        return prompt
+
+
+def make_reference(
+    template: str, search_result: List[Dict[str, Any]], history: str
+) -> Dict[str, Any]:
+    """
+    Tạo thông tin tham chiếu của một prompt.
+
+    Parameters:
+    - template (str): Mẫu prompt đã dùng.
+    - search_result (List[Dict[str, Any]]): Các tài liệu đã đưa vào prompt.
+    - history (str): Lịch sử hội thoại đã đưa vào prompt.
+
+    Returns:
+    - Dict[str, Any]: Thông tin tham chiếu, dùng cho `Prompt.reference`.
+    """
+    return {
+        "template": template_version(template),
+        "doc_ids": [doc["id"] for doc in search_result],
+        "history": history,
+    }
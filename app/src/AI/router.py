@@ -0,0 +1,107 @@
+import re
+from typing import Any, Dict, List, Optional
+from src.config import Config
+
+SMALL = "small"
+LARGE = "large"
+
+# Câu hỏi tra cứu sự kiện ngắn gọn, mô hình nhỏ trả lời đủ tốt
+FACTUAL_PATTERNS = [
+    r"\bnăm nào\b",
+    r"\bnăm bao nhiêu\b",
+    r"\bkhi nào\b",
+    r"\bngày nào\b",
+    r"\bở đâu\b",
+    r"\bquê\b",
+    r"\blà ai\b",
+    r"\bai là\b",
+    r"\bbao nhiêu\b",
+    r"\bmấy\b",
+    r"\btên (là )?gì\b",
+    r"\blà gì\b",
+    r"\bcó\b.*\bkhông\W*$",
+]
+
+# Câu hỏi cần lập luận, phân tích hoặc trả lời dài, cần mô hình lớn
+COMPLEX_PATTERNS = [
+    r"\btại sao\b",
+    r"\bvì sao\b",
+    r"\blý do\b",
+    r"\bnhư thế nào\b",
+    r"\bthế nào\b",
+    r"\bra sao\b",
+    r"\bphân tích\b",
+    r"\bso sánh\b",
+    r"\bđánh giá\b",
+    r"\btrình bày\b",
+    r"\bgiải thích\b",
+    r"\bkể (về|lại)\b",
+    r"\bý nghĩa\b",
+    r"\bbài học\b",
+    r"\bsuy nghĩ\b",
+    r"\bcảm nghĩ\b",
+]
+
+
+class ModelRouter:
+    """
+    Chọn mô hình cho từng câu hỏi: câu hỏi ngắn, tra cứu sự kiện và có tài liệu khớp tốt
+    được gửi đến mô hình nhỏ; các câu hỏi còn lại dùng mô hình lớn.
+    """
+
+    def __init__(
+        self,
+        max_words: int = Config.LLM_SMALL_MAX_WORDS,
+        min_score: float = Config.LLM_SMALL_MIN_SCORE,
+        overrides: Optional[Dict[str, str]] = None,
+    ):
+        self.max_words = max_words
+        self.min_score = min_score
+        self.overrides = overrides if overrides is not None else Config.LLM_ROUTE_OVERRIDES
+
+    @staticmethod
+    def model(route: str) -> str:
+        """
+        Lấy tên mô hình tương ứng với route.
+
+        Parameters:
+        - route (str): "small" hoặc "large".
+
+        Returns:
+        - str: Tên mô hình trên Ollama.
+        """
+        return Config.LLM_SMALL_MODEL if route == SMALL else Config.LLM_LARGE_MODEL
+
+    def route(
+        self,
+        question: str,
+        search_result: List[Dict[str, Any]],
+        character_short_name: Optional[str] = None,
+    ) -> str:
+        """
+        Chọn route cho câu hỏi dựa trên cấu hình của nhân vật, độ dài và loại câu hỏi,
+        và độ tin cậy của kết quả tìm kiếm.
+
+        Parameters:
+        - question (str): Câu hỏi từ người dùng.
+        - search_result (List[Dict[str, Any]]): Kết quả tìm kiếm, có trường "score".
+        - character_short_name (Optional[str]): Tên rút gọn của nhân vật.
+
+        Returns:
+        - str: "small" hoặc "large".
+        """
+        override = self.overrides.get(character_short_name or "")
+        if override in (SMALL, LARGE):
+            return override
+
+        text = question.lower()
+        if len(text.split()) > self.max_words:
+            return LARGE
+        if any(re.search(pattern, text) for pattern in COMPLEX_PATTERNS):
+            return LARGE
+
+        factual = any(re.search(pattern, text) for pattern in FACTUAL_PATTERNS)
+        top_score = max((doc.get("score") or 0.0 for doc in search_result), default=0.0)
+        if factual or top_score >= self.min_score:
+            return SMALL
+        return LARGE
@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from redis.exceptions import RedisError
+from src.config import Config
+from src.metrics import LLM_QUEUE_DEPTH, LLM_BUDGET_LEVEL
+from src.utils.redis import redis_client
+
+HIGH = "high"
+LOW = "low"
+
+# Sorted set các lượt sinh ưu tiên cao đang chờ hoặc đang chạy, của mọi tiến trình
+INFLIGHT_KEY = "llm:inflight"
+
+# Hệ số nhân max_tokens theo mức tải; mức 0 là tải bình thường
+BUDGET_FACTORS = [1.0, 0.75, 0.5, 0.35]
+# Ngưỡng áp lực (so với ngưỡng cấu hình) để chuyển lên từng mức
+LEVEL_THRESHOLDS = [0.0, 1.0, 1.5, 2.0]
+# Chỉ nới lỏng khi áp lực giảm xuống dưới tỷ lệ này của ngưỡng mức hiện tại
+RELAX_RATIO = 0.8
+
+
+class LLMScheduler:
+    """
+    Giới hạn số lượt sinh đồng thời gửi tới LLM và theo dõi tải hiện tại.
+
+    Giới hạn và số liệu tải được tính trong từng tiến trình. Để công việc nền (ví dụ job
+    warm-up, chạy trong tiến trình riêng) không làm chậm API, mỗi lượt sinh ưu tiên cao
+    được ghi vào một sorted set trong Redis trong lúc chờ và chạy; yêu cầu ưu tiên thấp chỉ
+    bắt đầu khi tập này rỗng và không còn yêu cầu ưu tiên cao nào chờ trong tiến trình.
+    Lượt sinh ưu tiên thấp đã bắt đầu thì không bị ngắt, nên API chỉ phải chờ tối đa các
+    lượt đang chạy đó.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = Config.LLM_MAX_CONCURRENCY,
+        window: int = 200,
+        inflight_ttl: int = Config.LLM_INFLIGHT_TTL,
+        poll_interval: float = Config.LLM_YIELD_POLL_INTERVAL,
+    ):
+        self.max_concurrency = max_concurrency
+        self.inflight_ttl = inflight_ttl
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._running = 0
+        self._waiting = {HIGH: 0, LOW: 0}
+        self._latencies = deque(maxlen=window)
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Số lượt sinh đang chạy cộng số lượt đang chờ.
+        """
+        with self._condition:
+            return self._running + self._waiting[HIGH] + self._waiting[LOW]
+
+    def _can_run(self, priority: str) -> bool:
+        if self._running >= self.max_concurrency:
+            return False
+        return priority == HIGH or self._waiting[HIGH] == 0
+
+    def shared_demand(self) -> int:
+        """
+        Số lượt sinh ưu tiên cao đang chờ hoặc đang chạy trong mọi tiến trình. Mục của một
+        tiến trình bị dừng đột ngột hết hạn sau `inflight_ttl` giây.
+        """
+        try:
+            pipe = redis_client.pipeline()
+            pipe.zremrangebyscore(INFLIGHT_KEY, "-inf", time.time() - self.inflight_ttl)
+            pipe.zcard(INFLIGHT_KEY)
+            return pipe.execute()[1]
+        except RedisError as e:
+            logging.warning(f"LLM in-flight set unavailable: {e}")
+            return 0
+
+    def _announce(self) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            pipe = redis_client.pipeline()
+            pipe.zadd(INFLIGHT_KEY, {token: time.time()})
+            pipe.expire(INFLIGHT_KEY, self.inflight_ttl)
+            pipe.execute()
+            return token
+        except RedisError as e:
+            logging.warning(f"LLM in-flight set unavailable: {e}")
+            return None
+
+    def _retire(self, token: Optional[str]) -> None:
+        if token is None:
+            return
+        try:
+            redis_client.zrem(INFLIGHT_KEY, token)
+        except RedisError as e:
+            logging.warning(f"LLM in-flight set unavailable: {e}")
+
+    @contextmanager
+    def slot(self, priority: str = HIGH):
+        """
+        Chờ đến lượt gửi yêu cầu tới LLM và ghi nhận thời gian xử lý.
+
+        Parameters:
+        - priority (str): "high" cho yêu cầu của người dùng, "low" cho công việc nền.
+        """
+        token = self._announce() if priority == HIGH else None
+        try:
+            if priority == LOW:
+                # Nhường cả các yêu cầu của người dùng đang được xử lý ở tiến trình khác
+                while self.shared_demand() > 0:
+                    time.sleep(self.poll_interval)
+
+            with self._condition:
+                self._waiting[priority] += 1
+                self._update_depth()
+                try:
+                    self._condition.wait_for(lambda: self._can_run(priority))
+                finally:
+                    self._waiting[priority] -= 1
+                self._running += 1
+
+            started_at = time.perf_counter()
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - started_at
+                with self._condition:
+                    self._running -= 1
+                    self._latencies.append(elapsed)
+                    self._update_depth()
+                    self._condition.notify_all()
+        finally:
+            self._retire(token)
+
+    def p95(self) -> float:
+        """
+        Độ trễ p95 (giây) của các lượt sinh gần nhất, 0 nếu chưa có số liệu.
+        """
+        with self._condition:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def _update_depth(self) -> None:
+        LLM_QUEUE_DEPTH.set(self._running + self._waiting[HIGH] + self._waiting[LOW])
+
+
+class GenerationPolicy:
+    """
+    Xác định giới hạn sinh (max_tokens, temperature, top_p) cho từng lượt gọi LLM.
+
+    Ngân sách max_tokens của mỗi nhân vật được thu hẹp dần khi hàng đợi LLM dài ra hoặc
+    độ trễ p95 vượt mục tiêu, và được nới lỏng từng mức khi tải giảm.
+
+    Độ dài hàng đợi và p95 lấy từ `scheduler` của tiến trình hiện tại, không phải số liệu
+    toàn cục: với nhiều worker, mỗi worker tự điều chỉnh theo tải của riêng nó và
+    `queue_threshold` là ngưỡng cho một worker.
+    """
+
+    def __init__(
+        self,
+        scheduler: LLMScheduler,
+        max_tokens: int = Config.LLM_MAX_TOKENS,
+        min_max_tokens: int = Config.LLM_MIN_MAX_TOKENS,
+        queue_threshold: int = Config.LLM_QUEUE_THRESHOLD,
+        latency_target: float = Config.LLM_LATENCY_TARGET,
+        overrides: Optional[Dict[str, Dict[str, float]]] = None,
+    ):
+        self.scheduler = scheduler
+        self.max_tokens = max_tokens
+        self.min_max_tokens = min_max_tokens
+        self.queue_threshold = queue_threshold
+        self.latency_target = latency_target
+        self.overrides = (
+            overrides if overrides is not None else Config.LLM_GENERATION_OVERRIDES
+        )
+        self.level = 0
+        self._lock = threading.Lock()
+
+    def pressure(self) -> float:
+        """
+        Mức áp lực hiện tại so với ngưỡng cấu hình (1.0 nghĩa là vừa chạm ngưỡng).
+        """
+        queue_pressure = self.scheduler.queue_depth / max(self.queue_threshold, 1)
+        latency_pressure = self.scheduler.p95() / max(self.latency_target, 0.001)
+        return max(queue_pressure, latency_pressure)
+
+    def update_level(self) -> int:
+        """
+        Cập nhật mức ngân sách theo tải: tăng ngay khi tải cao, giảm từng mức khi tải
+        giảm đủ sâu để tránh dao động quanh ngưỡng.
+
+        Returns:
+        - int: Mức ngân sách hiện tại (0 là không giới hạn thêm).
+        """
+        pressure = self.pressure()
+        target = max(
+            level
+            for level, threshold in enumerate(LEVEL_THRESHOLDS)
+            if pressure >= threshold
+        )
+        with self._lock:
+            if target > self.level:
+                self.level = target
+            elif (
+                target < self.level
+                and pressure < LEVEL_THRESHOLDS[self.level] * RELAX_RATIO
+            ):
+                self.level -= 1
+            LLM_BUDGET_LEVEL.set(self.level)
+            return self.level
+
+    def params(self, character_short_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Tham số sinh cho một lượt gọi LLM.
+
+        Parameters:
+        - character_short_name (Optional[str]): Tên rút gọn của nhân vật để áp dụng cấu hình riêng.
+
+        Returns:
+        - Dict[str, Any]: Các tham số truyền vào `chat.completions.create`.
+        """
+        override = self.overrides.get(character_short_name or "", {})
+        max_tokens = override.get("max_tokens", self.max_tokens)
+        level = self.update_level()
+        params = {
+            "max_tokens": max(
+                self.min_max_tokens, int(max_tokens * BUDGET_FACTORS[level])
+            )
+        }
+        for name in ("temperature", "top_p"):
+            if name in override:
+                params[name] = override[name]
+        return params
@@ -1,6 +1,16 @@
-from typing import List, Dict, Any, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Iterator, Union
 from .setup import get_collection, tokenize_model, llm_model
+from .router import ModelRouter, SMALL, LARGE
+from .prompt import Prompt, load_template, make_reference
+from .scheduler import LLMScheduler, GenerationPolicy, HIGH
 from pymilvus import Collection
+from src.metrics import LLM_REQUESTS, LLM_LATENCY, LLM_ERRORS
+
+model_router = ModelRouter()
+llm_scheduler = LLMScheduler()
+generation_policy = GenerationPolicy(llm_scheduler)
 
 
 class AIService:
@@ -26,33 +36,106 @@ class AIService:
         - collection (Collection): Đối tượng collection từ Milvus để thực hiện tìm kiếm.
 
         Returns:
-        - List[Dict[str, Any]]: Danh sách các tài liệu chứa thông tin tìm được.
+        - List[Dict[str, Any]]: Danh sách các tài liệu chứa thông tin tìm được, kèm điểm
+          tương đồng "score".
+        """
+        return AIService.search_batch(field, [question], collection)[0]
+
+    @staticmethod
+    def search_batch(
+        field: str, questions: List[str], collection: Collection
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Tìm kiếm cho nhiều câu hỏi cùng lúc: mã hóa tất cả câu hỏi trong một lần gọi mô hình
+        và thực hiện một lượt tìm kiếm duy nhất trên Milvus.
+
+        Parameters:
+        - field (str): Tên trường vector trong collection để tìm kiếm.
+        - questions (List[str]): Các câu hỏi cần tìm kiếm.
+        - collection (Collection): Đối tượng collection từ Milvus để thực hiện tìm kiếm.
+
+        Returns:
+        - List[List[Dict[str, Any]]]: Kết quả tìm kiếm của từng câu hỏi, theo đúng thứ tự.
         """
-        v_q = tokenize_model.encode(question)
+        vectors = tokenize_model.encode(questions)
         res = collection.search(
             anns_field=field,
             param={"metric_type": "IP", "params": {}},
-            data=[v_q],
+            data=list(vectors),
             output_fields=["id", "text", "question"],
             limit=5,
         )
-        result_docs = []
+        results = []
 
         for hits in res:
+            result_docs = []
             for hit in hits:
                 hit_dict = {
                     "id": hit.entity.get("id"),
                     "text": hit.entity.get("text"),
                     "question": hit.entity.get("question"),
+                    "score": hit.distance,
                 }
                 result_docs.append(hit_dict)
+            results.append(result_docs)
+
+        return results
+
+    @staticmethod
+    def get_documents(collection: Collection, ids: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Lấy các tài liệu theo id, giữ đúng thứ tự của `ids`; id không còn tồn tại bị bỏ qua.
+
+        Parameters:
+        - collection (Collection): Đối tượng collection từ Milvus của nhân vật.
+        - ids (List[Any]): Id của các tài liệu.
+
+        Returns:
+        - List[Dict[str, Any]]: Các tài liệu gồm "id", "text" và "question".
+        """
+        if not ids:
+            return []
+        rows = collection.query(
+            expr=f"id in {list(ids)}", output_fields=["id", "text", "question"]
+        )
+        by_id = {row["id"]: row for row in rows}
+        return [by_id[id] for id in ids if id in by_id]
 
-        return result_docs
+    @staticmethod
+    def list_questions(
+        collection: Collection, batch_size: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Duyệt toàn bộ các câu hỏi có sẵn trong kho kiến thức của nhân vật.
+
+        Parameters:
+        - collection (Collection): Đối tượng collection từ Milvus của nhân vật.
+        - batch_size (int): Số bản ghi đọc từ Milvus mỗi lần.
+
+        Returns:
+        - Iterator[Dict[str, Any]]: Các bản ghi gồm "id" và "question".
+        """
+        iterator = collection.query_iterator(
+            batch_size=batch_size, expr="", output_fields=["id", "question"]
+        )
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                for row in batch:
+                    yield {"id": row["id"], "question": row["question"]}
+        finally:
+            iterator.close()
 
     @staticmethod
     def build_prompt(
-        question: str, search_result: List[Dict[str, str]], character_name: str
-    ) -> str:
+        question: str,
+        search_result: List[Dict[str, str]],
+        character_name: str,
+        history: str = "",
+        prompt_template: str = None,
+    ) -> Prompt:
         """
         Xây dựng prompt dựa trên câu hỏi, kết quả tìm kiếm, và tên nhân vật.
 
@@ -60,12 +143,15 @@ class AIService:
         - question (str): Câu hỏi từ người dùng cần được trả lời.
         - search_result (List[Dict[str, str]]): Danh sách các tài liệu tìm kiếm có thông tin liên quan.
         - character_name (str): Tên của nhân vật giả tưởng mà người dùng muốn đóng vai.
+        - history (str): Tóm tắt và các lượt hội thoại gần nhất của phiên chat (nếu có).
+        - prompt_template (str): Mẫu prompt cần dùng; mặc định là mẫu hiện tại trong src/prompt.txt.
 
         Returns:
-        - str: Chuỗi prompt đã định dạng để gửi đến mô hình ngôn ngữ lớn.
+        - Prompt: Chuỗi prompt đã định dạng để gửi đến mô hình ngôn ngữ lớn, kèm thông tin
+          tham chiếu để dựng lại prompt.
         """
-        with open("src/prompt.txt", "r", encoding="utf-8") as file:
-            prompt_template = file.read().strip()
+        if prompt_template is None:
+            prompt_template = load_template()
 
         context = ""
         for doc in search_result:
@@ -74,29 +160,192 @@ class AIService:
             context += f"\ncâu hỏi: {doc_question}\ntrả lời: {doc_answer}\n\n"
 
         prompt = prompt_template.format(
-            character_name=character_name, question=question, context=context
+            character_name=character_name,
+            question=question,
+            context=context,
+            history=history or "(chưa có)",
         ).strip()
-        return prompt
+        return Prompt(prompt, make_reference(prompt_template, search_result, history))
+
+    @staticmethod
+    def format_history(summary: str, turns: List[Dict[str, str]]) -> str:
+        """
+        Ghép bản tóm tắt và các lượt hội thoại gần nhất thành đoạn văn bản dùng trong prompt.
+
+        Parameters:
+        - summary (str): Bản tóm tắt các lượt hội thoại cũ.
+        - turns (List[Dict[str, str]]): Các lượt hội thoại gần nhất, mỗi lượt gồm "question" và "answer".
+
+        Returns:
+        - str: Lịch sử hội thoại đã định dạng, chuỗi rỗng nếu phiên chưa có lịch sử.
+        """
+        history = ""
+        if summary:
+            history += f"tóm tắt: {summary.strip()}\n"
+        for turn in turns:
+            history += f"người dùng: {turn['question'].strip()}\n"
+            history += f"nhân vật: {turn['answer'].strip()}\n"
+        return history.strip()
+
+    @staticmethod
+    def rewrite_question(question: str, history: str, character_name: str) -> str:
+        """
+        Viết lại câu hỏi nối tiếp (ví dụ "còn trận sau đó thì sao?") thành câu hỏi độc lập
+        để tìm kiếm tài liệu chính xác hơn.
+
+        Parameters:
+        - question (str): Câu hỏi mới nhất của người dùng.
+        - history (str): Lịch sử hội thoại đã định dạng bởi `format_history`.
+        - character_name (str): Tên đầy đủ của nhân vật.
+
+        Returns:
+        - str: Câu hỏi độc lập; trả về nguyên câu hỏi nếu chưa có lịch sử.
+        """
+        if not history:
+            return question
+        with open("src/rewrite_prompt.txt", "r", encoding="utf-8") as file:
+            prompt_template = file.read().strip()
+        prompt = prompt_template.format(
+            character_name=character_name, history=history, question=question
+        )
+        standalone_question = AIService.llm(prompt, route=SMALL).strip()
+        return standalone_question or question
 
     @staticmethod
-    def llm(prompt: str) -> str:
+    def summarize(
+        summary: str, turns: List[Dict[str, str]], character_name: str
+    ) -> str:
+        """
+        Gộp các lượt hội thoại cũ vào bản tóm tắt hiện có của phiên chat.
+
+        Parameters:
+        - summary (str): Bản tóm tắt hiện tại (có thể rỗng).
+        - turns (List[Dict[str, str]]): Các lượt hội thoại cần gộp vào bản tóm tắt.
+        - character_name (str): Tên đầy đủ của nhân vật.
+
+        Returns:
+        - str: Bản tóm tắt mới.
+        """
+        with open("src/summary_prompt.txt", "r", encoding="utf-8") as file:
+            prompt_template = file.read().strip()
+        prompt = prompt_template.format(
+            character_name=character_name,
+            summary=summary or "(chưa có)",
+            turns=AIService.format_history("", turns),
+        )
+        return AIService.llm(prompt, route=SMALL).strip()
+
+    @staticmethod
+    def llm(
+        prompt: str,
+        route: str = LARGE,
+        character_short_name: str = None,
+        priority: str = HIGH,
+    ) -> str:
         """
         Gửi prompt đến mô hình ngôn ngữ lớn (LLM) và nhận phản hồi.
 
+        Số lượt gọi đồng thời bị giới hạn bởi `llm_scheduler`, và độ dài câu trả lời tối đa
+        được `generation_policy` điều chỉnh theo tải hiện tại.
+
         Parameters:
         - prompt (str): Chuỗi prompt đã định dạng cần được gửi đến mô hình.
+        - route (str): "small" để dùng mô hình nhỏ, "large" để dùng mô hình lớn.
+        - character_short_name (str): Tên rút gọn của nhân vật để áp dụng giới hạn sinh riêng.
+        - priority (str): "high" cho yêu cầu của người dùng, "low" cho công việc nền.
 
         Returns:
         - str: Phản hồi từ mô hình ngôn ngữ lớn.
         """
-        response = llm_model.chat.completions.create(
-            model="gemma2", messages=[{"role": "user", "content": prompt}]
-        )
+        with llm_scheduler.slot(priority):
+            params = generation_policy.params(character_short_name)
+            LLM_REQUESTS.labels(route=route).inc()
+            started_at = time.perf_counter()
+            try:
+                response = llm_model.chat.completions.create(
+                    model=ModelRouter.model(route),
+                    messages=[{"role": "user", "content": prompt}],
+                    **params,
+                )
+            except Exception:
+                LLM_ERRORS.labels(route=route).inc()
+                raise
+            finally:
+                LLM_LATENCY.labels(route=route).observe(
+                    time.perf_counter() - started_at
+                )
         return response.choices[0].message.content
 
+    @staticmethod
+    def llm_stream(
+        prompt: str,
+        route: str = LARGE,
+        character_short_name: str = None,
+        priority: str = HIGH,
+    ) -> Iterator[str]:
+        """
+        Gửi prompt đến mô hình ngôn ngữ lớn (LLM) và trả về từng phần của phản hồi ngay khi
+        được sinh ra.
+
+        Lượt sinh giữ chỗ trong `llm_scheduler` cho đến khi luồng kết thúc hoặc bị đóng.
+
+        Parameters:
+        - prompt (str): Chuỗi prompt đã định dạng cần được gửi đến mô hình.
+        - route (str): "small" để dùng mô hình nhỏ, "large" để dùng mô hình lớn.
+        - character_short_name (str): Tên rút gọn của nhân vật để áp dụng giới hạn sinh riêng.
+        - priority (str): "high" cho yêu cầu của người dùng, "low" cho công việc nền.
+
+        Returns:
+        - Iterator[str]: Các phần liên tiếp của phản hồi.
+        """
+        with llm_scheduler.slot(priority):
+            params = generation_policy.params(character_short_name)
+            LLM_REQUESTS.labels(route=route).inc()
+            started_at = time.perf_counter()
+            try:
+                stream = llm_model.chat.completions.create(
+                    model=ModelRouter.model(route),
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                    **params,
+                )
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except Exception:
+                LLM_ERRORS.labels(route=route).inc()
+                raise
+            finally:
+                LLM_LATENCY.labels(route=route).observe(
+                    time.perf_counter() - started_at
+                )
+
+    @staticmethod
+    def _rag_prompt(
+        question: str,
+        character_short_name: str,
+        character_name: str,
+        history: str,
+        standalone_question: str,
+    ) -> Tuple[str, str]:
+        collection = get_collection(character_short_name)
+        results = AIService.search(
+            "question_text_vector", standalone_question or question, collection
+        )
+        prompt = AIService.build_prompt(question, results, character_name, history)
+        route = model_router.route(
+            standalone_question or question, results, character_short_name
+        )
+        return prompt, route
+
     @staticmethod
     def rag(
-        question: str, character_short_name: str, character_name: str
+        question: str,
+        character_short_name: str,
+        character_name: str,
+        history: str = "",
+        standalone_question: str = None,
+        priority: str = HIGH,
     ) -> Tuple[str, str]:
         """
         Thực hiện tìm kiếm tài liệu liên quan, xây dựng prompt, và trả lời câu hỏi
@@ -106,12 +355,99 @@ class AIService:
         - question (str): Câu hỏi từ người dùng cần được trả lời.
         - character_short_name (str): Tên rút gọn của nhân vật để lấy collection từ Milvus.
         - character_name (str): Tên đầy đủ của nhân vật giả tưởng mà người dùng muốn đóng vai.
+        - history (str): Lịch sử hội thoại của phiên chat (nếu có).
+        - standalone_question (str): Câu hỏi đã viết lại dùng để tìm kiếm; mặc định là `question`.
+        - priority (str): "high" cho yêu cầu của người dùng, "low" cho công việc nền.
 
         Returns:
         - Tuple[str, str]: Tuple chứa prompt đã định dạng và câu trả lời từ mô hình ngôn ngữ lớn.
         """
-        collection = get_collection(character_short_name)
-        results = AIService.search("question_text_vector", question, collection)
-        prompt = AIService.build_prompt(question, results, character_name)
-        answer = AIService.llm(prompt)
+        prompt, route = AIService._rag_prompt(
+            question, character_short_name, character_name, history, standalone_question
+        )
+        answer = AIService.llm(
+            prompt,
+            route=route,
+            character_short_name=character_short_name,
+            priority=priority,
+        )
         return prompt, answer
+
+    @staticmethod
+    def rag_batch(
+        questions: List[str],
+        character_short_name: str,
+        character_name: str,
+        priority: str = HIGH,
+    ) -> List[Union[Tuple[str, str], Exception]]:
+        """
+        Trả lời nhiều câu hỏi độc lập của cùng một nhân vật.
+
+        Các câu hỏi được tìm kiếm trong một lượt duy nhất, sau đó các lượt sinh chạy song song;
+        số lượt gọi LLM đồng thời vẫn bị giới hạn bởi `llm_scheduler`.
+
+        Parameters:
+        - questions (List[str]): Các câu hỏi cần được trả lời.
+        - character_short_name (str): Tên rút gọn của nhân vật để lấy collection từ Milvus.
+        - character_name (str): Tên đầy đủ của nhân vật giả tưởng mà người dùng muốn đóng vai.
+        - priority (str): "high" cho yêu cầu của người dùng, "low" cho công việc nền.
+
+        Returns:
+        - List[Union[Tuple[str, str], Exception]]: Prompt và câu trả lời của từng câu hỏi theo
+          đúng thứ tự, hoặc lỗi của câu hỏi đó nếu việc sinh thất bại.
+        """
+        collection = get_collection(character_short_name)
+        results = AIService.search_batch("question_text_vector", questions, collection)
+
+        def answer(question: str, result: List[Dict[str, Any]]) -> Tuple[str, str]:
+            prompt = AIService.build_prompt(question, result, character_name)
+            route = model_router.route(question, result, character_short_name)
+            return prompt, AIService.llm(
+                prompt,
+                route=route,
+                character_short_name=character_short_name,
+                priority=priority,
+            )
+
+        workers = max(1, min(len(questions), llm_scheduler.max_concurrency))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(answer, question, result)
+                for question, result in zip(questions, results)
+            ]
+        answers = []
+        for future in futures:
+            try:
+                answers.append(future.result())
+            except Exception as e:
+                answers.append(e)
+        return answers
+
+    @staticmethod
+    def rag_stream(
+        question: str,
+        character_short_name: str,
+        character_name: str,
+        history: str = "",
+        standalone_question: str = None,
+    ) -> Tuple[str, Iterator[str]]:
+        """
+        Giống `rag`, nhưng câu trả lời được trả về dần dần dưới dạng luồng.
+
+        Parameters:
+        - question (str): Câu hỏi từ người dùng cần được trả lời.
+        - character_short_name (str): Tên rút gọn của nhân vật để lấy collection từ Milvus.
+        - character_name (str): Tên đầy đủ của nhân vật giả tưởng mà người dùng muốn đóng vai.
+        - history (str): Lịch sử hội thoại của phiên chat (nếu có).
+        - standalone_question (str): Câu hỏi đã viết lại dùng để tìm kiếm; mặc định là `question`.
+
+        Returns:
+        - Tuple[str, Iterator[str]]: Prompt đã định dạng và luồng các phần của câu trả lời.
+        """
+        prompt, route = AIService._rag_prompt(
+            question, character_short_name, character_name, history, standalone_question
+        )
+        tokens = AIService.llm_stream(
+            prompt, route=route, character_short_name=character_short_name
+        )
+        return prompt, tokens
@@ -0,0 +1,107 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+from redis.exceptions import LockError
+from src.config import Config
+from src.utils.redis import redis_client
+
+SINGLE_FLIGHT_PREFIX = "singleflight"
+
+
+class SingleFlight:
+    """
+    Gộp các lượt sinh giống hệt nhau đang chạy đồng thời thành một lượt duy nhất.
+
+    Trong cùng một worker, các yêu cầu trùng khóa chờ trên cùng một Future. Giữa các worker,
+    một khóa Redis chọn ra worker sinh câu trả lời; các worker còn lại chờ kết quả được
+    công bố trong Redis. Nếu worker giữ khóa gặp sự cố, khóa hết hạn và một worker khác
+    sẽ tiếp quản. Một worker chờ quá `wait_timeout` giây thì tự sinh câu trả lời, để một
+    worker giữ khóa bị treo không giữ chân các yêu cầu khác đến hết `lock_ttl`.
+
+    Khóa truyền vào phải xác định đầy đủ dữ liệu dùng để sinh (ví dụ phiên bản dữ liệu của
+    nhân vật), vì kết quả đã công bố được dùng lại trong `result_ttl` giây.
+    """
+
+    def __init__(
+        self,
+        lock_ttl: int = Config.SINGLE_FLIGHT_LOCK_TTL,
+        result_ttl: int = Config.SINGLE_FLIGHT_RESULT_TTL,
+        poll_interval: float = Config.SINGLE_FLIGHT_POLL_INTERVAL,
+        wait_timeout: float = Config.SINGLE_FLIGHT_WAIT_TIMEOUT,
+    ):
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Chạy `fn` một lần cho mỗi khóa, các lời gọi đồng thời với cùng khóa nhận chung kết quả.
+
+        Parameters:
+        - key (str): Khóa xác định lượt sinh.
+        - fn (Callable[[], Any]): Hàm sinh kết quả; kết quả phải tuần tự hóa được bằng JSON.
+
+        Returns:
+        - Any: Kết quả của `fn` (dạng đã qua JSON, ví dụ tuple trở thành list).
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._do_shared(key, fn)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _do_shared(self, key: str, fn: Callable[[], Any]) -> Any:
+        result_key = f"{SINGLE_FLIGHT_PREFIX}:{key}:result"
+        lock = redis_client.lock(
+            f"{SINGLE_FLIGHT_PREFIX}:{key}:lock", timeout=self.lock_ttl, blocking=False
+        )
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            if lock.acquire():
+                try:
+                    # Kết quả có thể vừa được công bố ngay trước khi khóa được nhả
+                    published = redis_client.get(result_key)
+                    if published is not None:
+                        return json.loads(published)
+                    result = json.loads(json.dumps(fn(), ensure_ascii=False))
+                    redis_client.set(
+                        result_key,
+                        json.dumps(result, ensure_ascii=False),
+                        ex=self.result_ttl,
+                    )
+                    return result
+                finally:
+                    try:
+                        lock.release()
+                    except LockError:
+                        # The lock expired while generating; another worker may own it now
+                        pass
+
+            published = redis_client.get(result_key)
+            if published is not None:
+                return json.loads(published)
+            if time.monotonic() >= deadline:
+                logging.warning(f"Single flight {key}: leader too slow, generating locally")
+                return json.loads(json.dumps(fn(), ensure_ascii=False))
+            time.sleep(self.poll_interval)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, Response, status
 from fastapi.responses import JSONResponse
 from .schemas import (
     UserCreate,
@@ -20,6 +20,7 @@ from .dependencies import (
     RoleChecker,
 )
 from src.utils.redis import add_jti_to_blocklist
+from src.utils.etag import PRIVATE_CACHE_CONTROL, make_etag, not_modified
 from src.errors import UserAlreadyExists, InvalidCredentials, InvalidToken
 from .utils import verify_password, create_access_token
 
@@ -223,14 +224,23 @@ async def buy_character(
 
 
 @auth_router.get("/me", response_model=UserResponse)
-async def get_current_user(user=Depends(get_current_user)) -> UserResponse:
+async def get_current_user(
+    request: Request, response: Response, user=Depends(get_current_user)
+) -> UserResponse:
     """
     Retrieve details of the currently logged-in user.
 
+    The ETag follows the user's row version, so a client revalidating with
+    If-None-Match gets a 304 until the account changes (e.g. its balance).
+
     Args:
         user: The current logged-in user.
 
     Returns:
         UserResponse: The current user's details.
     """
+    etag = make_etag("user", user.uid, user.row_version)
+    cached = not_modified(request, response, etag, PRIVATE_CACHE_CONTROL)
+    if cached is not None:
+        return cached
     return user
@@ -124,6 +124,29 @@ class RefreshTokenBearer(TokenBearer):
             raise RefreshTokenRequired()
 
 
+async def verify_access_token(token: str) -> dict:
+    """
+    Validate an access token that was not sent as a bearer header (e.g. over a WebSocket).
+
+    Args:
+        token (str): The access token.
+
+    Returns:
+        dict: Decoded token data.
+
+    Raises:
+        InvalidToken: If the token is invalid, expired or in the blocklist.
+        AccessTokenRequired: If the token is a refresh token.
+    """
+    token_data = decode_token(token)
+    if not token_data:
+        raise InvalidToken()
+    if await token_in_blocklist(token_data["jti"]):
+        raise InvalidToken()
+    AccessTokenBearer().verify_token_data(token_data)
+    return token_data
+
+
 def get_current_user(
     token_details: dict = Depends(AccessTokenBearer()),
     db: Session = Depends(get_db),
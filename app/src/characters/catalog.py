@@ -0,0 +1,89 @@
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+from src.config import Config
+from src.db.models import Character
+from src.utils.redis import redis_client
+from .schemas import CharacterBase
+
+CATALOG_PREFIX = "characters:catalog"
+CATALOG_VERSION_KEY = f"{CATALOG_PREFIX}:version"
+
+
+class CatalogCache:
+    """
+    Cache of the serialized character catalog, kept in-process and in Redis.
+
+    The catalog is stored under its version, which is bumped whenever an admin changes a
+    character. A request reads the current version from Redis and uses the in-process
+    copy if it has the same version, so a hit never touches MySQL and an edit made
+    through any worker is seen by all of them on their next request.
+    """
+
+    def __init__(self, ttl: int = Config.CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._local: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+
+    @staticmethod
+    def _load(db: Session) -> List[Dict[str, Any]]:
+        characters = db.query(Character).order_by(Character.id).all()
+        return [
+            CharacterBase.model_validate(character, from_attributes=True).model_dump()
+            for character in characters
+        ]
+
+    def get(self, db: Session) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+        """
+        Get the character catalog and its version.
+
+        Args:
+            db (Session): The database session, used only on a cache miss.
+
+        Returns:
+            Tuple[Optional[int], List[Dict[str, Any]]]: The version, or None if Redis is
+            unavailable, and the serialized characters.
+        """
+        try:
+            version = int(redis_client.get(CATALOG_VERSION_KEY) or 0)
+            with self._lock:
+                local = self._local
+            if local is not None and local[0] == version:
+                return local
+            cached = redis_client.get(f"{CATALOG_PREFIX}:{version}")
+        except RedisError as e:
+            logging.warning(f"Catalog cache unavailable: {e}")
+            return None, self._load(db)
+
+        if cached is not None:
+            catalog = json.loads(cached)
+        else:
+            # Stored under the version read before loading, so a concurrent edit only
+            # leaves a stale copy under a version nobody reads anymore
+            catalog = self._load(db)
+            try:
+                redis_client.set(
+                    f"{CATALOG_PREFIX}:{version}", json.dumps(catalog), ex=self.ttl
+                )
+            except RedisError as e:
+                logging.warning(f"Catalog cache unavailable: {e}")
+        with self._lock:
+            self._local = (version, catalog)
+        return version, catalog
+
+    def invalidate(self) -> None:
+        """
+        Bump the catalog version after a character is created, changed or deleted.
+        """
+        with self._lock:
+            self._local = None
+        try:
+            redis_client.incr(CATALOG_VERSION_KEY)
+        except RedisError as e:
+            logging.warning(f"Catalog cache unavailable: {e}")
+
+
+catalog_cache = CatalogCache()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, UploadFile, File, status
+from fastapi import APIRouter, Depends, Request, Response, UploadFile, File, status
 from sqlalchemy.orm import Session
 from src.db.database import get_db
 from .service import CharacterService
@@ -8,9 +8,14 @@ from .schemas import (
     CharacterResponse,
     CharacterUpdate,
     CharacterListResponse,
+    CharacterCatalogResponse,
+    CharacterUser,
 )
 from src.auth.schemas import UserResponse
-from typing import Dict
+from src.config import Config
+from src.utils.etag import PRIVATE_CACHE_CONTROL, not_modified
+from src.utils.fields import SparseFields, sparse_response
+from typing import Dict, List, Optional
 from src.errors import CharacterNotFound, InsufficientBalance, UserAlreadyOwnsCharacter
 
 admin_role_checker = RoleChecker(["admin"])
@@ -18,6 +23,8 @@ user_role_checker = RoleChecker(["user"])
 admin_or_user_role_checker = RoleChecker(["admin", "user"])
 character_service = CharacterService()
 char_router = APIRouter()
+character_fields = SparseFields(CharacterUser)
+catalog_fields = SparseFields(CharacterResponse)
 
 
 @char_router.post(
@@ -45,7 +52,7 @@ async def update_images(
     """
     Update the profile and background images for a character.
     """
-    character = character_service.update_images(character_id, pf_img, bg_img, db)
+    character = await character_service.update_images(character_id, pf_img, bg_img, db)
     return character
 
 
@@ -65,17 +72,48 @@ async def update_character_route(
     return updated_character
 
 
+@char_router.get("/", response_model=CharacterCatalogResponse)
+def get_characters(
+    request: Request,
+    response: Response,
+    fields: Optional[List[str]] = Depends(catalog_fields),
+    db: Session = Depends(get_db),
+):
+    """
+    Get the public character catalog, without ownership.
+
+    The response is the same for every client, so it is marked cacheable by shared
+    caches such as the CDN, with an ETag that changes whenever a character does.
+    """
+    etag, characters = character_service.get_catalog(db, fields)
+    if etag is not None:
+        cached = not_modified(request, response, etag, Config.CATALOG_CACHE_CONTROL)
+        if cached is not None:
+            return cached
+    return sparse_response({"characters": characters}, fields, response)
+
+
 @char_router.get("/users", response_model=CharacterListResponse)
 def get_user_characters(
+    request: Request,
+    response: Response,
+    fields: Optional[List[str]] = Depends(character_fields),
     user: UserResponse = Depends(get_current_user),
     db: Session = Depends(get_db),
     _: bool = Depends(admin_or_user_role_checker),
 ):
     """
     Get a list of characters associated with a specific user.
+
+    `fields` (e.g. `id,name,own`) limits the keys returned. Clients revalidate with
+    If-None-Match and get a 304 while neither the catalog nor their ownership changed.
     """
-    characters = character_service.get_user_characters(user, db)
-    return {"characters": characters}
+    etag, characters = character_service.get_user_characters(user, db, fields)
+    if etag is not None:
+        cached = not_modified(request, response, etag, PRIVATE_CACHE_CONTROL)
+        if cached is not None:
+            return cached
+    return sparse_response({"characters": characters}, fields, response)
 
 
 @char_router.post("/buy-character/{character_id}", response_model=Dict[str, str])
@@ -0,0 +1,157 @@
+import json
+import logging
+import threading
+import time
+from typing import Dict, FrozenSet, Optional, Tuple
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.config import Config
+from src.db.models import user_character_association
+from src.utils.redis import redis_client
+
+OWNERSHIP_PREFIX = "user:characters"
+
+# Caches the loaded ids only if no invalidation happened since the load started
+SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[1]) or '0') == ARGV[1] then
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class OwnershipCache:
+    """
+    Cache of the character ids each user owns, kept in-process and in Redis.
+
+    A positive answer from the in-process copy is trusted as is, since ownership is never
+    revoked. A negative answer is confirmed against Redis before it is returned, so a
+    purchase made through another worker is visible immediately.
+
+    Each user also has a generation counter, bumped by `invalidate`. A load only writes
+    its result back if the generation is unchanged, so a load that read the database
+    before a purchase committed cannot overwrite the invalidation with stale ids.
+    """
+
+    def __init__(
+        self,
+        ttl: int = Config.OWNERSHIP_CACHE_TTL,
+        local_ttl: int = Config.OWNERSHIP_LOCAL_TTL,
+    ):
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self._lock = threading.Lock()
+        self._local: Dict[str, Tuple[float, FrozenSet[int]]] = {}
+        self._set_if_generation = redis_client.register_script(SET_IF_GENERATION)
+
+    @staticmethod
+    def _key(user_uid: str) -> str:
+        return f"{OWNERSHIP_PREFIX}:{user_uid}"
+
+    @staticmethod
+    def _generation_key(user_uid: str) -> str:
+        return f"{OWNERSHIP_PREFIX}:{user_uid}:generation"
+
+    def _get_local(self, user_uid: str) -> Optional[FrozenSet[int]]:
+        with self._lock:
+            entry = self._local.get(user_uid)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _set_local(self, user_uid: str, owned: FrozenSet[int]) -> None:
+        with self._lock:
+            self._local[user_uid] = (time.monotonic() + self.local_ttl, owned)
+
+    def _get_shared(self, user_uid: str) -> Optional[FrozenSet[int]]:
+        try:
+            cached = redis_client.get(self._key(user_uid))
+        except RedisError as e:
+            logging.warning(f"Ownership cache unavailable: {e}")
+            return None
+        if cached is None:
+            return None
+        owned = frozenset(json.loads(cached))
+        self._set_local(user_uid, owned)
+        return owned
+
+    def _load(self, user_uid: str, db: Session) -> FrozenSet[int]:
+        try:
+            # Read before the database, so an invalidation during the load is detected
+            generation = redis_client.get(self._generation_key(user_uid)) or "0"
+        except RedisError as e:
+            logging.warning(f"Ownership cache unavailable: {e}")
+            generation = None
+        # Covered by the (user_uid, character_id) primary key of user_character
+        rows = db.execute(
+            select(user_character_association.c.character_id).where(
+                user_character_association.c.user_uid == user_uid
+            )
+        )
+        owned = frozenset(row[0] for row in rows)
+        if generation is not None:
+            try:
+                self._set_if_generation(
+                    keys=[self._generation_key(user_uid), self._key(user_uid)],
+                    args=[generation, json.dumps(sorted(owned)), self.ttl],
+                )
+            except RedisError as e:
+                logging.warning(f"Ownership cache unavailable: {e}")
+        self._set_local(user_uid, owned)
+        return owned
+
+    def owned_ids(self, user_uid: str, db: Session) -> FrozenSet[int]:
+        """
+        Get the ids of the characters the user owns.
+
+        Args:
+            user_uid (str): The unique identifier of the user.
+            db (Session): The database session, used only on a cache miss.
+
+        Returns:
+            FrozenSet[int]: The owned character ids.
+        """
+        owned = self._get_shared(user_uid)
+        if owned is None:
+            owned = self._load(user_uid, db)
+        return owned
+
+    def owns(self, user_uid: str, character_id: int, db: Session) -> bool:
+        """
+        Check whether the user owns the character.
+
+        Args:
+            user_uid (str): The unique identifier of the user.
+            character_id (int): The ID of the character.
+            db (Session): The database session, used only on a cache miss.
+
+        Returns:
+            bool: True if the user owns the character.
+        """
+        owned = self._get_local(user_uid)
+        if owned is not None and character_id in owned:
+            return True
+        return character_id in self.owned_ids(user_uid, db)
+
+    def invalidate(self, user_uid: str) -> None:
+        """
+        Drop the cached ownership of a user after it changes (e.g. a purchase).
+
+        Args:
+            user_uid (str): The unique identifier of the user.
+        """
+        with self._lock:
+            self._local.pop(user_uid, None)
+        try:
+            pipe = redis_client.pipeline()
+            pipe.incr(self._generation_key(user_uid))
+            pipe.expire(self._generation_key(user_uid), self.ttl)
+            pipe.delete(self._key(user_uid))
+            pipe.execute()
+        except RedisError as e:
+            logging.warning(f"Ownership cache unavailable: {e}")
+
+
+ownership_cache = OwnershipCache()
@@ -57,3 +57,7 @@ class CharacterUser(CharacterBase):
 
 class CharacterListResponse(BaseModel):
     characters: List[CharacterUser]
+
+
+class CharacterCatalogResponse(BaseModel):
+    characters: List[CharacterResponse]
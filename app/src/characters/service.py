@@ -1,8 +1,11 @@
-import os
+import asyncio
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from src.db.models import Character, user_character_association
 from .schemas import CharacterCreate, CharacterUpdate
-from src.utils.firebase import upload_file_to_firebase
+from src.utils.etag import make_etag
+from src.utils.firebase import upload_stream_to_firebase
 from src.errors import (
     CharacterNotFound,
     InvalidFileType,
@@ -10,9 +13,11 @@ from src.errors import (
     UserAlreadyOwnsCharacter,
 )
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
 from src.auth.schemas import UserResponse
 from sqlalchemy.exc import IntegrityError
-from tempfile import NamedTemporaryFile
+from .catalog import catalog_cache
+from .ownership import ownership_cache
 
 
 class CharacterService:
@@ -34,53 +39,45 @@ class CharacterService:
         )
         db.add(character)
         db.commit()
+        catalog_cache.invalidate()
         db.refresh(character)
         return character
 
-    def update_images(
+    async def update_images(
         self, character_id: int, pf_img: UploadFile, bg_img: UploadFile, db: Session
-    ) -> str:
-        print(pf_img)
-        character = db.query(Character).filter(Character.id == character_id).first()
+    ) -> Character:
+        """
+        Upload new profile and background images for a character and save their URLs.
+
+        Both images are streamed from the uploaded files to storage concurrently, in
+        worker threads, so the event loop is never blocked. The URLs are committed only
+        once both uploads have succeeded.
+        """
+        character = await run_in_threadpool(self.get_character, character_id, db)
         if not character:
             raise CharacterNotFound()
-        if not pf_img.content_type.startswith("image/"):
-            raise InvalidFileType
-        if not bg_img.content_type.startswith("image/"):
-            raise InvalidFileType
-        temp_files = []
-        profile_image_url = None
-        background_image_url = None
-        try:
-            with NamedTemporaryFile(
-                delete=False, suffix=f".{pf_img.filename.split('.')[-1]}"
-            ) as tmp_pf_img:
-                tmp_pf_img.write(pf_img.file.read())
-                temp_files.append(tmp_pf_img.name)
-                pf_img_path = tmp_pf_img.name
-                if os.path.isfile(pf_img_path):
-                    profile_image_url = upload_file_to_firebase(
-                        pf_img_path,
-                        f"profiles/{os.path.basename(pf_img_path)}",
-                    )
-                character.profile_image = profile_image_url
-            with NamedTemporaryFile(
-                delete=False, suffix=f".{bg_img.filename.split('.')[-1]}"
-            ) as tmp_bg_img:
-                tmp_bg_img.write(bg_img.file.read())
-                temp_files.append(tmp_bg_img.name)
-                bg_img_path = tmp_bg_img.name
-                if os.path.isfile(bg_img_path):
-                    background_image_url = upload_file_to_firebase(
-                        bg_img_path,
-                        f"profiles/{os.path.basename(bg_img_path)}",
-                    )
-                character.background_image = background_image_url
-            db.commit()
-        finally:
-            for file_path in temp_files:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+        for image in (pf_img, bg_img):
+            if not (image.content_type or "").startswith("image/"):
+                raise InvalidFileType()
+
+        profile_image_url, background_image_url = await asyncio.gather(
+            *(
+                run_in_threadpool(
+                    upload_stream_to_firebase,
+                    image.file,
+                    f"profiles/{uuid.uuid4().hex}.{image.filename.split('.')[-1]}",
+                    image.content_type,
+                )
+                for image in (pf_img, bg_img)
+            )
+        )
+        character.profile_image = profile_image_url
+        character.background_image = background_image_url
+        await run_in_threadpool(db.commit)
+        # A blocking Redis round trip, kept off the event loop like the commit
+        await run_in_threadpool(catalog_cache.invalidate)
+        # Reloaded here: the expired attributes must not be loaded on the event loop
+        await run_in_threadpool(db.refresh, character)
         return character
 
     def update_character(
@@ -89,10 +86,11 @@ class CharacterService:
         character = self.get_character(character_id, db)
         character_data_dict = character_update.model_dump(exclude_unset=True)
         if not character:
-            return CharacterNotFound()
+            raise CharacterNotFound()
         for key, value in character_data_dict.items():
             setattr(character, key, value)
         db.commit()
+        catalog_cache.invalidate()
         db.refresh(character)
         return character
 
@@ -101,41 +99,59 @@ class CharacterService:
         if character:
             db.delete(character)
             db.commit()
+            catalog_cache.invalidate()
         return character
 
-    def get_user_characters(self, user: UserResponse, db: Session):
+    def get_catalog(
+        self, db: Session, fields: Optional[List[str]] = None
+    ) -> Tuple[Optional[str], List[Dict[str, Any]]]:
         """
-        Fetch characters and determine ownership for the specified user.
+        Get the public character catalog and its ETag.
+
+        Args:
+            db (Session): The database session, used only on a cache miss.
+            fields (Optional[List[str]]): Only return these keys of each character.
+
+        Returns:
+            Tuple[Optional[str], List[Dict[str, Any]]]: The ETag, or None if the catalog
+            version is unknown, and the characters.
         """
-        # Query all characters and join with the user-character association table
-        results = (
-            db.query(Character, user_character_association.c.user_uid.label("user_uid"))
-            .outerjoin(
-                user_character_association,
-                (user_character_association.c.character_id == Character.id)
-                & (user_character_association.c.user_uid == user.uid),
-            )
-            .all()
-        )
+        version, characters = catalog_cache.get(db)
+        if fields is not None:
+            characters = [
+                {field: character[field] for field in fields} for character in characters
+            ]
+        etag = make_etag("catalog", version, fields) if version is not None else None
+        return etag, characters
+
+    def get_user_characters(
+        self, user: UserResponse, db: Session, fields: Optional[List[str]] = None
+    ) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """
+        Fetch characters and determine ownership for the specified user.
 
-        # Process results into the desired structure
-        characters = []
-        for character, user_uid in results:
-            characters.append(
-                {
-                    "id": character.id,
-                    "short_name": character.short_name,
-                    "name": character.name,
-                    "description": character.description,
-                    "background_image": character.background_image,
-                    "profile_image": character.profile_image,
-                    "original_price": character.original_price,
-                    "new_price": character.new_price,
-                    "percentage_discount": character.percentage_discount,
-                    "own": user_uid is not None,  # True if the user owns this character
-                }
-            )
-        return characters
+        The catalog and the user's owned character ids both come from caches, so MySQL is
+        only queried when one of them misses. With `fields`, each character only has the
+        requested keys.
+
+        Returns:
+            Tuple[Optional[str], List[Dict[str, Any]]]: The ETag, derived from the catalog
+            version and the owned ids, or None if the catalog version is unknown, and the
+            characters.
+        """
+        version, catalog = catalog_cache.get(db)
+        owned = ownership_cache.owned_ids(user.uid, db)
+        characters = [
+            dict(character, own=character["id"] in owned) for character in catalog
+        ]
+        if fields is not None:
+            characters = [
+                {field: character[field] for field in fields} for character in characters
+            ]
+        etag = None
+        if version is not None:
+            etag = make_etag("user-catalog", version, sorted(owned), fields)
+        return etag, characters
 
     def buy_character(self, user: UserResponse, character_id: int, db: Session):
         """
@@ -153,18 +169,25 @@ class CharacterService:
 
         if not character:
             raise CharacterNotFound()
-        if character in user.characters:
+        if ownership_cache.owns(user.uid, character_id, db):
             raise UserAlreadyOwnsCharacter()
         if user.balance < character.new_price:
             raise InsufficientBalance()
 
         user.balance -= character.new_price
-        user.characters.append(character)
+        # Insert the association row directly instead of loading user.characters
+        db.execute(
+            user_character_association.insert().values(
+                user_uid=user.uid, character_id=character.id
+            )
+        )
+        # Read before the commit expires them, which would reload both rows
+        user_uid, character_name = user.uid, character.name
 
         try:
             db.commit()
-            db.refresh(user)
-            return {"msg": f"Character '{character.name}' purchased successfully."}
+            ownership_cache.invalidate(user_uid)
+            return {"msg": f"Character '{character_name}' purchased successfully."}
         except IntegrityError:
             db.rollback()
             return {"msg": "An error occurred while processing the transaction."}
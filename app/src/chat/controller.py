@@ -1,20 +1,60 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+import logging
+import time
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from typing import Optional
 from sqlalchemy.orm import Session
-from src.db.database import get_db
-from src.auth.dependencies import get_current_user
+from src.db.database import SessionLocal, get_db
+from src.auth.dependencies import get_current_user, verify_access_token
 from .service import ChatService
-from .schemas import ChatRequest, ChatResponse
+from .jobs import ChatJobService, ERROR_CODES
+from .schemas import (
+    ChatRequest,
+    ChatResponse,
+    ChatJobResponse,
+    ChatBatchRequest,
+    ChatBatchItem,
+    ChatBatchResponse,
+)
 from src.auth.schemas import UserResponse
 from src.history_logs.service import HistoryLogService
+from src.utils.rate_limit import chat_rate_limiter
+from src.errors import (
+    AuthException,
+    ChatJobNotFound,
+    CharacterNotFound,
+    UserNotOwnsCharacter,
+    RateLimitExceeded,
+)
 
 chat_router = APIRouter()
 chat_service = ChatService()
+chat_job_service = ChatJobService()
 log_service = HistoryLogService()
 
+# WebSocket close codes, mirroring the HTTP status of the equivalent error
+WS_UNAUTHORIZED = 4401
+WS_CLOSE_CODES = {
+    UserNotOwnsCharacter: 4403,
+    CharacterNotFound: 4404,
+}
+
 
 @chat_router.post("/", response_model=ChatResponse)
 def chat_with_character(
     chat_request: ChatRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     user: UserResponse = Depends(get_current_user),
 ):
@@ -23,23 +63,271 @@ def chat_with_character(
 
     Args:
         chat_request (ChatRequest): The input data containing user ID, character ID, and the question.
+        background_tasks (BackgroundTasks): Runs conversation summarization after the response.
         db (Session): Database session dependency.
 
     Returns:
         ChatResponse: The response containing the AI's answer.
     """
-    prompt, answer = chat_service.chat_character(
+    chat_rate_limiter.check(user.uid, user.role, chat_request.character_id)
+    prompt, answer, session_id = chat_service.chat_character(
         user_uid=user.uid,
         character_id=chat_request.character_id,
         question=chat_request.question,
         db=db,
+        session_id=chat_request.session_id,
+        background_tasks=background_tasks,
     )
-    log = log_service.create_history_log(
-        db=db,
+    log_id = log_service.enqueue_history_log(
         user_id=user.uid,
         character_id=chat_request.character_id,
         question=chat_request.question,
         prompt=prompt,
         answer=answer,
     )
-    return ChatResponse(answer=answer, log_id=log.id)
+    return ChatResponse(answer=answer, log_id=log_id, session_id=session_id)
+
+
+@chat_router.post("/batch", response_model=ChatBatchResponse)
+def chat_batch(
+    batch_request: ChatBatchRequest,
+    db: Session = Depends(get_db),
+    user: UserResponse = Depends(get_current_user),
+):
+    """
+    Ask a character several independent questions in one request (e.g. a quiz).
+
+    The questions are embedded and searched together and answered concurrently. A question
+    that fails does not fail the batch; its item carries an `error_code` instead.
+
+    Args:
+        batch_request (ChatBatchRequest): The character ID and the questions.
+        db (Session): Database session dependency.
+
+    Returns:
+        ChatBatchResponse: One item per question, in request order.
+    """
+    chat_rate_limiter.check(
+        user.uid,
+        user.role,
+        batch_request.character_id,
+        cost=len(batch_request.questions),
+    )
+    results = chat_service.chat_batch(
+        user.uid, batch_request.character_id, batch_request.questions, db
+    )
+    items = []
+    for question, result in zip(batch_request.questions, results):
+        if isinstance(result, Exception):
+            logging.error(f"Batch question failed: {result}")
+            items.append(ChatBatchItem(question=question, error_code="server_error"))
+            continue
+        prompt, answer = result
+        log_id = log_service.enqueue_history_log(
+            user_id=user.uid,
+            character_id=batch_request.character_id,
+            question=question,
+            prompt=prompt,
+            answer=answer,
+        )
+        items.append(ChatBatchItem(question=question, answer=answer, log_id=log_id))
+    return ChatBatchResponse(items=items)
+
+
+@chat_router.post(
+    "/jobs", response_model=ChatJobResponse, status_code=status.HTTP_202_ACCEPTED
+)
+def submit_chat_job(
+    chat_request: ChatRequest,
+    idempotency_key: Optional[str] = Header(None, max_length=128),
+    user: UserResponse = Depends(get_current_user),
+):
+    """
+    Start answering a question in the background and return the job immediately.
+
+    Args:
+        chat_request (ChatRequest): The character ID, the question and the optional session.
+        idempotency_key (Optional[str]): The `Idempotency-Key` header; retrying a submit
+            with the same key returns the job already started for it.
+
+    Returns:
+        ChatJobResponse: The job, to be fetched with `GET /jobs/{job_id}`.
+    """
+    chat_rate_limiter.check(user.uid, user.role, chat_request.character_id)
+    return chat_job_service.submit(user.uid, chat_request, idempotency_key)
+
+
+@chat_router.get("/jobs/{job_id}", response_model=ChatJobResponse)
+async def get_chat_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    user: UserResponse = Depends(get_current_user),
+):
+    """
+    Get the state of a chat job, waiting up to `wait` seconds for it to finish.
+
+    Args:
+        job_id (str): The ID of the job.
+        wait (float): How long to long-poll for the result, in seconds.
+
+    Returns:
+        ChatJobResponse: The job state, including the answer and log ID once done.
+
+    Raises:
+        ChatJobNotFound: If the job does not exist, expired, or belongs to another user.
+    """
+    job = await chat_job_service.wait(user.uid, job_id, wait)
+    if not job:
+        raise ChatJobNotFound()
+    return job
+
+
+def _authorize_chat(user_email: str, character_id: int):
+    with SessionLocal() as db:
+        return chat_service.authorize_chat(user_email, character_id, db)
+
+
+@chat_router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    token: str = Query(...),
+    character_id: int = Query(...),
+):
+    """
+    Chat with a character over a WebSocket, with the answer streamed as it is generated.
+
+    The access token and the character ownership are checked once, when the connection
+    opens; messages are then answered without authenticating again until the token
+    expires. Messages are JSON objects:
+
+    - `{"question": "...", "session_id": "..."}` asks a question (`session_id` optional).
+      The answer is sent as `{"type": "token", "content": "..."}` messages followed by
+      `{"type": "done", "answer": "...", "log_id": ..., "session_id": "..."}`.
+    - `{"token": "..."}` replaces the access token of the connection. Once the token has
+      expired, questions are refused with `{"type": "error", "error_code": "token_expired"}`
+      until a new token is sent.
+
+    Questions count against the same rate limits as `POST /`; a limited question is
+    refused with `{"type": "error", "error_code": "rate_limit_exceeded", "retry_after": n}`.
+
+    The connection is closed with code 4401 if a token is rejected, 4403 if the user does
+    not own the character and 4404 if the character does not exist.
+
+    Args:
+        websocket (WebSocket): The WebSocket connection.
+        token (str): The access token of the user.
+        character_id (int): The ID of the character to chat with.
+    """
+    await websocket.accept()
+    try:
+        token_data = await verify_access_token(token)
+        user, character = await run_in_threadpool(
+            _authorize_chat, token_data["user"]["email"], character_id
+        )
+    except AuthException as e:
+        await websocket.close(code=WS_CLOSE_CODES.get(type(e), WS_UNAUTHORIZED))
+        return
+
+    # Keep references to running summarizations until they finish
+    background = set()
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                await websocket.send_json(
+                    {"type": "error", "error_code": "invalid_message"}
+                )
+                continue
+
+            if "token" in message:
+                try:
+                    new_token_data = await verify_access_token(message["token"])
+                except AuthException:
+                    await websocket.close(code=WS_UNAUTHORIZED)
+                    return
+                if new_token_data["user"]["email"] != token_data["user"]["email"]:
+                    await websocket.close(code=WS_UNAUTHORIZED)
+                    return
+                token_data = new_token_data
+                await websocket.send_json({"type": "auth", "status": "ok"})
+                continue
+
+            if time.time() >= token_data["exp"]:
+                await websocket.send_json(
+                    {"type": "error", "error_code": "token_expired"}
+                )
+                continue
+
+            question = message.get("question")
+            if not isinstance(question, str) or not question.strip():
+                await websocket.send_json(
+                    {"type": "error", "error_code": "invalid_message"}
+                )
+                continue
+
+            try:
+                await run_in_threadpool(
+                    chat_rate_limiter.check, user.uid, user.role, character.id
+                )
+            except RateLimitExceeded as e:
+                await websocket.send_json(
+                    {
+                        "type": "error",
+                        "error_code": "rate_limit_exceeded",
+                        "retry_after": e.retry_after,
+                    }
+                )
+                continue
+
+            background_tasks = BackgroundTasks()
+            tokens = None
+            chunks = []
+            try:
+                prompt, tokens, session_id = await run_in_threadpool(
+                    chat_service.stream_character,
+                    user.uid,
+                    character,
+                    question,
+                    message.get("session_id"),
+                    background_tasks,
+                )
+                async for chunk in iterate_in_threadpool(tokens):
+                    chunks.append(chunk)
+                    await websocket.send_json({"type": "token", "content": chunk})
+                log_id = await run_in_threadpool(
+                    log_service.enqueue_history_log,
+                    user_id=user.uid,
+                    character_id=character.id,
+                    question=question,
+                    prompt=prompt,
+                    answer="".join(chunks),
+                )
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logging.exception(f"WebSocket chat failed: {e}")
+                await websocket.send_json(
+                    {"type": "error", "error_code": ERROR_CODES.get(type(e), "server_error")}
+                )
+                continue
+            finally:
+                if tokens is not None:
+                    # Release the LLM slot if the stream was interrupted
+                    await run_in_threadpool(tokens.close)
+
+            await websocket.send_json(
+                {
+                    "type": "done",
+                    "answer": "".join(chunks),
+                    "log_id": log_id,
+                    "session_id": session_id,
+                }
+            )
+            task = asyncio.create_task(background_tasks())
+            background.add(task)
+            task.add_done_callback(background.discard)
+    except WebSocketDisconnect:
+        pass
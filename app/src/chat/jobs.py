@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from fastapi import BackgroundTasks
+from src.config import Config
+from src.db.database import SessionLocal
+from src.errors import AuthException, CharacterNotFound, UserNotOwnsCharacter
+from src.history_logs.service import HistoryLogService
+from src.utils.redis import redis_client, async_redis_client
+from .schemas import ChatRequest
+from .service import ChatService
+
+JOB_PREFIX = "chat:job"
+IDEMPOTENCY_PREFIX = "chat:idempotency"
+
+# Error codes reported for failed jobs, matching the codes of the synchronous endpoint
+ERROR_CODES = {
+    CharacterNotFound: "character_not_found",
+    UserNotOwnsCharacter: "user_not_owns_character",
+}
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+chat_service = ChatService()
+log_service = HistoryLogService()
+
+
+class ChatJobService:
+    """
+    Service class to run chat generations as background jobs.
+
+    Job state and results are kept in Redis with a TTL so that any API worker can answer
+    the long-poll for a job, and a retried submit with the same idempotency key
+    reattaches to the job that is already running instead of generating twice.
+    """
+
+    def __init__(
+        self,
+        ttl: int = Config.CHAT_JOB_TTL,
+        timeout: int = Config.CHAT_JOB_TIMEOUT,
+        max_workers: int = Config.CHAT_JOB_WORKERS,
+    ):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="chat-job"
+        )
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"{JOB_PREFIX}:{job_id}"
+
+    def submit(
+        self,
+        user_uid: str,
+        chat_request: ChatRequest,
+        idempotency_key: Optional[str] = None,
+    ) -> dict:
+        """
+        Create a chat job and dispatch it to the background workers.
+
+        Args:
+            user_uid (str): The unique identifier of the user.
+            chat_request (ChatRequest): The chat request to answer.
+            idempotency_key (Optional[str]): Client-chosen key identifying retries of the
+                same submission.
+
+        Returns:
+            dict: The job state, either newly created or the one the key is attached to.
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": PENDING,
+            "user_uid": user_uid,
+            "character_id": chat_request.character_id,
+            "question": chat_request.question,
+            "session_id": chat_request.session_id or "",
+            "created_at": time.time(),
+        }
+        pipe = redis_client.pipeline()
+        pipe.hset(self._key(job_id), mapping=job)
+        pipe.expire(self._key(job_id), self.ttl)
+        pipe.execute()
+
+        if idempotency_key:
+            key = f"{IDEMPOTENCY_PREFIX}:{user_uid}:{idempotency_key}"
+            if not redis_client.set(key, job_id, nx=True, ex=self.ttl):
+                existing = self.get(user_uid, redis_client.get(key) or "")
+                if existing and existing["status"] != FAILED:
+                    redis_client.delete(self._key(job_id))
+                    return existing
+                # The previous attempt failed or expired: let this submit retry it
+                redis_client.set(key, job_id, ex=self.ttl)
+
+        self.executor.submit(self._run, job_id)
+        return self._public(job)
+
+    def _run(self, job_id: str) -> None:
+        key = self._key(job_id)
+        job = redis_client.hgetall(key)
+        redis_client.hset(key, mapping={"status": RUNNING, "started_at": time.time()})
+
+        db = SessionLocal()
+        background_tasks = BackgroundTasks()
+        try:
+            prompt, answer, session_id = chat_service.chat_character(
+                user_uid=job["user_uid"],
+                character_id=int(job["character_id"]),
+                question=job["question"],
+                db=db,
+                session_id=job["session_id"] or None,
+                background_tasks=background_tasks,
+            )
+            log_id = log_service.enqueue_history_log(
+                user_id=job["user_uid"],
+                character_id=int(job["character_id"]),
+                question=job["question"],
+                prompt=prompt,
+                answer=answer,
+            )
+            redis_client.hset(
+                key,
+                mapping={
+                    "status": DONE,
+                    "answer": answer,
+                    "log_id": log_id if log_id is not None else "",
+                    "session_id": session_id,
+                },
+            )
+        except Exception as e:
+            if not isinstance(e, AuthException):
+                logging.exception(e)
+            redis_client.hset(
+                key,
+                mapping={
+                    "status": FAILED,
+                    "error_code": ERROR_CODES.get(type(e), "server_error"),
+                },
+            )
+        finally:
+            redis_client.expire(key, self.ttl)
+            db.close()
+
+        for task in background_tasks.tasks:
+            task.func(*task.args, **task.kwargs)
+
+    def _public(self, job: dict) -> dict:
+        status = job["status"]
+        if status in (PENDING, RUNNING):
+            # A job whose worker died never finishes; report it as failed after the timeout
+            if time.time() - float(job["created_at"]) > self.timeout:
+                status = FAILED
+                job["error_code"] = "job_timeout"
+        return {
+            "job_id": job["job_id"],
+            "status": status,
+            "answer": job.get("answer"),
+            "log_id": int(job["log_id"]) if job.get("log_id") else None,
+            "session_id": job.get("session_id") or None,
+            "error_code": job.get("error_code"),
+        }
+
+    def get(self, user_uid: str, job_id: str) -> Optional[dict]:
+        """
+        Read the state of a job owned by the user.
+
+        Args:
+            user_uid (str): The unique identifier of the user.
+            job_id (str): The job ID.
+
+        Returns:
+            Optional[dict]: The job state, or None if the job does not exist or belongs
+            to another user.
+        """
+        job = redis_client.hgetall(self._key(job_id))
+        if not job or job["user_uid"] != str(user_uid):
+            return None
+        return self._public(job)
+
+    async def wait(self, user_uid: str, job_id: str, timeout: float) -> Optional[dict]:
+        """
+        Long-poll a job until it finishes or the timeout elapses.
+
+        Args:
+            user_uid (str): The unique identifier of the user.
+            job_id (str): The job ID.
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            Optional[dict]: The latest job state, or None if the job does not exist or
+            belongs to another user.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await async_redis_client.hgetall(self._key(job_id))
+            if not job or job["user_uid"] != str(user_uid):
+                return None
+            state = self._public(job)
+            if state["status"] in (DONE, FAILED) or time.monotonic() >= deadline:
+                return state
+            await asyncio.sleep(Config.CHAT_JOB_POLL_INTERVAL)
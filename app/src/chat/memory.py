@@ -0,0 +1,134 @@
+import json
+import uuid
+from typing import Dict, List, Tuple
+from src.AI.service import AIService
+from src.config import Config
+from src.utils.redis import redis_client
+
+SESSION_PREFIX = "chat:session"
+
+
+class ConversationMemory:
+    """
+    Lưu trữ bộ nhớ hội thoại của từng phiên chat trong Redis.
+
+    Mỗi phiên giữ tối đa `max_turns` lượt hội thoại gần nhất; các lượt cũ hơn được gộp dần
+    vào một bản tóm tắt, nên kích thước prompt không tăng theo độ dài cuộc hội thoại.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = Config.CHAT_MEMORY_TURNS,
+        ttl: int = Config.CHAT_SESSION_TTL,
+    ):
+        self.max_turns = max_turns
+        self.ttl = ttl
+
+    @staticmethod
+    def new_session_id() -> str:
+        """
+        Tạo mã phiên chat mới.
+
+        Returns:
+            str: Mã phiên chat.
+        """
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def _key(user_uid: str, character_id: int, session_id: str) -> str:
+        return f"{SESSION_PREFIX}:{user_uid}:{character_id}:{session_id}"
+
+    def load(
+        self, user_uid: str, character_id: int, session_id: str
+    ) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Đọc bản tóm tắt và các lượt hội thoại gần nhất của một phiên chat.
+
+        Args:
+            user_uid (str): Mã người dùng sở hữu phiên chat.
+            character_id (int): Mã nhân vật của phiên chat.
+            session_id (str): Mã phiên chat.
+
+        Returns:
+            Tuple[str, List[Dict[str, str]]]: Bản tóm tắt và danh sách lượt hội thoại
+            (từ cũ đến mới). Phiên không tồn tại trả về ("", []).
+        """
+        key = self._key(user_uid, character_id, session_id)
+        pipe = redis_client.pipeline()
+        pipe.hget(key, "summary")
+        pipe.lrange(f"{key}:turns", -self.max_turns, -1)
+        summary, turns = pipe.execute()
+        return summary or "", [json.loads(turn) for turn in turns]
+
+    def append(
+        self,
+        user_uid: str,
+        character_id: int,
+        session_id: str,
+        question: str,
+        answer: str,
+    ) -> bool:
+        """
+        Thêm một lượt hội thoại vào phiên chat.
+
+        Args:
+            user_uid (str): Mã người dùng sở hữu phiên chat.
+            character_id (int): Mã nhân vật của phiên chat.
+            session_id (str): Mã phiên chat.
+            question (str): Câu hỏi của người dùng.
+            answer (str): Câu trả lời của nhân vật.
+
+        Returns:
+            bool: True nếu phiên đã vượt quá `max_turns` và cần gọi `compact`.
+        """
+        key = self._key(user_uid, character_id, session_id)
+        turn = json.dumps({"question": question, "answer": answer}, ensure_ascii=False)
+        pipe = redis_client.pipeline()
+        pipe.rpush(f"{key}:turns", turn)
+        pipe.hsetnx(key, "summary", "")
+        pipe.expire(f"{key}:turns", self.ttl)
+        pipe.expire(key, self.ttl)
+        length = pipe.execute()[0]
+        return length > self.max_turns
+
+    def compact(
+        self,
+        user_uid: str,
+        character_id: int,
+        session_id: str,
+        character_name: str,
+    ) -> None:
+        """
+        Gộp các lượt hội thoại vượt quá `max_turns` vào bản tóm tắt của phiên chat.
+
+        Chỉ một tiến trình được tóm tắt một phiên tại một thời điểm; nếu phiên đang được
+        tóm tắt ở nơi khác thì bỏ qua, lượt tiếp theo sẽ tiếp tục gộp phần còn lại.
+
+        Args:
+            user_uid (str): Mã người dùng sở hữu phiên chat.
+            character_id (int): Mã nhân vật của phiên chat.
+            session_id (str): Mã phiên chat.
+            character_name (str): Tên đầy đủ của nhân vật, dùng trong prompt tóm tắt.
+        """
+        key = self._key(user_uid, character_id, session_id)
+        lock = redis_client.lock(f"{key}:lock", timeout=120, blocking=False)
+        if not lock.acquire():
+            return
+        try:
+            overflow = redis_client.llen(f"{key}:turns") - self.max_turns
+            if overflow <= 0:
+                return
+            old_turns = [
+                json.loads(turn)
+                for turn in redis_client.lrange(f"{key}:turns", 0, overflow - 1)
+            ]
+            summary = redis_client.hget(key, "summary") or ""
+            new_summary = AIService.summarize(summary, old_turns, character_name)
+
+            pipe = redis_client.pipeline()
+            pipe.hset(key, "summary", new_summary)
+            pipe.ltrim(f"{key}:turns", overflow, -1)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        finally:
+            lock.release()
@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from src.config import Config
 
 
 class ChatRequest(BaseModel):
@@ -8,10 +10,13 @@ class ChatRequest(BaseModel):
     Attributes:
         character_id (int): The ID of the character to chat with.
         question (str): The question asked by the user.
+        session_id (Optional[str]): The conversation session to continue; a new session is
+            started when omitted or expired.
     """
 
     character_id: int
     question: str
+    session_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -21,8 +26,75 @@ class ChatResponse(BaseModel):
     Attributes:
         prompt (str): The prompt returned by the character (e.g., their response).
         answer (str): The answer given by the character to the user's question.
-        log_id (int): The ID of the log associated with this chat session.
+        log_id (Optional[int]): The ID of the log associated with this chat session, or
+            None if the database was unavailable when it was recorded.
+        session_id (str): The conversation session to send with follow-up questions.
     """
 
     answer: str
-    log_id: int
+    log_id: Optional[int] = None
+    session_id: str
+
+
+class ChatJobResponse(BaseModel):
+    """
+    Schema representing the state of an asynchronous chat job.
+
+    Attributes:
+        job_id (str): The ID of the job, used to fetch its result.
+        status (str): One of "pending", "running", "done" or "failed".
+        answer (Optional[str]): The answer, once the job is done.
+        log_id (Optional[int]): The ID of the history log, once the job is done.
+        session_id (Optional[str]): The conversation session of the job.
+        error_code (Optional[str]): Why the job failed, if it did.
+    """
+
+    job_id: str
+    status: str
+    answer: Optional[str] = None
+    log_id: Optional[int] = None
+    session_id: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class ChatBatchRequest(BaseModel):
+    """
+    Schema representing a batch of independent questions to one character.
+
+    Attributes:
+        character_id (int): The ID of the character to ask.
+        questions (List[str]): The questions, answered without conversation context.
+    """
+
+    character_id: int
+    questions: List[str] = Field(
+        ..., min_length=1, max_length=Config.CHAT_BATCH_MAX_QUESTIONS
+    )
+
+
+class ChatBatchItem(BaseModel):
+    """
+    Schema representing the outcome of one question of a batch.
+
+    Attributes:
+        question (str): The question.
+        answer (Optional[str]): The answer, if the question was answered.
+        log_id (Optional[int]): The ID of the history log, if the question was answered.
+        error_code (Optional[str]): Why the question could not be answered, if it was not.
+    """
+
+    question: str
+    answer: Optional[str] = None
+    log_id: Optional[int] = None
+    error_code: Optional[str] = None
+
+
+class ChatBatchResponse(BaseModel):
+    """
+    Schema representing the answers to a batch of questions, in request order.
+
+    Attributes:
+        items (List[ChatBatchItem]): One item per question.
+    """
+
+    items: List[ChatBatchItem]
@@ -1,62 +1,299 @@
-from src.db.models import User, Character
+from typing import Iterator, List, Optional, Union
+from fastapi import BackgroundTasks
+from src.db.models import Character, User
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from src.errors import UserNotFound, CharacterNotFound, UserNotOwnsCharacter
+from src.errors import CharacterNotFound, UserNotOwnsCharacter, UserNotFound
+from src.auth.service import UserService
+from src.AI.service import AIService
+from src.AI.cache import AnswerCache
+from src.AI.prompt import Prompt
+from src.AI.singleflight import SingleFlight
+from src.characters.ownership import ownership_cache
+from .memory import ConversationMemory
+
+ai_service = AIService()
+answer_cache = AnswerCache()
+single_flight = SingleFlight()
+memory = ConversationMemory()
+user_service = UserService()
 
 
-# from src.AI.service import AIService
-# ai_service = AIService()
 class ChatService:
     """
     Service class to handle chat interactions between a user and a character.
     """
 
     def chat_character(
-        self, user_uid: str, character_id: int, question: str, db: Session
-    ) -> tuple[str, str]:
+        self,
+        user_uid: str,
+        character_id: int,
+        question: str,
+        db: Session,
+        session_id: Optional[str] = None,
+        background_tasks: Optional[BackgroundTasks] = None,
+    ) -> tuple[str, str, str]:
         """
         Allows a user to chat with a character by providing a question. The method validates
-        if the user exists and owns the specified character, then returns a prompt and answer.
+        if the user owns the specified character, then returns a prompt and answer. The user
+        is expected to be authenticated already, so it is not loaded again.
+
+        Follow-up questions are answered in the context of the conversation session: the
+        session's summary and recent turns are added to the prompt, and retrieval uses a
+        standalone rewrite of the question. Questions without conversation context are
+        served from the shared answer cache when possible, and identical questions in
+        flight at the same time share a single generation. Turns that fall out of the
+        recent window are folded into the summary after the response is sent when
+        `background_tasks` is given.
 
         Args:
-            user_uid (str): The unique identifier of the user.
+            user_uid (str): The unique identifier of the authenticated user.
             character_id (int): The ID of the character the user wants to interact with.
             question (str): The question to ask the character.
             db (Session): The database session.
+            session_id (Optional[str]): The conversation session to continue, if any.
+            background_tasks (Optional[BackgroundTasks]): Where to schedule summarization.
 
         Returns:
-            tuple[str, str]: A tuple containing the prompt and answer from the character.
+            tuple[str, str, str]: A tuple containing the prompt, the answer from the character
+            and the conversation session id.
 
         Raises:
-            UserNotFound: If the user with the specified UID does not exist.
             CharacterNotFound: If the character with the specified ID does not exist.
             UserNotOwnsCharacter: If the user does not own the specified character.
             SQLAlchemyError: If there is a database error during the process.
         """
         try:
-            # Query user and character from the database
-            user = db.query(User).filter(User.uid == user_uid).first()
             character = db.query(Character).filter(Character.id == character_id).first()
 
-            # Check if the user exists
-            if not user:
-                raise UserNotFound()
-
             # Check if the character exists
             if not character:
                 raise CharacterNotFound()
 
             # Check if the user owns the character
-            if character not in user.characters:
+            if not ownership_cache.owns(user_uid, character_id, db):
                 raise UserNotOwnsCharacter()
 
             character_short_name = character.short_name
             character_name = character.name
-            prompt = "Please answer"
-            answer = "I don't know"
-            # prompt, answer = ai_service.rag(question, character_short_name, character_name)
-            return prompt, answer
+            if not session_id:
+                session_id = memory.new_session_id()
+
+            summary, turns = memory.load(user_uid, character_id, session_id)
+            history = ai_service.format_history(summary, turns)
+            if history:
+                standalone_question = ai_service.rewrite_question(
+                    question, history, character_name
+                )
+                prompt, answer = ai_service.rag(
+                    question,
+                    character_short_name,
+                    character_name,
+                    history=history,
+                    standalone_question=standalone_question,
+                )
+            else:
+                # The first question of a session does not depend on any context,
+                # so it can be served from (and stored in) the shared answer cache.
+                cached = answer_cache.get(character_short_name, question)
+                if cached:
+                    prompt, answer = cached
+                else:
+                    # Versioned like the cache, so an answer generated from data replaced
+                    # in the meantime is not handed to new requests
+                    version = answer_cache.version(character_short_name)
+                    prompt, answer, reference = single_flight.do(
+                        f"{character_id}:{version}:{answer_cache.digest(question)}",
+                        lambda: self._generate(
+                            question, character_short_name, character_name
+                        ),
+                    )
+                    prompt = Prompt(prompt, reference)
+
+            if memory.append(user_uid, character_id, session_id, question, answer):
+                if background_tasks is not None:
+                    background_tasks.add_task(
+                        memory.compact,
+                        user_uid,
+                        character_id,
+                        session_id,
+                        character_name,
+                    )
+                else:
+                    memory.compact(user_uid, character_id, session_id, character_name)
+            return prompt, answer, session_id
 
         except SQLAlchemyError as e:
             db.rollback()
             raise Exception(f"Database error: {str(e)}")
+
+    def chat_batch(
+        self, user_uid: str, character_id: int, questions: List[str], db: Session
+    ) -> List[Union[tuple[str, str], Exception]]:
+        """
+        Answer several independent questions to one character in a single call.
+
+        Ownership is checked once for the whole batch. Questions found in the answer cache
+        are served from it, repeated questions are answered once, and the remaining ones
+        are searched together and generated concurrently by `AIService.rag_batch`.
+
+        Args:
+            user_uid (str): The unique identifier of the authenticated user.
+            character_id (int): The ID of the character to ask.
+            questions (List[str]): The questions, answered without conversation context.
+            db (Session): The database session.
+
+        Returns:
+            List[Union[tuple[str, str], Exception]]: The prompt and answer of each question,
+            in order, or the error that prevented answering it.
+
+        Raises:
+            CharacterNotFound: If the character with the specified ID does not exist.
+            UserNotOwnsCharacter: If the user does not own the specified character.
+        """
+        character = db.query(Character).filter(Character.id == character_id).first()
+        if not character:
+            raise CharacterNotFound()
+        if not ownership_cache.owns(user_uid, character_id, db):
+            raise UserNotOwnsCharacter()
+
+        answers = {}
+        pending = {}
+        for question in questions:
+            digest = answer_cache.digest(question)
+            if digest in answers or digest in pending:
+                continue
+            cached = answer_cache.get(character.short_name, question)
+            if cached:
+                answers[digest] = cached
+            else:
+                pending[digest] = question
+
+        if pending:
+            generated = ai_service.rag_batch(
+                list(pending.values()), character.short_name, character.name
+            )
+            for (digest, question), result in zip(pending.items(), generated):
+                if not isinstance(result, Exception):
+                    answer_cache.set(character.short_name, question, *result)
+                answers[digest] = result
+
+        return [answers[answer_cache.digest(question)] for question in questions]
+
+    def authorize_chat(
+        self, user_email: str, character_id: int, db: Session
+    ) -> tuple[User, Character]:
+        """
+        Check once that a user may chat with a character, e.g. when a chat connection opens.
+
+        Args:
+            user_email (str): The email of the authenticated user.
+            character_id (int): The ID of the character.
+            db (Session): The database session.
+
+        Returns:
+            tuple[User, Character]: The user and the character.
+
+        Raises:
+            UserNotFound: If the user no longer exists.
+            CharacterNotFound: If the character with the specified ID does not exist.
+            UserNotOwnsCharacter: If the user does not own the specified character.
+        """
+        user = user_service.get_user_by_email(user_email, db)
+        if not user:
+            raise UserNotFound()
+        character = db.query(Character).filter(Character.id == character_id).first()
+        if not character:
+            raise CharacterNotFound()
+        if not ownership_cache.owns(user.uid, character_id, db):
+            raise UserNotOwnsCharacter()
+        return user, character
+
+    def stream_character(
+        self,
+        user_uid: str,
+        character: Character,
+        question: str,
+        session_id: Optional[str] = None,
+        background_tasks: Optional[BackgroundTasks] = None,
+    ) -> tuple[str, Iterator[str], str]:
+        """
+        Answer a question like `chat_character`, but return the answer as a stream of text
+        chunks. The caller must already have checked that the user owns the character.
+
+        The answer cache is used for context-free questions as in `chat_character`; a cached
+        answer is returned as a single chunk. The turn is added to the conversation session
+        once the stream has been fully consumed.
+
+        Args:
+            user_uid (str): The unique identifier of the authenticated user.
+            character (Character): The character, already loaded and checked for ownership.
+            question (str): The question to ask the character.
+            session_id (Optional[str]): The conversation session to continue, if any.
+            background_tasks (Optional[BackgroundTasks]): Where to schedule summarization.
+
+        Returns:
+            tuple[str, Iterator[str], str]: The prompt, the stream of answer chunks and the
+            conversation session id.
+        """
+        if not session_id:
+            session_id = memory.new_session_id()
+
+        summary, turns = memory.load(user_uid, character.id, session_id)
+        history = ai_service.format_history(summary, turns)
+        cache_answer = False
+        if history:
+            standalone_question = ai_service.rewrite_question(
+                question, history, character.name
+            )
+            prompt, tokens = ai_service.rag_stream(
+                question,
+                character.short_name,
+                character.name,
+                history=history,
+                standalone_question=standalone_question,
+            )
+        else:
+            cached = answer_cache.get(character.short_name, question)
+            if cached:
+                prompt, tokens = cached[0], iter([cached[1]])
+            else:
+                prompt, tokens = ai_service.rag_stream(
+                    question, character.short_name, character.name
+                )
+                cache_answer = True
+
+        def stream() -> Iterator[str]:
+            chunks = []
+            for chunk in tokens:
+                chunks.append(chunk)
+                yield chunk
+            answer = "".join(chunks)
+            if cache_answer:
+                answer_cache.set(character.short_name, question, prompt, answer)
+            if memory.append(user_uid, character.id, session_id, question, answer):
+                if background_tasks is not None:
+                    background_tasks.add_task(
+                        memory.compact,
+                        user_uid,
+                        character.id,
+                        session_id,
+                        character.name,
+                    )
+                else:
+                    memory.compact(user_uid, character.id, session_id, character.name)
+
+        return prompt, stream(), session_id
+
+    def _generate(
+        self, question: str, character_short_name: str, character_name: str
+    ) -> tuple[str, str, Optional[dict]]:
+        """
+        Answer a context-free question with the RAG pipeline and store it in the answer cache.
+
+        Identical questions arriving at the same time share one call through `single_flight`,
+        so the prompt reference is returned separately to survive its JSON round trip.
+        """
+        prompt, answer = ai_service.rag(question, character_short_name, character_name)
+        answer_cache.set(character_short_name, question, prompt, answer)
+        return prompt, answer, prompt.reference
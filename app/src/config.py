@@ -18,6 +18,60 @@ class Settings(BaseSettings):
     USE_CREDENTIALS: bool = True
     VALIDATE_CERTS: bool = True
     DOMAIN: str
+    CHAT_MEMORY_TURNS: int = 6
+    CHAT_SESSION_TTL: int = 86400
+    ANSWER_CACHE_TTL: int = 604800
+    WARMUP_CONCURRENCY: int = 2
+    LLM_LARGE_MODEL: str = "gemma2"
+    LLM_SMALL_MODEL: str = "gemma2:2b"
+    LLM_SMALL_MAX_WORDS: int = 12
+    LLM_SMALL_MIN_SCORE: float = 0.85
+    LLM_ROUTE_OVERRIDES: dict[str, str] = {}
+    LLM_MAX_CONCURRENCY: int = 4
+    LLM_MAX_TOKENS: int = 512
+    LLM_MIN_MAX_TOKENS: int = 96
+    LLM_QUEUE_THRESHOLD: int = 8
+    LLM_LATENCY_TARGET: float = 8.0
+    LLM_GENERATION_OVERRIDES: dict[str, dict[str, float]] = {}
+    LLM_INFLIGHT_TTL: int = 600
+    LLM_YIELD_POLL_INTERVAL: float = 0.5
+    CHAT_JOB_TTL: int = 3600
+    CHAT_JOB_TIMEOUT: int = 300
+    CHAT_JOB_WORKERS: int = 4
+    CHAT_JOB_POLL_INTERVAL: float = 0.25
+    SINGLE_FLIGHT_LOCK_TTL: int = 120
+    SINGLE_FLIGHT_RESULT_TTL: int = 30
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 0.2
+    SINGLE_FLIGHT_WAIT_TIMEOUT: float = 60.0
+    OWNERSHIP_CACHE_TTL: int = 3600
+    OWNERSHIP_LOCAL_TTL: int = 60
+    CATALOG_CACHE_TTL: int = 86400
+    CATALOG_CACHE_CONTROL: str = "public, max-age=60, stale-while-revalidate=300"
+    CHAT_BATCH_MAX_QUESTIONS: int = 20
+    CHAT_RATE_LIMITS: dict[str, dict[str, float]] = {
+        "user": {"capacity": 20, "rate": 0.2},
+        "admin": {"capacity": 100, "rate": 2},
+    }
+    CHAT_CHARACTER_RATE_LIMIT: dict[str, float] = {"capacity": 120, "rate": 2}
+    CHAT_CHARACTER_RATE_LIMIT_OVERRIDES: dict[str, dict[str, float]] = {}
+    HISTORY_LOG_PAGE_SIZE: int = 50
+    HISTORY_LOG_MAX_PAGE_SIZE: int = 200
+    HISTORY_LOG_PROMPT_STORAGE: str = "compressed"
+    HISTORY_LOG_PROMPT_CODEC: str = "zlib"
+    HISTORY_LOG_BATCH_SIZE: int = 100
+    HISTORY_LOG_FLUSH_INTERVAL_MS: int = 200
+    HISTORY_LOG_SPOOL_PATH: str = "history_logs.spool"
+    HISTORY_LOG_DEAD_LETTER_PATH: str = "history_logs.failed"
+    HISTORY_LOG_ID_BLOCK: int = 100
+    HISTORY_LOG_FEEDBACK_BULK_MAX: int = 500
+    HISTORY_LOG_RETENTION_MONTHS: int = 12
+    HISTORY_LOG_ARCHIVE_DIR: str = "archive"
+    HISTORY_LOG_ARCHIVE_BUCKET_PREFIX: str = ""
+    HISTORY_LOG_RETENTION_DAYS: int = 0
+    HISTORY_LOG_PURGE_BATCH_SIZE: int = 1000
+    HISTORY_LOG_PURGE_PAUSE_MS: int = 100
+    HISTORY_LOG_PURGE_MAX_BATCH_MS: int = 500
+    HISTORY_LOG_PURGE_INTERVAL: int = 86400
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
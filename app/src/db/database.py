@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from src.db.models import Base as auth_base
 from src.db.models import Base as char_base
@@ -8,6 +10,26 @@ engine = create_engine(Config.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+class QueryCounter:
+    """Counts the SQL statements issued while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+
+
+# Set per request by the logging middleware; threadpool workers share the same counter
+query_counter: ContextVar[Optional[QueryCounter]] = ContextVar(
+    "query_counter", default=None
+)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = query_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
 def init_db():
     auth_base.metadata.create_all(bind=engine)
     char_base.metadata.create_all(bind=engine)
@@ -10,7 +10,13 @@ from sqlalchemy import (
     Table,
     ForeignKey,
     Integer,
+    BigInteger,
+    Index,
+    JSON,
+    LargeBinary,
+    Date,
 )
+from sqlalchemy import DDL, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -22,6 +28,8 @@ user_character_association = Table(
     Base.metadata,
     Column("user_uid", String(36), ForeignKey("user_accounts.uid"), primary_key=True),
     Column("character_id", Integer, ForeignKey("characters.id"), primary_key=True),
+    # Khóa chính bắt đầu bằng user_uid; chỉ mục này phục vụ các truy vấn theo character_id trước
+    Index("ix_user_character_character_user", "character_id", "user_uid"),
 )
 
 
@@ -71,6 +79,14 @@ class User(Base):
     balance = Column(
         Float, default=0.0, info={"description": "Balance in the user's account"}
     )
+    # Tăng lên mỗi khi hàng được cập nhật, dùng để tạo ETag cho /auth/me
+    row_version = Column(
+        Integer,
+        nullable=False,
+        default=1,
+        server_default="1",
+        info={"description": "Incremented on every update of the row"},
+    )
 
     characters = relationship(
         "Character",
@@ -81,6 +97,7 @@ class User(Base):
 
     history_logs = relationship(
         "HistoryLog",
+        primaryjoin="User.uid == foreign(HistoryLog.user_id)",
         back_populates="user",
         info={"description": "User's activity logs"},
     )
@@ -92,6 +109,12 @@ class User(Base):
     )
 
 
+@event.listens_for(User, "before_update")
+def bump_user_row_version(mapper, connection, target):
+    # Tăng trong câu UPDATE để các cập nhật đồng thời đều được tính
+    target.row_version = User.row_version + 1
+
+
 class Character(Base):
     """
     Bảng Character lưu trữ thông tin về các nhân vật và thiết lập quan hệ với các bảng khác.
@@ -160,6 +183,7 @@ class Character(Base):
 
     history_logs = relationship(
         "HistoryLog",
+        primaryjoin="Character.id == foreign(HistoryLog.character_id)",
         back_populates="character",
         info={"description": "Character's activity logs"},
     )
@@ -171,22 +195,29 @@ class HistoryLog(Base):
     """
 
     __tablename__ = "history_logs"
+    # Trên MySQL, bảng được phân vùng theo tháng của created_at (xem src/history_logs/archive.py).
+    # MySQL không cho phép khóa ngoại trên bảng phân vùng và yêu cầu khóa chính chứa cột
+    # phân vùng, nên user_id/character_id không khai báo ForeignKey và khóa chính là (id, created_at).
+    # Chỉ mục cho phân trang theo (created_at, id) của từng người dùng và từng nhân vật
+    __table_args__ = (
+        Index("ix_history_logs_user_created", "user_id", "created_at", "id"),
+        Index("ix_history_logs_character_created", "character_id", "created_at", "id"),
+    )
 
+    # Id được cấp bởi IdAllocator (src/db/sequence.py), không dùng AUTO_INCREMENT
     id = Column(
         Integer,
         primary_key=True,
-        autoincrement=True,
+        autoincrement=False,
         info={"description": "Unique identifier for each log"},
     )
     user_id = Column(
         String(36),
-        ForeignKey("user_accounts.uid"),
         nullable=False,
         info={"description": "User ID"},
     )
     character_id = Column(
         Integer,
-        ForeignKey("characters.id"),
         nullable=False,
         info={"description": "Character ID"},
     )
@@ -195,11 +226,23 @@ class HistoryLog(Base):
         nullable=False,
         info={"description": "User's question regarding the character"},
     )
+    # Prompt được lưu theo một trong ba dạng, tùy cấu hình HISTORY_LOG_PROMPT_STORAGE:
+    # toàn văn (prompt), nén (prompt_blob) hoặc tham chiếu để dựng lại (prompt_ref)
     prompt = Column(
         Text,
-        nullable=False,
+        nullable=True,
         info={"description": "Prompt or context provided to the user"},
     )
+    prompt_blob = Column(
+        LargeBinary(length=16777215),
+        nullable=True,
+        info={"description": "Compressed prompt (zlib or zstd)"},
+    )
+    prompt_ref = Column(
+        JSON,
+        nullable=True,
+        info={"description": "Template version, retrieved doc ids and history of the prompt"},
+    )
     answer = Column(
         Text, nullable=False, info={"description": "Answer given to the user"}
     )
@@ -210,6 +253,7 @@ class HistoryLog(Base):
     )
     created_at = Column(
         TIMESTAMP,
+        primary_key=True,
         server_default=func.current_timestamp(),
         nullable=False,
         info={"description": "Timestamp of log creation"},
@@ -217,11 +261,13 @@ class HistoryLog(Base):
 
     user = relationship(
         "User",
+        primaryjoin="foreign(HistoryLog.user_id) == User.uid",
         back_populates="history_logs",
         info={"description": "User associated with the log"},
     )
     character = relationship(
         "Character",
+        primaryjoin="foreign(HistoryLog.character_id) == Character.id",
         back_populates="history_logs",
         info={"description": "Character associated with the log"},
     )
@@ -233,6 +279,8 @@ class Payment(Base):
     """
 
     __tablename__ = "payments"
+    # Chỉ mục cho danh sách đơn mua của người dùng
+    __table_args__ = (Index("ix_payments_user_created", "user_id", "created_at"),)
 
     id = Column(
         Integer,
@@ -286,3 +334,158 @@ class Payment(Base):
         back_populates="purchase_orders",
         info={"description": "Người dùng liên kết với đơn mua"},
     )
+
+
+class IdSequence(Base):
+    """
+    Bảng IdSequence cấp phát trước các khối id cho những bảng được ghi theo lô (write-behind).
+    """
+
+    __tablename__ = "id_sequences"
+
+    name = Column(
+        String(64),
+        primary_key=True,
+        info={"description": "Name of the table the sequence allocates ids for"},
+    )
+    next_id = Column(
+        BigInteger,
+        nullable=False,
+        info={"description": "First id that has not been reserved yet"},
+    )
+
+
+class PromptTemplate(Base):
+    """
+    Bảng PromptTemplate lưu các phiên bản mẫu prompt, dùng để dựng lại prompt được lưu dạng tham chiếu.
+    """
+
+    __tablename__ = "prompt_templates"
+
+    version = Column(
+        String(16),
+        primary_key=True,
+        info={"description": "Hash of the template text"},
+    )
+    template = Column(
+        Text, nullable=False, info={"description": "Template text"}
+    )
+    created_at = Column(
+        TIMESTAMP,
+        server_default=func.current_timestamp(),
+        nullable=False,
+        info={"description": "Timestamp the template was first used"},
+    )
+
+
+class CharacterFeedbackStats(Base):
+    """
+    Bảng CharacterFeedbackStats lưu số lượt chat, lượt thích và không thích của từng nhân vật theo ngày,
+    được cập nhật dần khi ghi log và khi người dùng đánh giá câu trả lời.
+    """
+
+    __tablename__ = "character_feedback_stats"
+
+    character_id = Column(
+        Integer,
+        ForeignKey("characters.id"),
+        primary_key=True,
+        info={"description": "Character ID"},
+    )
+    day = Column(
+        Date,
+        primary_key=True,
+        info={"description": "Day the logs were created"},
+    )
+    chats = Column(
+        Integer, nullable=False, default=0, info={"description": "Number of chats"}
+    )
+    likes = Column(
+        Integer, nullable=False, default=0, info={"description": "Number of likes"}
+    )
+    dislikes = Column(
+        Integer, nullable=False, default=0, info={"description": "Number of dislikes"}
+    )
+
+
+class HistoryLogArchiveFile(Base):
+    """
+    Bảng HistoryLogArchiveFile ghi lại các tháng log đã được chuyển khỏi bảng history_logs sang tệp Parquet.
+    """
+
+    __tablename__ = "history_log_archives"
+
+    month = Column(
+        String(7),
+        primary_key=True,
+        info={"description": "Archived month, as YYYY-MM"},
+    )
+    location = Column(
+        String(1024),
+        nullable=False,
+        info={"description": "Path or object name of the Parquet file"},
+    )
+    rows = Column(
+        Integer, nullable=False, info={"description": "Number of archived logs"}
+    )
+    created_at = Column(
+        TIMESTAMP,
+        server_default=func.current_timestamp(),
+        nullable=False,
+        info={"description": "Timestamp of the archival"},
+    )
+
+
+class HistoryLogSearch(Base):
+    """
+    Bảng HistoryLogSearch chứa bản sao câu hỏi và câu trả lời của từng log để tìm kiếm toàn văn.
+    """
+
+    __tablename__ = "history_log_search"
+    # MySQL không hỗ trợ chỉ mục FULLTEXT trên bảng phân vùng, nên văn bản được tìm kiếm nằm
+    # trong bảng riêng này. Trên SQLite, bảng ảo FTS5 history_log_search_fts đóng vai trò đó
+    # (xem src/history_logs/search.py).
+    __table_args__ = (
+        Index(
+            "ix_history_log_search_text",
+            "question",
+            "answer",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ).ddl_if(dialect="mysql"),
+        Index("ix_history_log_search_character_created", "character_id", "created_at"),
+        Index("ix_history_log_search_created", "created_at", "log_id"),
+    )
+
+    log_id = Column(
+        Integer,
+        primary_key=True,
+        autoincrement=False,
+        info={"description": "ID of the history log"},
+    )
+    character_id = Column(
+        Integer, nullable=False, info={"description": "Character ID"}
+    )
+    created_at = Column(
+        TIMESTAMP,
+        nullable=False,
+        info={"description": "Timestamp of log creation"},
+    )
+    question = Column(Text, nullable=False, info={"description": "User's question"})
+    answer = Column(Text, nullable=False, info={"description": "AI's answer"})
+
+
+# Bảng ảo FTS5 thay cho chỉ mục FULLTEXT của MySQL khi chạy trên SQLite
+event.listen(
+    HistoryLogSearch.__table__,
+    "after_create",
+    DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS history_log_search_fts "
+        "USING fts5(question, answer, content='history_log_search', content_rowid='log_id')"
+    ).execute_if(dialect="sqlite"),
+)
+event.listen(
+    HistoryLogSearch.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS history_log_search_fts").execute_if(dialect="sqlite"),
+)
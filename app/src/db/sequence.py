@@ -0,0 +1,75 @@
+import threading
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from src.db.database import SessionLocal
+from src.db.models import IdSequence
+
+RESERVE_ATTEMPTS = 3
+
+
+class IdAllocator:
+    """
+    Hands out ids for rows that are inserted later, e.g. by a write-behind writer.
+
+    Ids are reserved from the `id_sequences` table in blocks of `block_size`, so the
+    database is touched once per block rather than once per row. Ids left unused in a
+    block when the process stops are simply skipped.
+    """
+
+    def __init__(self, model, block_size: int = 100):
+        self.model = model
+        self.name = model.__tablename__
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def _reserve(self, db: Session) -> int:
+        row = db.execute(
+            select(IdSequence.next_id)
+            .where(IdSequence.name == self.name)
+            .with_for_update()
+        ).first()
+        if row is None:
+            start = (db.execute(select(func.max(self.model.id))).scalar() or 0) + 1
+            db.execute(
+                insert(IdSequence).values(
+                    name=self.name, next_id=start + self.block_size
+                )
+            )
+        else:
+            start = row.next_id
+            db.execute(
+                update(IdSequence)
+                .where(IdSequence.name == self.name)
+                .values(next_id=IdSequence.next_id + self.block_size)
+            )
+        db.commit()
+        return start
+
+    def next_id(self) -> int:
+        """
+        Get the next unused id.
+
+        Returns:
+            int: An id no other process will hand out.
+        """
+        with self._lock:
+            if self._next >= self._end:
+                with SessionLocal() as db:
+                    for attempt in range(RESERVE_ATTEMPTS):
+                        try:
+                            start = self._reserve(db)
+                            break
+                        except (IntegrityError, OperationalError):
+                            # Concurrent first use: the other process created the row
+                            # first, or (MySQL) both locked the gap and one was picked as
+                            # the deadlock victim
+                            db.rollback()
+                            if attempt == RESERVE_ATTEMPTS - 1:
+                                raise
+                self._next, self._end = start, start + self.block_size
+            allocated = self._next
+            self._next += 1
+            return allocated
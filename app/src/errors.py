@@ -93,6 +93,32 @@ class UserNotOwnsCharacter(AuthException):
     pass
 
 
+class ChatJobNotFound(AuthException):
+    """Chat job not found or expired"""
+
+    pass
+
+
+class InvalidCursor(AuthException):
+    """User has provided a malformed pagination cursor"""
+
+    pass
+
+
+class InvalidFields(AuthException):
+    """User has requested fields that the response does not have"""
+
+    pass
+
+
+class RateLimitExceeded(AuthException):
+    """User has sent too many requests and must wait before retrying"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
 class PaymentNotFound(AuthException):
     """Payment has provided an email for a Payment who exists during sign up."""
 
@@ -162,6 +188,38 @@ def register_error_handlers(app: FastAPI):
             },
         ),
     )
+    app.add_exception_handler(
+        ChatJobNotFound,
+        create_exception_handler(
+            status_code=status.HTTP_404_NOT_FOUND,
+            initial_detail={
+                "message": "Chat job not found or expired",
+                "error_code": "chat_job_not_found",
+            },
+        ),
+    )
+    app.add_exception_handler(
+        InvalidCursor,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_detail={
+                "message": "Invalid pagination cursor",
+                "error_code": "invalid_cursor",
+            },
+        ),
+    )
+
+    app.add_exception_handler(
+        InvalidFields,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_detail={
+                "message": "Unknown field requested in fields",
+                "error_code": "invalid_fields",
+            },
+        ),
+    )
+
     app.add_exception_handler(
         InvalidFileType,
         create_exception_handler(
@@ -269,6 +327,18 @@ def register_error_handlers(app: FastAPI):
         ),
     )
 
+    @app.exception_handler(RateLimitExceeded)
+    async def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+
+        return JSONResponse(
+            content={
+                "message": "Too many requests. Please try again later.",
+                "error_code": "rate_limit_exceeded",
+            },
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
     @app.exception_handler(500)
     async def internal_server_error(request, exc):
 
@@ -0,0 +1,337 @@
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from src.config import Config
+from src.db.models import HistoryLog, HistoryLogArchiveFile
+from .search import search_index
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+ARCHIVE_COLUMNS = [
+    "id",
+    "user_id",
+    "character_id",
+    "question",
+    "prompt",
+    "prompt_blob",
+    "prompt_ref",
+    "answer",
+    "feedback",
+    "created_at",
+]
+# By far the largest columns; listings read them only for the logs of the page
+ARCHIVE_PROMPT_COLUMNS = ["prompt", "prompt_blob", "prompt_ref"]
+# Rows per Parquet row group. The files are sorted by user, so the min/max statistics of
+# each row group let user reads skip all the groups of other users.
+ARCHIVE_ROW_GROUP_SIZE = 5000
+
+
+def month_start(day: date, offset: int = 0) -> date:
+    """
+    Get the first day of the month of `day`, shifted by `offset` months.
+
+    Args:
+        day (date): Any day of the month.
+        offset (int): The number of months to shift by (may be negative).
+
+    Returns:
+        date: The first day of the resulting month.
+    """
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+class HistoryLogArchive:
+    """
+    Monthly partitions of `history_logs` (MySQL) and their archival to Parquet files.
+
+    Each month of logs lives in its own RANGE partition on UNIX_TIMESTAMP(created_at), so
+    hot queries only touch recent partitions and old months can be removed with a cheap
+    DROP PARTITION. Before a month is dropped, its rows are written to a zstd-compressed
+    Parquet file in `archive_dir`, uploaded to Firebase Storage under `bucket_prefix` if
+    it is set, and recorded in `history_log_archives` so listings can still read it.
+    The files are sorted by (user_id, created_at, id), so reads by user only decode the
+    row groups of that user.
+    """
+
+    def __init__(
+        self,
+        archive_dir: str = Config.HISTORY_LOG_ARCHIVE_DIR,
+        bucket_prefix: str = Config.HISTORY_LOG_ARCHIVE_BUCKET_PREFIX,
+    ):
+        self.archive_dir = archive_dir
+        self.bucket_prefix = bucket_prefix
+
+    @staticmethod
+    def partitioned(db: Session) -> bool:
+        """
+        Check whether `history_logs` is partitioned (only ever the case on MySQL).
+        """
+        if db.get_bind().dialect.name != "mysql":
+            return False
+        return bool(
+            db.execute(
+                text(
+                    "SELECT COUNT(*) FROM information_schema.PARTITIONS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'history_logs' "
+                    "AND PARTITION_NAME IS NOT NULL"
+                )
+            ).scalar()
+        )
+
+    @staticmethod
+    def partitions(db: Session) -> List[str]:
+        """
+        List the monthly partitions of `history_logs`, oldest first (without `pmax`).
+        """
+        rows = db.execute(
+            text(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'history_logs' "
+                "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+            )
+        )
+        return [row[0] for row in rows if row[0] != "pmax"]
+
+    def ensure_partitions(self, db: Session, months_ahead: int = 2) -> List[str]:
+        """
+        Create the partitions of the coming months by splitting them off `pmax`.
+
+        Args:
+            db (Session): The database session.
+            months_ahead (int): How many months after the current one must have a partition.
+
+        Returns:
+            List[str]: The names of the partitions created.
+        """
+        existing = set(self.partitions(db))
+        created = []
+        for offset in range(months_ahead + 1):
+            month = month_start(date.today(), offset)
+            name = partition_name(month)
+            if name in existing:
+                continue
+            db.execute(
+                text(
+                    f"ALTER TABLE history_logs REORGANIZE PARTITION pmax INTO ("
+                    f"PARTITION {name} VALUES LESS THAN "
+                    f"(UNIX_TIMESTAMP('{month_start(month, 1)}')), "
+                    f"PARTITION pmax VALUES LESS THAN MAXVALUE)"
+                )
+            )
+            created.append(name)
+        return created
+
+    def _location(self, month: str) -> str:
+        return os.path.join(self.archive_dir, "history_logs", f"{month}.parquet")
+
+    def archive_month(self, db: Session, month: date) -> int:
+        """
+        Move one month of logs to a Parquet file and drop its partition.
+
+        The partition is only dropped once the file has been written and recorded, so an
+        interrupted run can simply be started again.
+
+        Args:
+            db (Session): The database session.
+            month (date): The first day of the month to archive.
+
+        Returns:
+            int: The number of archived logs.
+        """
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is required to archive history logs")
+
+        name = partition_name(month)
+        key = f"{month:%Y-%m}"
+        path = self._location(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        columns = [getattr(HistoryLog, column) for column in ARCHIVE_COLUMNS]
+        query = (
+            select(*columns)
+            .with_hint(HistoryLog, f"PARTITION ({name})", "mysql")
+            .order_by(HistoryLog.user_id, HistoryLog.created_at, HistoryLog.id)
+            .execution_options(yield_per=ARCHIVE_ROW_GROUP_SIZE)
+        )
+        schema = pyarrow.schema(
+            [
+                ("id", pyarrow.int64()),
+                ("user_id", pyarrow.string()),
+                ("character_id", pyarrow.int64()),
+                ("question", pyarrow.string()),
+                ("prompt", pyarrow.string()),
+                ("prompt_blob", pyarrow.binary()),
+                ("prompt_ref", pyarrow.string()),
+                ("answer", pyarrow.string()),
+                ("feedback", pyarrow.string()),
+                ("created_at", pyarrow.timestamp("us")),
+            ]
+        )
+        rows = 0
+        with parquet.ParquetWriter(path, schema, compression="zstd") as writer:
+            for batch in db.execute(query).partitions():
+                records = [dict(row._mapping) for row in batch]
+                for record in records:
+                    if record["prompt_ref"] is not None:
+                        record["prompt_ref"] = json.dumps(record["prompt_ref"])
+                writer.write_table(
+                    pyarrow.Table.from_pylist(records, schema=schema),
+                    row_group_size=ARCHIVE_ROW_GROUP_SIZE,
+                )
+                rows += len(records)
+
+        location = path
+        if self.bucket_prefix:
+            location = self._upload(path, key)
+
+        db.merge(HistoryLogArchiveFile(month=key, location=location, rows=rows))
+        db.commit()
+        db.execute(text(f"ALTER TABLE history_logs DROP PARTITION {name}"))
+        search_index.remove_range(
+            db,
+            datetime.combine(month, datetime.min.time()),
+            datetime.combine(month_start(month, 1), datetime.min.time()),
+        )
+        return rows
+
+    def _upload(self, path: str, key: str) -> str:
+        from firebase_admin import storage
+
+        name = f"{self.bucket_prefix.rstrip('/')}/history_logs/{key}.parquet"
+        storage.bucket().blob(name).upload_from_filename(path)
+        return f"gs://{name}"
+
+    def _local_path(self, archive: HistoryLogArchiveFile) -> str:
+        if not archive.location.startswith("gs://"):
+            return archive.location
+        # Archives in object storage are downloaded once and read locally afterwards
+        path = self._location(archive.month)
+        if not os.path.exists(path):
+            from firebase_admin import storage
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            name = archive.location[len("gs://") :]
+            storage.bucket().blob(name).download_to_filename(path)
+        return path
+
+    def expired_partitions(self, db: Session, retention_months: int) -> List[date]:
+        """
+        Get the months whose partitions are older than the retention window.
+
+        Args:
+            db (Session): The database session.
+            retention_months (int): The number of months, including the current one, kept
+                in the table.
+
+        Returns:
+            List[date]: The first day of each expired month, oldest first.
+        """
+        cutoff = partition_name(month_start(date.today(), -(retention_months - 1)))
+        return [
+            datetime.strptime(name[1:], "%Y%m").date()
+            for name in self.partitions(db)
+            if name < cutoff
+        ]
+
+    def read(
+        self,
+        db: Session,
+        column: str,
+        value: Any,
+        limit: int,
+        before: Optional[tuple] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        prompts: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Read archived logs matching `column == value`, newest first, in keyset order.
+
+        The matching logs are found without reading the prompt columns. The prompts are
+        then read only for the logs returned.
+
+        Args:
+            db (Session): The database session.
+            column (str): "user_id" or "character_id".
+            value (Any): The value to match.
+            limit (int): The maximum number of logs to return.
+            before (Optional[tuple]): Only return logs before this (created_at, id).
+            start (Optional[datetime]): Only return logs created at or after this time.
+            end (Optional[datetime]): Only return logs created before this time.
+            prompts (bool): Whether to read the prompt columns of the returned logs.
+
+        Returns:
+            List[Dict[str, Any]]: The archived logs, as column values.
+        """
+        if pyarrow is None:
+            logging.warning("pyarrow is not installed, archived history logs are skipped")
+            return []
+
+        archives = db.query(HistoryLogArchiveFile).order_by(
+            HistoryLogArchiveFile.month.desc()
+        )
+        results = []
+        for archive in archives:
+            month = datetime.strptime(archive.month, "%Y-%m")
+            month_end = datetime.combine(month_start(month.date(), 1), datetime.min.time())
+            if (start is not None and month_end <= start) or (
+                end is not None and month >= end
+            ) or (before is not None and month > before[0]):
+                continue
+
+            filters = [(column, "=", value)]
+            if start is not None:
+                filters.append(("created_at", ">=", start))
+            if end is not None:
+                filters.append(("created_at", "<", end))
+            path = self._local_path(archive)
+            rows = parquet.read_table(
+                path,
+                columns=[c for c in ARCHIVE_COLUMNS if c not in ARCHIVE_PROMPT_COLUMNS],
+                filters=filters,
+            )
+            rows = sorted(
+                rows.to_pylist(), key=lambda row: (row["created_at"], row["id"]), reverse=True
+            )
+            page = []
+            for row in rows:
+                if before is not None and (row["created_at"], row["id"]) >= before:
+                    continue
+                page.append(row)
+                if len(results) + len(page) >= limit:
+                    break
+            if prompts and page:
+                self._read_prompts(path, column, value, page)
+            results += page
+            if len(results) >= limit:
+                return results
+        return results
+
+    @staticmethod
+    def _read_prompts(path: str, column: str, value: Any, rows: List[dict]) -> None:
+        # Filtering on `column` too keeps the row groups of other users skipped
+        prompts = parquet.read_table(
+            path,
+            columns=["id", *ARCHIVE_PROMPT_COLUMNS],
+            filters=[(column, "=", value), ("id", "in", [row["id"] for row in rows])],
+        )
+        by_id = {prompt.pop("id"): prompt for prompt in prompts.to_pylist()}
+        for row in rows:
+            row.update(by_id[row["id"]])
+            if row["prompt_ref"] is not None:
+                row["prompt_ref"] = json.loads(row["prompt_ref"])
+
+history_log_archive = HistoryLogArchive()
@@ -1,10 +1,22 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import date, datetime
+from typing import List, Optional
+from src.config import Config
 from src.db.database import get_db
-from src.auth.dependencies import RoleChecker
+from src.auth.dependencies import RoleChecker, get_current_user
+from src.auth.schemas import UserResponse
+from src.utils.fields import SparseFields, sparse_response
 from .service import HistoryLogService
-from .schemas import HistoryLogResponse, FeedbackRequest
+from .schemas import (
+    HistoryLogPage,
+    HistoryLogResponse,
+    FeedbackRequest,
+    FeedbackBulkRequest,
+    FeedbackBulkResponse,
+    FeedbackStatsResponse,
+)
 
 # Initialize router and services
 log_router = APIRouter()
@@ -13,50 +25,243 @@ admin_role_checker = RoleChecker(["admin"])
 user_role_checker = RoleChecker(["user"])
 admin_or_user_role_checker = RoleChecker(["admin", "user"])
 char_router = APIRouter()
+log_fields = SparseFields(HistoryLogResponse)
 
 
-@log_router.get("/user", response_model=List[HistoryLogResponse])
+class PageParams:
+    """
+    Query parameters shared by the paginated history log listings.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(
+            Config.HISTORY_LOG_PAGE_SIZE, ge=1, le=Config.HISTORY_LOG_MAX_PAGE_SIZE
+        ),
+        cursor: Optional[str] = Query(
+            None, description="`next_cursor` of the previous page"
+        ),
+        start: Optional[datetime] = Query(None, description="Created at or after"),
+        end: Optional[datetime] = Query(None, description="Created before"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.start = start
+        self.end = end
+
+
+@log_router.get("/me", response_model=HistoryLogPage)
+def get_my_history_logs(
+    page: PageParams = Depends(),
+    fields: Optional[List[str]] = Depends(log_fields),
+    db: Session = Depends(get_db),
+    user: UserResponse = Depends(get_current_user),
+):
+    """
+    Get the history logs of the current user, newest first, one page at a time.
+
+    Args:
+        page (PageParams): The page size, cursor and optional date range.
+        fields (Optional[List[str]]): Only return these fields of each log.
+        db (Session): The database session dependency.
+
+    Returns:
+        HistoryLogPage: A page of history logs and the cursor of the next page.
+    """
+    logs = history_service.get_history_logs_by_user_id(
+        db, user.uid, page.limit, page.cursor, page.start, page.end, fields=fields
+    )
+    return sparse_response(logs, fields)
+
+
+@log_router.get("/user", response_model=HistoryLogPage)
 def get_user_history_logs(
-    email: str, db: Session = Depends(get_db), _: bool = Depends(admin_role_checker)
+    email: str,
+    page: PageParams = Depends(),
+    fields: Optional[List[str]] = Depends(log_fields),
+    include_archived: bool = Query(False, description="Also read archived months"),
+    db: Session = Depends(get_db),
+    _: bool = Depends(admin_role_checker),
 ):
     """
-    Get history logs for a user by their email.
+    Get history logs for a user by their email, newest first, one page at a time.
 
     Args:
         email (str): The user's email.
+        page (PageParams): The page size, cursor and optional date range.
+        fields (Optional[List[str]]): Only return these fields of each log.
+        include_archived (bool): Continue into archived months once the table runs out.
         db (Session): The database session dependency.
 
     Returns:
-        List[HistoryLogResponse]: A list of history logs for the user.
+        HistoryLogPage: A page of history logs and the cursor of the next page.
     """
-    history_logs = history_service.get_history_logs_by_user(db, email)
-    return history_logs or []
+    logs = history_service.get_history_logs_by_user(
+        db,
+        email,
+        page.limit,
+        page.cursor,
+        page.start,
+        page.end,
+        include_archived,
+        fields,
+    )
+    return sparse_response(logs, fields)
 
 
-@log_router.get("/character/{character_id}", response_model=List[HistoryLogResponse])
+@log_router.get("/character/{character_id}", response_model=HistoryLogPage)
 def get_character_history_logs(
     character_id: int,
+    page: PageParams = Depends(),
+    fields: Optional[List[str]] = Depends(log_fields),
+    include_archived: bool = Query(False, description="Also read archived months"),
     db: Session = Depends(get_db),
     _: bool = Depends(admin_role_checker),
 ):
     """
-    Get history logs for a specific character by its ID.
+    Get history logs for a specific character by its ID, newest first, one page at a time.
 
     Args:
         character_id (int): The character's ID.
+        page (PageParams): The page size, cursor and optional date range.
+        fields (Optional[List[str]]): Only return these fields of each log.
+        include_archived (bool): Continue into archived months once the table runs out.
+        db (Session): The database session dependency.
+
+    Returns:
+        HistoryLogPage: A page of history logs and the cursor of the next page.
+    """
+    logs = history_service.get_history_logs_by_character(
+        db,
+        character_id,
+        page.limit,
+        page.cursor,
+        page.start,
+        page.end,
+        include_archived,
+        fields,
+    )
+    return sparse_response(logs, fields)
+
+
+@log_router.get("/search", response_model=HistoryLogPage)
+def search_history_logs(
+    q: str = Query(..., min_length=2, max_length=200, description="Phrase to find"),
+    character_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    _: bool = Depends(admin_role_checker),
+):
+    """
+    Search the questions and answers of history logs, newest first, one page at a time.
+
+    Args:
+        q (str): The phrase to search for.
+        character_id (Optional[int]): Only search the logs of this character.
+        page (PageParams): The page size, cursor and optional date range.
+        db (Session): The database session dependency.
+
+    Returns:
+        HistoryLogPage: A page of matching history logs and the cursor of the next page.
+    """
+    return history_service.search_history_logs(
+        db, q, page.limit, page.cursor, character_id, page.start, page.end
+    )
+
+
+@log_router.get("/stats", response_model=List[FeedbackStatsResponse])
+def get_feedback_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    character_id: Optional[int] = None,
+    by_day: bool = False,
+    db: Session = Depends(get_db),
+    _: bool = Depends(admin_role_checker),
+):
+    """
+    Get chat, like and dislike counts per character over a range of days.
+
+    The counts are read from aggregates maintained as logs are written and rated, so the
+    cost depends on the number of characters and days, not on the number of logs.
+
+    Args:
+        start (Optional[date]): The first day to include.
+        end (Optional[date]): The last day to include.
+        character_id (Optional[int]): Only include this character.
+        by_day (bool): Return the counts of each day instead of totals.
         db (Session): The database session dependency.
 
     Returns:
-        List[HistoryLogResponse]: A list of history logs for the character.
+        List[FeedbackStatsResponse]: The counts and like ratio per character (and day).
+    """
+    return history_service.get_feedback_stats(db, start, end, character_id, by_day)
+
+
+@log_router.get("/export")
+def export_history_logs(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    character_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, description="Created at or after"),
+    end: Optional[datetime] = Query(None, description="Created before"),
+    include_prompt: bool = False,
+    compress: bool = Query(False, description="Gzip the export"),
+    _: bool = Depends(admin_role_checker),
+):
+    """
+    Export history logs as a stream of NDJSON or CSV, for analytics.
+
+    Rows are streamed from a server-side cursor, so exports of any size use constant
+    memory. Prompts are left out unless `include_prompt` is set.
+
+    Args:
+        format (str): "ndjson" or "csv".
+        character_id (Optional[int]): Only export logs of this character.
+        start (Optional[datetime]): Only export logs created at or after this time.
+        end (Optional[datetime]): Only export logs created before this time.
+        include_prompt (bool): Also export the prompts.
+        compress (bool): Gzip the export on the fly.
+
+    Returns:
+        StreamingResponse: The export, as a file download.
     """
-    history_logs = history_service.get_history_logs_by_character(db, character_id)
-    return history_logs or []
+    filename = f"history_logs.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        history_service.export_history_logs(
+            format, character_id, start, end, include_prompt, compress
+        ),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@log_router.get("/{log_id}/prompt", response_model=str)
+def get_log_prompt(
+    log_id: int,
+    db: Session = Depends(get_db),
+    user: UserResponse = Depends(get_current_user),
+):
+    """
+    Get the full prompt of a history log, rebuilding it if it is stored as a reference.
+
+    Args:
+        log_id (int): The ID of the history log.
+        db (Session): The database session dependency.
+
+    Returns:
+        str: The prompt.
+    """
+    return history_service.get_prompt(db, log_id, user)
 
 
 @log_router.put("/feedback/", response_model=bool)
 def update_log_feedback(
     request: FeedbackRequest,
     db: Session = Depends(get_db),
+    user: UserResponse = Depends(get_current_user),
     _: bool = Depends(admin_or_user_role_checker),
 ):
     """
@@ -71,6 +276,31 @@ def update_log_feedback(
         bool: True if the update was successful.
 
     Raises:
-        HTTPException: If the log is not found or if there is an internal error.
+        HTTPException: If the log is not found, belongs to another user, or if there is
+            an internal error.
+    """
+    return history_service.update_feedback(db, request.id, request.feedback, user)
+
+
+@log_router.put("/feedback/bulk", response_model=FeedbackBulkResponse)
+def update_log_feedbacks(
+    request: FeedbackBulkRequest,
+    db: Session = Depends(get_db),
+    user: UserResponse = Depends(get_current_user),
+    _: bool = Depends(admin_or_user_role_checker),
+):
+    """
+    Update the feedback of many history logs at once, in a single transaction.
+
+    Either every log is updated or none is: if one of them does not exist or belongs to
+    another user, the request fails with 404.
+
+    Args:
+        request (FeedbackBulkRequest): The history logs and their feedback.
+        db (Session): The database session dependency.
+
+    Returns:
+        FeedbackBulkResponse: The number of updated logs.
     """
-    return history_service.update_feedback(db, request.id, request.feedback)
+    feedbacks = {item.id: item.feedback for item in request.items}
+    return {"updated": history_service.update_feedbacks(db, feedbacks, user)}
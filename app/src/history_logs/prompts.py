@@ -0,0 +1,180 @@
+import logging
+import threading
+import zlib
+from typing import Any, Dict, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from src.config import Config
+from src.db.database import SessionLocal
+from src.db.models import Character, HistoryLog, PromptTemplate
+from src.AI.prompt import load_template, template_version
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FULL = "full"
+COMPRESSED = "compressed"
+REFERENCE = "reference"
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class PromptStorage:
+    """
+    Stores history log prompts compactly and restores them on demand.
+
+    A prompt is stored in one of three forms, chosen by `mode`:
+
+    - "full": the rendered text, in `prompt`.
+    - "compressed": the text compressed with zlib, or zstd if `codec` is "zstd" and the
+      `zstandard` package is installed, in `prompt_blob`.
+    - "reference": the template version, the ids of the retrieved documents and the
+      conversation history, in `prompt_ref`. The prompt is rebuilt from the template,
+      the knowledge base and the log's question, so it reflects the documents as they
+      are when it is rebuilt. Prompts without a reference (e.g. rendered from an older
+      template) are compressed instead.
+
+    Reading handles every form regardless of the current mode, so the mode can be
+    changed at any time.
+    """
+
+    def __init__(
+        self,
+        mode: str = Config.HISTORY_LOG_PROMPT_STORAGE,
+        codec: str = Config.HISTORY_LOG_PROMPT_CODEC,
+    ):
+        if codec == "zstd" and zstandard is None:
+            logging.warning("zstandard is not installed, compressing prompts with zlib")
+            codec = "zlib"
+        self.mode = mode
+        self.codec = codec
+        self._lock = threading.Lock()
+        self._templates: Dict[str, str] = {}
+
+    def compress(self, text: str) -> bytes:
+        """
+        Compress a prompt with the configured codec.
+
+        Args:
+            text (str): The prompt.
+
+        Returns:
+            bytes: The compressed prompt.
+        """
+        data = text.encode("utf-8")
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return zlib.compress(data, 9)
+
+    @staticmethod
+    def decompress(blob: bytes) -> str:
+        """
+        Decompress a prompt compressed by `compress`, whichever codec was used.
+
+        Args:
+            blob (bytes): The compressed prompt.
+
+        Returns:
+            str: The prompt.
+        """
+        if blob[:4] == ZSTD_MAGIC:
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this prompt")
+            return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8")
+        return zlib.decompress(blob).decode("utf-8")
+
+    def encode(self, prompt: str, reference: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Get the column values storing a prompt in the configured form.
+
+        Args:
+            prompt (str): The rendered prompt.
+            reference (Optional[Dict[str, Any]]): The prompt reference, if known.
+
+        Returns:
+            dict: Values for the `prompt`, `prompt_blob` and `prompt_ref` columns.
+        """
+        if self.mode == REFERENCE and reference and self._register_template(
+            reference["template"]
+        ):
+            return {"prompt": None, "prompt_blob": None, "prompt_ref": reference}
+        if self.mode in (COMPRESSED, REFERENCE):
+            return {
+                "prompt": None,
+                "prompt_blob": self.compress(prompt),
+                "prompt_ref": None,
+            }
+        return {"prompt": prompt, "prompt_blob": None, "prompt_ref": None}
+
+    def _register_template(self, version: str) -> bool:
+        with self._lock:
+            if version in self._templates:
+                return True
+        template = load_template()
+        if template_version(template) != version:
+            # Rendered from a template that has changed since; it cannot be referenced
+            return False
+        with SessionLocal() as db:
+            if db.get(PromptTemplate, version) is None:
+                try:
+                    db.add(PromptTemplate(version=version, template=template))
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+        with self._lock:
+            self._templates[version] = template
+        return True
+
+    def inline(self, log: HistoryLog) -> Optional[str]:
+        """
+        Get the prompt of a log if it is stored as text or compressed.
+
+        Args:
+            log (HistoryLog): The history log.
+
+        Returns:
+            Optional[str]: The prompt, or None if it is stored as a reference.
+        """
+        if log.prompt is not None:
+            return log.prompt
+        if log.prompt_blob is not None:
+            return self.decompress(log.prompt_blob)
+        return None
+
+    def reconstruct(self, log: HistoryLog, db: Session) -> str:
+        """
+        Get the prompt of a log, rebuilding it from its reference if needed.
+
+        Args:
+            log (HistoryLog): The history log.
+            db (Session): The database session.
+
+        Returns:
+            str: The prompt.
+        """
+        prompt = self.inline(log)
+        if prompt is not None or not log.prompt_ref:
+            return prompt or ""
+
+        # Imported here so that reading stored prompts does not load the embedding model
+        from src.AI.service import AIService
+        from src.AI.setup import get_collection
+
+        reference = log.prompt_ref
+        template = db.get(PromptTemplate, reference["template"])
+        character = db.get(Character, log.character_id)
+        docs = AIService.get_documents(
+            get_collection(character.short_name), reference["doc_ids"]
+        )
+        return AIService.build_prompt(
+            log.question,
+            docs,
+            character.name,
+            reference.get("history", ""),
+            prompt_template=template.template,
+        )
+
+
+prompt_storage = PromptStorage()
@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from redis.exceptions import LockError, RedisError
+from redis.lock import Lock
+from sqlalchemy import delete, func, select
+from src.config import Config
+from src.db.database import SessionLocal
+from src.db.models import HistoryLog
+from src.utils.redis import redis_client
+from .search import search_index
+
+PURGE_LOCK_KEY = "history_logs:purge"
+# Renewed after every batch, so it only has to outlast one batch
+PURGE_LOCK_TIMEOUT = 600
+
+
+class HistoryLogPurger:
+    """
+    Deletes history logs older than a retention period in small batches.
+
+    Each batch deletes at most `batch_size` rows in primary-key order in its own short
+    transaction, then sleeps `pause` seconds, so row locks are held briefly and replicas
+    can apply each batch before the next one. If a batch takes longer than `max_batch`
+    seconds, the batch size is halved; it grows back while batches stay fast.
+
+    The feedback counters are not decremented: they keep counting purged chats.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = Config.HISTORY_LOG_PURGE_BATCH_SIZE,
+        pause: float = Config.HISTORY_LOG_PURGE_PAUSE_MS / 1000,
+        max_batch: float = Config.HISTORY_LOG_PURGE_MAX_BATCH_MS / 1000,
+    ):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.max_batch = max_batch
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def purge(
+        self,
+        older_than: datetime,
+        progress: Optional[Callable[[int, int], None]] = None,
+        lock: Optional[Lock] = None,
+    ) -> int:
+        """
+        Delete every history log created before `older_than`.
+
+        Args:
+            older_than (datetime): The cutoff; older logs are deleted.
+            progress (Optional[Callable[[int, int], None]]): Called after each batch with
+                the number of deleted logs so far and the last deleted id.
+            lock (Optional[Lock]): A held Redis lock, renewed after each batch. The
+                purge stops if it cannot be renewed, since another worker may take it.
+
+        Returns:
+            int: The number of deleted logs.
+        """
+        with SessionLocal() as db:
+            # Bounds every batch, so the last one does not scan the newer rows that are kept
+            max_id = db.execute(
+                select(func.max(HistoryLog.id)).where(HistoryLog.created_at < older_than)
+            ).scalar()
+        if max_id is None:
+            return 0
+
+        batch_size = self.batch_size
+        last_id, deleted = 0, 0
+        while not self._stopping.is_set():
+            started_at = time.monotonic()
+            with SessionLocal() as db:
+                ids = list(
+                    db.execute(
+                        select(HistoryLog.id)
+                        .where(
+                            HistoryLog.id > last_id,
+                            HistoryLog.id <= max_id,
+                            HistoryLog.created_at < older_than,
+                        )
+                        .order_by(HistoryLog.id)
+                        .limit(batch_size)
+                    ).scalars()
+                )
+                if not ids:
+                    break
+                db.execute(
+                    delete(HistoryLog).where(
+                        HistoryLog.id.in_(ids), HistoryLog.created_at < older_than
+                    )
+                )
+                search_index.remove(db, ids)
+                db.commit()
+
+            last_id = ids[-1]
+            deleted += len(ids)
+            if progress is not None:
+                progress(deleted, last_id)
+            if lock is not None:
+                try:
+                    lock.extend(PURGE_LOCK_TIMEOUT, replace_ttl=True)
+                except (LockError, RedisError) as e:
+                    logging.warning(f"Stopping history log purge, lock lost: {e}")
+                    break
+
+            elapsed = time.monotonic() - started_at
+            if elapsed > self.max_batch:
+                batch_size = max(1, batch_size // 2)
+            elif batch_size < self.batch_size:
+                batch_size = min(self.batch_size, batch_size * 2)
+            time.sleep(self.pause)
+        return deleted
+
+    def purge_expired(self, retention_days: int) -> int:
+        """
+        Delete the logs older than `retention_days`, unless another worker is already
+        purging.
+
+        Args:
+            retention_days (int): The number of days logs are kept.
+
+        Returns:
+            int: The number of deleted logs.
+        """
+        # Released with the lock's own token, never another worker's lock
+        lock = redis_client.lock(
+            PURGE_LOCK_KEY, timeout=PURGE_LOCK_TIMEOUT, blocking=False
+        )
+        try:
+            if not lock.acquire():
+                return 0
+        except RedisError as e:
+            logging.warning(f"Skipping history log purge, Redis unavailable: {e}")
+            return 0
+        try:
+            deleted = self.purge(
+                datetime.now() - timedelta(days=retention_days), lock=lock
+            )
+            logging.info(f"Purged {deleted} history logs older than {retention_days} days")
+            return deleted
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # The lock was lost during the purge; another worker may own it now
+                pass
+            except RedisError as e:
+                logging.warning(f"Releasing the history log purge lock failed: {e}")
+
+    def start(
+        self,
+        retention_days: int = Config.HISTORY_LOG_RETENTION_DAYS,
+        interval: int = Config.HISTORY_LOG_PURGE_INTERVAL,
+    ) -> None:
+        """
+        Purge expired logs every `interval` seconds in a background thread. Does nothing
+        if `retention_days` is 0.
+        """
+        if retention_days <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopping.clear()
+
+        def run():
+            while not self._stopping.is_set():
+                try:
+                    self.purge_expired(retention_days)
+                except Exception as e:
+                    logging.error(f"History log purge failed: {e}")
+                self._stopping.wait(interval)
+
+        self._thread = threading.Thread(target=run, name="history-log-purge", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread, after the batch in progress.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+history_log_purger = HistoryLogPurger()
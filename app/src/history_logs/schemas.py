@@ -1,7 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
+from src.config import Config
 
 
 class Feedback(str, Enum):
@@ -26,7 +27,8 @@ class HistoryLogResponse(BaseModel):
         user_id (str): The identifier of the user associated with the log.
         character_id (int): The identifier of the character in the log.
         question (str): The question in the history log.
-        prompt (str): The prompt provided in the history log.
+        prompt (Optional[str]): The prompt provided in the history log, or None if it is
+            stored as a reference and must be fetched from `/log/{id}/prompt`.
         answer (str): The answer associated with the history log.
         feedback (Optional[Feedback]): The feedback on the history log, if provided.
         created_at (datetime): The timestamp of when the history log was created.
@@ -36,7 +38,7 @@ class HistoryLogResponse(BaseModel):
     user_id: str
     character_id: int
     question: str
-    prompt: str
+    prompt: Optional[str] = None
     answer: str
     feedback: Optional[Feedback]
     created_at: datetime
@@ -45,6 +47,19 @@ class HistoryLogResponse(BaseModel):
         orm_mode = True
 
 
+class HistoryLogPage(BaseModel):
+    """
+    Pydantic model to represent one page of history logs, newest first.
+
+    Attributes:
+        items (List[HistoryLogResponse]): The history logs of the page.
+        next_cursor (Optional[str]): The cursor of the next page, or None on the last page.
+    """
+
+    items: List[HistoryLogResponse]
+    next_cursor: Optional[str] = None
+
+
 class FeedbackRequest(BaseModel):
     """
     Pydantic model to represent the feedback submission request structure.
@@ -61,6 +76,31 @@ class FeedbackRequest(BaseModel):
         orm_mode = True
 
 
+class FeedbackBulkRequest(BaseModel):
+    """
+    Pydantic model to represent a request setting the feedback of many history logs.
+
+    Attributes:
+        items (List[FeedbackRequest]): The history logs and their feedback. If a log is
+            listed more than once, its last feedback is kept.
+    """
+
+    items: List[FeedbackRequest] = Field(
+        ..., min_length=1, max_length=Config.HISTORY_LOG_FEEDBACK_BULK_MAX
+    )
+
+
+class FeedbackBulkResponse(BaseModel):
+    """
+    Pydantic model to represent the result of a bulk feedback update.
+
+    Attributes:
+        updated (int): The number of history logs updated.
+    """
+
+    updated: int
+
+
 class LogList(BaseModel):
     """
     Pydantic model to represent a list of history logs.
@@ -70,3 +110,24 @@ class LogList(BaseModel):
     """
 
     history_logs: List[HistoryLogResponse]
+
+
+class FeedbackStatsResponse(BaseModel):
+    """
+    Pydantic model to represent the chat and feedback counters of a character.
+
+    Attributes:
+        character_id (int): The identifier of the character.
+        day (Optional[date]): The day of the counters, or None for a total over the range.
+        chats (int): The number of chats.
+        likes (int): The number of likes.
+        dislikes (int): The number of dislikes.
+        like_ratio (Optional[float]): likes / (likes + dislikes), None without feedback.
+    """
+
+    character_id: int
+    day: Optional[date] = None
+    chats: int
+    likes: int
+    dislikes: int
+    like_ratio: Optional[float] = None
@@ -0,0 +1,180 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, delete, insert, or_, select, text
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from src.db.models import HistoryLogSearch
+
+
+class HistoryLogSearchIndex:
+    """
+    Full-text index over the questions and answers of history logs.
+
+    The text is copied to `history_log_search`, which carries a FULLTEXT index with the
+    ngram parser on MySQL (partitioned tables cannot have one) and is mirrored in an FTS5
+    table on SQLite. Rows are added in the same transaction as the logs themselves.
+    """
+
+    @staticmethod
+    def _sqlite(db: Session) -> bool:
+        return db.get_bind().dialect.name == "sqlite"
+
+    def add(self, db: Session, logs: Iterable[Dict[str, Any]]) -> None:
+        """
+        Index newly inserted history logs. The caller commits.
+
+        Args:
+            db (Session): The database session.
+            logs (Iterable[Dict[str, Any]]): The inserted rows, with `id`, `character_id`,
+                `created_at`, `question` and `answer`.
+        """
+        rows = [
+            {
+                "log_id": log["id"],
+                "character_id": log["character_id"],
+                "created_at": log["created_at"],
+                "question": log["question"],
+                "answer": log["answer"],
+            }
+            for log in logs
+        ]
+        if not rows:
+            return
+        db.execute(insert(HistoryLogSearch), rows)
+        if self._sqlite(db):
+            db.execute(
+                text(
+                    "INSERT INTO history_log_search_fts (rowid, question, answer) "
+                    "VALUES (:log_id, :question, :answer)"
+                ),
+                rows,
+            )
+
+    def remove(self, db: Session, log_ids: List[int]) -> None:
+        """
+        Remove history logs from the index. The caller commits.
+
+        Args:
+            db (Session): The database session.
+            log_ids (List[int]): The IDs of the removed logs.
+        """
+        if not log_ids:
+            return
+        if self._sqlite(db):
+            # External-content FTS5 tables are updated with the 'delete' command
+            db.execute(
+                text(
+                    "INSERT INTO history_log_search_fts "
+                    "(history_log_search_fts, rowid, question, answer) "
+                    "SELECT 'delete', log_id, question, answer FROM history_log_search "
+                    "WHERE log_id IN (" + ", ".join(str(int(id)) for id in log_ids) + ")"
+                )
+            )
+        db.execute(delete(HistoryLogSearch).where(HistoryLogSearch.log_id.in_(log_ids)))
+
+    def remove_range(
+        self, db: Session, start: datetime, end: datetime, batch_size: int = 5000
+    ) -> int:
+        """
+        Remove the history logs created in [start, end) from the index, committing after
+        each batch so that no lock is held for long.
+
+        Args:
+            db (Session): The database session.
+            start (datetime): The start of the range.
+            end (datetime): The end of the range.
+            batch_size (int): The number of entries removed per transaction.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        removed = 0
+        while True:
+            log_ids = list(
+                db.execute(
+                    select(HistoryLogSearch.log_id)
+                    .where(
+                        HistoryLogSearch.created_at >= start,
+                        HistoryLogSearch.created_at < end,
+                    )
+                    .limit(batch_size)
+                ).scalars()
+            )
+            if not log_ids:
+                return removed
+            self.remove(db, log_ids)
+            db.commit()
+            removed += len(log_ids)
+
+    @staticmethod
+    def _phrase(query: str) -> str:
+        # Searched as one phrase, so user input cannot inject search operators
+        return '"' + " ".join(query.replace('"', " ").split()) + '"'
+
+    def search(
+        self,
+        db: Session,
+        query: str,
+        limit: int,
+        before: Optional[Tuple[datetime, int]] = None,
+        character_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[Row]:
+        """
+        Find the history logs whose question or answer contains a phrase, newest first.
+
+        Args:
+            db (Session): The database session.
+            query (str): The phrase to search for.
+            limit (int): The maximum number of matches to return.
+            before (Optional[Tuple[datetime, int]]): Only return logs before this
+                (created_at, id), for keyset pagination.
+            character_id (Optional[int]): Only search the logs of this character.
+            start (Optional[datetime]): Only search logs created at or after this time.
+            end (Optional[datetime]): Only search logs created before this time.
+
+        Returns:
+            List[Row]: The `log_id` and `created_at` of the matching logs.
+        """
+        phrase = self._phrase(query)
+        if self._sqlite(db):
+            match = HistoryLogSearch.log_id.in_(
+                text(
+                    "SELECT rowid FROM history_log_search_fts "
+                    "WHERE history_log_search_fts MATCH :phrase"
+                ).bindparams(phrase=phrase)
+            )
+        else:
+            match = text(
+                "MATCH (history_log_search.question, history_log_search.answer) "
+                "AGAINST (:phrase IN BOOLEAN MODE)"
+            ).bindparams(phrase=phrase)
+
+        statement = select(HistoryLogSearch.log_id, HistoryLogSearch.created_at).where(
+            match
+        )
+        if character_id is not None:
+            statement = statement.where(HistoryLogSearch.character_id == character_id)
+        if start is not None:
+            statement = statement.where(HistoryLogSearch.created_at >= start)
+        if end is not None:
+            statement = statement.where(HistoryLogSearch.created_at < end)
+        if before is not None:
+            created_at, id = before
+            statement = statement.where(
+                or_(
+                    HistoryLogSearch.created_at < created_at,
+                    and_(
+                        HistoryLogSearch.created_at == created_at,
+                        HistoryLogSearch.log_id < id,
+                    ),
+                )
+            )
+        statement = statement.order_by(
+            HistoryLogSearch.created_at.desc(), HistoryLogSearch.log_id.desc()
+        ).limit(limit)
+        return db.execute(statement).all()
+
+
+search_index = HistoryLogSearchIndex()
@@ -1,106 +1,374 @@
-from sqlalchemy.orm import Session
+import csv
+import io
+import json
+import zlib
+from collections import defaultdict
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.orm import Query, Session, load_only
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
-from src.db.models import HistoryLog
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from src.db.database import SessionLocal
+from src.db.models import HistoryLog, User
 from src.auth.service import UserService
 from src.errors import UserNotFound, CharacterNotFound, LogNotFound
 from src.db.models import Character
-from .schemas import Feedback
+from src.utils.pagination import decode_cursor, encode_cursor
+from .schemas import (
+    Feedback,
+    FeedbackStatsResponse,
+    HistoryLogPage,
+    HistoryLogResponse,
+)
+from .writer import history_log_writer
+from .prompts import prompt_storage
+from .archive import history_log_archive
+from .search import search_index
+from .stats import COUNTERS, read_stats, stats_recorder
 
 user_service = UserService()
 
+EXPORT_COLUMNS = [
+    "id",
+    "user_id",
+    "character_id",
+    "question",
+    "answer",
+    "feedback",
+    "created_at",
+]
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Columns a prompt can be read from without rebuilding it from its reference
+PROMPT_COLUMNS = ["prompt", "prompt_blob"]
+
 
 class HistoryLogService:
     """
     Service class to manage history log operations such as creating, retrieving, and updating history logs.
     """
 
-    def create_history_log(
+    def enqueue_history_log(
         self,
-        db: Session,
-        user_id: int,
+        user_id: str,
         character_id: int,
         question: str,
         prompt: str,
         answer: str,
-        feedback: str = None,
-    ) -> HistoryLog:
+    ) -> Optional[int]:
         """
-        Create a new history log entry in the database.
+        Queue a new history log entry to be written in the background.
+
+        The row is inserted by the write-behind writer together with other queued rows,
+        so the caller does not wait for the database. Its id is reserved up front, unless
+        the database is unavailable; the row is then spooled and gets its id later.
 
         Args:
-            db (Session): The database session.
-            user_id (int): The ID of the user creating the history log.
+            user_id (str): The ID of the user creating the history log.
             character_id (int): The ID of the character associated with the history log.
             question (str): The question asked in the history log.
             prompt (str): The prompt provided in the history log.
             answer (str): The answer given in the history log.
-            feedback (str, optional): The feedback (like/dislike) for the history log.
 
         Returns:
-            HistoryLog: The created history log object.
-
-        Raises:
-            SQLAlchemyError: If there is a database error during the creation of the log.
+            Optional[int]: The ID of the history log, or None if it is not known yet.
         """
-        try:
-            history_log = HistoryLog(
-                user_id=user_id,
-                character_id=character_id,
-                question=question,
-                prompt=prompt,
-                answer=answer,
-                feedback=feedback,
-                created_at=datetime.now(),
-            )
-            db.add(history_log)
-            db.commit()
-            return history_log
-        except SQLAlchemyError as e:
-            db.rollback()
-            raise e
+        return history_log_writer.enqueue(
+            user_id=user_id,
+            character_id=character_id,
+            question=question,
+            prompt=str(prompt),
+            prompt_reference=getattr(prompt, "reference", None),
+            answer=answer,
+            created_at=datetime.now(),
+        )
 
-    def get_history_logs_by_user(self, db: Session, email: str) -> list[HistoryLog]:
+    def get_history_logs_by_user(
+        self,
+        db: Session,
+        email: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        include_archived: bool = False,
+        fields: Optional[List[str]] = None,
+    ) -> HistoryLogPage:
         """
-        Retrieve all history logs associated with a given user.
+        Retrieve one page of the history logs associated with a given user.
 
         Args:
             db (Session): The database session.
             email (str): The email address of the user to retrieve history logs for.
+            limit (int): The maximum number of logs in the page.
+            cursor (Optional[str]): The `next_cursor` of the previous page, if any.
+            start (Optional[datetime]): Only include logs created at or after this time.
+            end (Optional[datetime]): Only include logs created before this time.
+            include_archived (bool): Continue into archived months after the table.
+            fields (Optional[List[str]]): Only load and return these fields.
 
         Returns:
-            list[HistoryLog]: A list of history log objects associated with the user.
+            HistoryLogPage: The logs of the page, newest first, and the next cursor.
 
         Raises:
             UserNotFound: If the user cannot be found.
+            InvalidCursor: If the cursor is malformed.
         """
         user = user_service.get_user_by_email(email, db)
         if not user:
             raise UserNotFound()
-        return db.query(HistoryLog).filter_by(user_id=user.uid).all()
+        return self.get_history_logs_by_user_id(
+            db, user.uid, limit, cursor, start, end, include_archived, fields
+        )
+
+    def get_history_logs_by_user_id(
+        self,
+        db: Session,
+        user_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        include_archived: bool = False,
+        fields: Optional[List[str]] = None,
+    ) -> HistoryLogPage:
+        """
+        Retrieve one page of the history logs of a user by their ID.
+
+        Args:
+            db (Session): The database session.
+            user_id (str): The ID of the user.
+            limit (int): The maximum number of logs in the page.
+            cursor (Optional[str]): The `next_cursor` of the previous page, if any.
+            start (Optional[datetime]): Only include logs created at or after this time.
+            end (Optional[datetime]): Only include logs created before this time.
+            include_archived (bool): Continue into archived months after the table.
+            fields (Optional[List[str]]): Only load and return these fields.
+
+        Returns:
+            HistoryLogPage: The logs of the page, newest first, and the next cursor.
+
+        Raises:
+            InvalidCursor: If the cursor is malformed.
+        """
+        query = db.query(HistoryLog).filter(HistoryLog.user_id == user_id)
+        archived = ("user_id", user_id) if include_archived else None
+        return self._page(db, query, limit, cursor, start, end, archived, fields)
 
     def get_history_logs_by_character(
-        self, db: Session, character_id: int
-    ) -> list[HistoryLog]:
+        self,
+        db: Session,
+        character_id: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        include_archived: bool = False,
+        fields: Optional[List[str]] = None,
+    ) -> HistoryLogPage:
         """
-        Retrieve all history logs associated with a specific character.
+        Retrieve one page of the history logs associated with a specific character.
 
         Args:
             db (Session): The database session.
             character_id (int): The ID of the character to retrieve history logs for.
+            limit (int): The maximum number of logs in the page.
+            cursor (Optional[str]): The `next_cursor` of the previous page, if any.
+            start (Optional[datetime]): Only include logs created at or after this time.
+            end (Optional[datetime]): Only include logs created before this time.
+            include_archived (bool): Continue into archived months after the table.
+            fields (Optional[List[str]]): Only load and return these fields.
 
         Returns:
-            list[HistoryLog]: A list of history log objects associated with the character.
+            HistoryLogPage: The logs of the page, newest first, and the next cursor.
 
         Raises:
             CharacterNotFound: If the character cannot be found.
+            InvalidCursor: If the cursor is malformed.
         """
         character = db.query(Character).filter(Character.id == character_id).first()
         if not character:
             raise CharacterNotFound()
-        return db.query(HistoryLog).filter_by(character_id=character_id).all()
+        query = db.query(HistoryLog).filter(HistoryLog.character_id == character_id)
+        archived = ("character_id", character_id) if include_archived else None
+        return self._page(db, query, limit, cursor, start, end, archived, fields)
+
+    def _page(
+        self,
+        db: Session,
+        query: Query,
+        limit: int,
+        cursor: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        archived: Optional[Tuple[str, Any]] = None,
+        fields: Optional[List[str]] = None,
+    ) -> HistoryLogPage:
+        """
+        Apply keyset pagination on (created_at, id), newest first, to a filtered query.
+
+        Combined with an equality filter on `user_id` or `character_id`, this is served by
+        the matching (…, created_at, id) index without scanning skipped rows. If
+        `archived` gives the same filter as (column, value), a page that runs past the
+        oldest log in the table is completed from the archived months, which are all
+        older than the table.
+
+        With `fields`, only the matching columns (and those of the cursor) are selected
+        and the items are built with just those fields.
+        """
+        if fields is not None:
+            columns = {"id", "created_at"}
+            for field in fields:
+                columns.update(PROMPT_COLUMNS if field == "prompt" else [field])
+            query = query.options(
+                load_only(*(getattr(HistoryLog, column) for column in columns))
+            )
+        if start is not None:
+            query = query.filter(HistoryLog.created_at >= start)
+        if end is not None:
+            query = query.filter(HistoryLog.created_at < end)
+        before = None
+        if cursor:
+            created_at, id = decode_cursor(cursor)
+            before = (created_at, id)
+            query = query.filter(
+                or_(
+                    HistoryLog.created_at < created_at,
+                    and_(HistoryLog.created_at == created_at, HistoryLog.id < id),
+                )
+            )
+        rows = (
+            query.order_by(HistoryLog.created_at.desc(), HistoryLog.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        if archived is not None and len(rows) <= limit:
+            if rows:
+                before = (rows[-1].created_at, rows[-1].id)
+            column, value = archived
+            rows += [
+                HistoryLog(**row)
+                for row in history_log_archive.read(
+                    db,
+                    column,
+                    value,
+                    limit + 1 - len(rows),
+                    before,
+                    start,
+                    end,
+                    prompts=fields is None or "prompt" in fields,
+                )
+            ]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        if fields is not None:
+            items = [
+                HistoryLogResponse.model_construct(
+                    **{
+                        field: (
+                            prompt_storage.inline(row)
+                            if field == "prompt"
+                            else getattr(row, field)
+                        )
+                        for field in fields
+                    }
+                )
+                for row in rows
+            ]
+            return HistoryLogPage.model_construct(items=items, next_cursor=next_cursor)
+        page = HistoryLogPage.model_validate(
+            {"items": rows, "next_cursor": next_cursor}, from_attributes=True
+        )
+        for item, row in zip(page.items, rows):
+            item.prompt = prompt_storage.inline(row)
+        return page
+
+    def search_history_logs(
+        self,
+        db: Session,
+        query: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        character_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> HistoryLogPage:
+        """
+        Search the questions and answers of history logs for a phrase, newest first.
+
+        Matches are found through the full-text index; only the logs of the page are then
+        read from `history_logs`.
+
+        Args:
+            db (Session): The database session.
+            query (str): The phrase to search for.
+            limit (int): The maximum number of logs in the page.
+            cursor (Optional[str]): The `next_cursor` of the previous page, if any.
+            character_id (Optional[int]): Only search the logs of this character.
+            start (Optional[datetime]): Only search logs created at or after this time.
+            end (Optional[datetime]): Only search logs created before this time.
+
+        Returns:
+            HistoryLogPage: The matching logs of the page and the next cursor.
+
+        Raises:
+            InvalidCursor: If the cursor is malformed.
+        """
+        before = decode_cursor(cursor) if cursor else None
+        matches = search_index.search(
+            db, query, limit + 1, before, character_id, start, end
+        )
+        next_cursor = None
+        if len(matches) > limit:
+            matches = matches[:limit]
+            next_cursor = encode_cursor(matches[-1].created_at, matches[-1].log_id)
+        rows = []
+        if matches:
+            # The creation times bound the partitions MySQL has to look into
+            logs = (
+                db.query(HistoryLog)
+                .filter(
+                    HistoryLog.id.in_([match.log_id for match in matches]),
+                    HistoryLog.created_at >= matches[-1].created_at,
+                    HistoryLog.created_at <= matches[0].created_at,
+                )
+                .all()
+            )
+            by_id = {log.id: log for log in logs}
+            rows = [by_id[match.log_id] for match in matches if match.log_id in by_id]
+        page = HistoryLogPage.model_validate(
+            {"items": rows, "next_cursor": next_cursor}, from_attributes=True
+        )
+        for item, row in zip(page.items, rows):
+            item.prompt = prompt_storage.inline(row)
+        return page
 
-    def update_feedback(self, db: Session, log_id: int, feedback: Feedback) -> bool:
+    def get_prompt(self, db: Session, log_id: int, user: User) -> str:
+        """
+        Get the full prompt of a history log, rebuilding it if it is stored as a reference.
+
+        Args:
+            db (Session): The database session.
+            log_id (int): The ID of the history log.
+            user (User): The current user; only admins can read other users' logs.
+
+        Returns:
+            str: The prompt.
+
+        Raises:
+            LogNotFound: If the log does not exist or belongs to another user.
+        """
+        history_log = db.query(HistoryLog).filter_by(id=log_id).first()
+        if not history_log or (
+            user.role != "admin" and history_log.user_id != user.uid
+        ):
+            raise LogNotFound()
+        return str(prompt_storage.reconstruct(history_log, db))
+
+    def update_feedback(
+        self, db: Session, log_id: int, feedback: Feedback, user: User
+    ) -> bool:
         """
         Update the feedback for a specific history log.
 
@@ -108,24 +376,205 @@ class HistoryLogService:
             db (Session): The database session.
             log_id (int): The ID of the history log to update.
             feedback (Feedback): The feedback value ('like' or 'dislike').
+            user (User): The current user; only admins can rate other users' logs.
 
         Returns:
             bool: True if the update was successful.
 
         Raises:
-            LogNotFound: If the specified log ID does not exist.
+            LogNotFound: If the log does not exist or belongs to another user.
+            Exception: If there is a database error during the update.
+        """
+        self.update_feedbacks(db, {log_id: feedback}, user)
+        return True
+
+    def update_feedbacks(
+        self, db: Session, feedbacks: Dict[int, Feedback], user: User
+    ) -> int:
+        """
+        Update the feedback of many history logs in one transaction.
+
+        The logs are checked and locked with one SELECT and updated with one UPDATE, so
+        the cost barely depends on how many logs are rated at once.
+
+        Args:
+            db (Session): The database session.
+            feedbacks (Dict[int, Feedback]): The new feedback per history log ID.
+            user (User): The current user; only admins can rate other users' logs.
+
+        Returns:
+            int: The number of updated logs.
+
+        Raises:
+            LogNotFound: If a log does not exist or belongs to another user; no log is
+                updated then.
             Exception: If there is a database error during the update.
         """
         try:
-            history_log = db.query(HistoryLog).filter_by(id=log_id).first()
-            if not history_log:
+            # Some logs may still be waiting in the write-behind queue. They are flushed
+            # before any row is locked: the locking SELECT below also takes gap locks,
+            # which would block the writer's INSERT until the lock wait timeout.
+            found = db.execute(
+                select(func.count()).where(HistoryLog.id.in_(list(feedbacks)))
+            ).scalar()
+            if found < len(feedbacks):
+                db.rollback()
+                history_log_writer.flush()
+
+            # Locked so that concurrent updates of the same log count its change once
+            logs = db.execute(
+                select(
+                    HistoryLog.id,
+                    HistoryLog.user_id,
+                    HistoryLog.character_id,
+                    HistoryLog.feedback,
+                    HistoryLog.created_at,
+                )
+                .where(HistoryLog.id.in_(list(feedbacks)))
+                .with_for_update()
+            ).all()
+            if len(logs) < len(feedbacks) or (
+                user.role != "admin" and any(log.user_id != user.uid for log in logs)
+            ):
                 raise LogNotFound()
-            history_log.feedback = feedback
+
+            deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+            for log in logs:
+                delta = stats_recorder.feedback_delta(log.feedback, feedbacks[log.id])
+                for counter, value in delta.items():
+                    deltas[(log.character_id, log.created_at.date())][counter] += value
+            stats_recorder.apply(db, deltas)
+            db.execute(
+                update(HistoryLog)
+                .where(HistoryLog.id.in_(list(feedbacks)))
+                .values(
+                    feedback=case(
+                        {log_id: feedback.value for log_id, feedback in feedbacks.items()},
+                        value=HistoryLog.id,
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
             db.commit()
-            db.refresh(history_log)
-            return True
+            return len(logs)
         except SQLAlchemyError as e:
             db.rollback()
             raise Exception(
-                f"Database error while updating feedback for log {log_id}: {str(e)}"
+                f"Database error while updating feedback for logs {list(feedbacks)}: {str(e)}"
             )
+
+    def get_feedback_stats(
+        self,
+        db: Session,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        character_id: Optional[int] = None,
+        by_day: bool = False,
+    ) -> List[FeedbackStatsResponse]:
+        """
+        Get the chat and feedback counters per character, from the maintained aggregates.
+
+        Args:
+            db (Session): The database session.
+            start (Optional[date]): The first day to include.
+            end (Optional[date]): The last day to include.
+            character_id (Optional[int]): Only include this character.
+            by_day (bool): Return the counters of each day instead of totals.
+
+        Returns:
+            List[FeedbackStatsResponse]: The counters, ordered by character (and day).
+        """
+        stats = []
+        for row in read_stats(db, start, end, character_id, by_day):
+            rated = row.likes + row.dislikes
+            stats.append(
+                FeedbackStatsResponse(
+                    character_id=row.character_id,
+                    day=row.day,
+                    chats=row.chats,
+                    likes=row.likes,
+                    dislikes=row.dislikes,
+                    like_ratio=row.likes / rated if rated else None,
+                )
+            )
+        return stats
+
+    def export_history_logs(
+        self,
+        format: str = "ndjson",
+        character_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        include_prompt: bool = False,
+        compress: bool = False,
+        batch_size: int = 1000,
+    ) -> Iterator[bytes]:
+        """
+        Stream history logs as NDJSON or CSV, oldest first, in constant memory.
+
+        Rows are read through a server-side cursor `batch_size` at a time and written out in
+        chunks, so the export never holds more than one batch. The generator opens its own
+        database session, since it outlives the request handler.
+
+        Args:
+            format (str): "ndjson" (one JSON object per line) or "csv" (with a header row).
+            character_id (Optional[int]): Only export logs of this character.
+            start (Optional[datetime]): Only export logs created at or after this time.
+            end (Optional[datetime]): Only export logs created before this time.
+            include_prompt (bool): Also export the prompt (None if stored as a reference).
+            compress (bool): Gzip the output on the fly.
+            batch_size (int): The number of rows fetched from the database at a time.
+
+        Returns:
+            Iterator[bytes]: The export, in chunks.
+        """
+        columns = [getattr(HistoryLog, name) for name in EXPORT_COLUMNS]
+        if include_prompt:
+            columns += [HistoryLog.prompt, HistoryLog.prompt_blob]
+        query = select(*columns).order_by(HistoryLog.id)
+        if character_id is not None:
+            query = query.where(HistoryLog.character_id == character_id)
+        if start is not None:
+            query = query.where(HistoryLog.created_at >= start)
+        if end is not None:
+            query = query.where(HistoryLog.created_at < end)
+
+        fields = EXPORT_COLUMNS + (["prompt"] if include_prompt else [])
+        gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if format == "csv" else None
+        if writer:
+            writer.writerow(fields)
+
+        def flush() -> bytes:
+            data = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            return gzip.compress(data) if gzip else data
+
+        with SessionLocal() as db:
+            rows = db.execute(query.execution_options(yield_per=batch_size))
+            for row in rows:
+                values = [row[i] for i in range(len(EXPORT_COLUMNS))]
+                values[EXPORT_COLUMNS.index("created_at")] = row.created_at.isoformat()
+                if include_prompt:
+                    prompt = row.prompt
+                    if prompt is None and row.prompt_blob is not None:
+                        prompt = prompt_storage.decompress(row.prompt_blob)
+                    values.append(prompt)
+                if writer:
+                    writer.writerow(values)
+                else:
+                    record = dict(zip(fields, values))
+                    buffer.write(json.dumps(record, ensure_ascii=False))
+                    buffer.write("\n")
+                if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                    chunk = flush()
+                    if chunk:
+                        yield chunk
+
+        chunk = flush()
+        if gzip:
+            chunk += gzip.flush()
+        if chunk:
+            yield chunk
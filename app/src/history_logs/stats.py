@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+from src.db.models import CharacterFeedbackStats
+
+COUNTERS = ("chats", "likes", "dislikes")
+
+StatsKey = Tuple[int, date]
+
+
+class FeedbackStatsRecorder:
+    """
+    Keeps the per-character, per-day chat and feedback counters up to date.
+
+    Changes are applied as increments with an upsert, in the caller's transaction, so the
+    counters always agree with the logs they were computed from.
+    """
+
+    @staticmethod
+    def new_log_deltas(logs: Iterable[dict]) -> Dict[StatsKey, Dict[str, int]]:
+        """
+        Compute the counter increments for newly inserted history logs.
+
+        Args:
+            logs (Iterable[dict]): The inserted rows, with `character_id`, `created_at` and
+                an optional `feedback`.
+
+        Returns:
+            Dict[StatsKey, Dict[str, int]]: The increments per (character_id, day).
+        """
+        deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        for log in logs:
+            delta = deltas[(log["character_id"], log["created_at"].date())]
+            delta["chats"] += 1
+            feedback = getattr(log.get("feedback"), "value", log.get("feedback"))
+            if feedback:
+                delta[f"{feedback}s"] += 1
+        return deltas
+
+    @staticmethod
+    def feedback_delta(old: Optional[str], new: Optional[str]) -> Dict[str, int]:
+        """
+        Compute the counter increments for a feedback change, e.g. -1 like and +1 dislike
+        when a like is changed to a dislike.
+
+        Args:
+            old (Optional[str]): The previous feedback, if any.
+            new (Optional[str]): The new feedback, if any.
+
+        Returns:
+            Dict[str, int]: The increments of the counters.
+        """
+        delta = dict.fromkeys(COUNTERS, 0)
+        # Accept both Feedback enum members and the plain strings stored in the table
+        old, new = getattr(old, "value", old), getattr(new, "value", new)
+        if old:
+            delta[f"{old}s"] -= 1
+        if new:
+            delta[f"{new}s"] += 1
+        return delta
+
+    def apply(self, db: Session, deltas: Dict[StatsKey, Dict[str, int]]) -> None:
+        """
+        Add increments to the counters, creating the rows that do not exist yet. The
+        caller commits.
+
+        Args:
+            db (Session): The database session.
+            deltas (Dict[StatsKey, Dict[str, int]]): The increments per (character_id, day).
+        """
+        rows = [
+            {"character_id": character_id, "day": day, **delta}
+            for (character_id, day), delta in deltas.items()
+            if any(delta.values())
+        ]
+        if not rows:
+            return
+        db.execute(self._upsert(db), rows)
+
+    @staticmethod
+    def _upsert(db: Session):
+        table = CharacterFeedbackStats.__table__
+        dialect = db.get_bind().dialect.name
+        if dialect == "mysql":
+            stmt = mysql.insert(table)
+            return stmt.on_duplicate_key_update(
+                {name: table.c[name] + stmt.inserted[name] for name in COUNTERS}
+            )
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=["character_id", "day"],
+            set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS},
+        )
+
+
+stats_recorder = FeedbackStatsRecorder()
+
+
+def read_stats(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    character_id: Optional[int] = None,
+    by_day: bool = False,
+) -> list:
+    """
+    Read the counters, summed per character (or per character and day).
+
+    Args:
+        db (Session): The database session.
+        start (Optional[date]): The first day to include.
+        end (Optional[date]): The last day to include.
+        character_id (Optional[int]): Only read the counters of this character.
+        by_day (bool): Return one row per character and day instead of per character.
+
+    Returns:
+        list: Rows with `character_id`, `day` (None unless `by_day`), `chats`, `likes` and
+        `dislikes`.
+    """
+    table = CharacterFeedbackStats
+    group = [table.character_id] + ([table.day] if by_day else [])
+    query = select(
+        table.character_id,
+        (table.day if by_day else literal(None)).label("day"),
+        func.sum(table.chats).label("chats"),
+        func.sum(table.likes).label("likes"),
+        func.sum(table.dislikes).label("dislikes"),
+    ).group_by(*group)
+    if start is not None:
+        query = query.where(table.day >= start)
+    if end is not None:
+        query = query.where(table.day <= end)
+    if character_id is not None:
+        query = query.where(table.character_id == character_id)
+    return db.execute(query.order_by(*group)).all()
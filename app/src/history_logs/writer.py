@@ -0,0 +1,292 @@
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DisconnectionError, OperationalError, SQLAlchemyError
+from src.config import Config
+from src.db.database import SessionLocal
+from src.db.models import HistoryLog
+from src.db.sequence import IdAllocator
+from .prompts import prompt_storage
+from .search import search_index
+from .stats import stats_recorder
+
+# Errors meaning MySQL is unreachable: the rows are spooled and retried later
+CONNECTION_ERRORS = (OperationalError, DisconnectionError)
+
+
+class HistoryLogWriter:
+    """
+    Write-behind writer for history logs.
+
+    Chat requests enqueue their log rows and return immediately; a background thread
+    inserts them in multi-row INSERTs every `batch_size` rows or `flush_interval`
+    seconds. Row ids are reserved up front so callers get their `log_id` before the row
+    is written. If MySQL is unavailable, rows are appended to a local spool file and
+    replayed on the next successful flush; rows enqueued when no id could be reserved
+    get theirs during the replay. A row that fails on its own (bad data rather than an
+    unreachable database) is moved to a dead-letter file so it cannot hold back the rest.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = Config.HISTORY_LOG_BATCH_SIZE,
+        flush_interval: float = Config.HISTORY_LOG_FLUSH_INTERVAL_MS / 1000,
+        spool_path: str = Config.HISTORY_LOG_SPOOL_PATH,
+        dead_letter_path: str = Config.HISTORY_LOG_DEAD_LETTER_PATH,
+        id_block_size: int = Config.HISTORY_LOG_ID_BLOCK,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.dead_letter_path = dead_letter_path
+        self.allocator = IdAllocator(HistoryLog, block_size=id_block_size)
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._flush_lock = threading.Lock()
+        # Rows enqueued and rows handled (written or spooled), to let `flush` wait for
+        # batches the background thread has already taken off the queue
+        self._progress = threading.Condition()
+        self._enqueued = 0
+        self._handled = 0
+        self._stopping = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Start the background flush thread (no-op if it is already running).
+        """
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="history-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread and write every queued row.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def enqueue(self, **values: Any) -> Optional[int]:
+        """
+        Queue a history log row for insertion.
+
+        Args:
+            **values: The column values of the row, except `id`.
+
+        Returns:
+            Optional[int]: The id the row will have once it is written, or None if no id
+            could be reserved because the database is unavailable.
+        """
+        self.start()
+        row = dict(values)
+        row.setdefault("created_at", datetime.now())
+        try:
+            row["id"] = self.allocator.next_id()
+        except SQLAlchemyError as e:
+            logging.error(f"Spooling a history log without an id: {e}")
+            self._append(self.spool_path, [self._line(row)])
+            return None
+        with self._progress:
+            self._enqueued += 1
+            self._queue.put(row)
+        return row["id"]
+
+    def _run(self) -> None:
+        # Rows spooled before a restart are written as soon as MySQL is reachable again
+        with self._flush_lock:
+            self._replay_spool()
+        while not self._stopping.is_set():
+            batch = self._take(block=True)
+            if batch:
+                self._write(batch)
+
+    def _take(self, block: bool) -> List[Dict[str, Any]]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if not block or timeout <= 0:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, timeout: float = 5) -> None:
+        """
+        Write every queued row now, from the calling thread, and wait for the rows the
+        background thread is already writing.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait for the background thread.
+        """
+        with self._progress:
+            target = self._enqueued
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                break
+            self._write(batch)
+        with self._progress:
+            self._progress.wait_for(lambda: self._handled >= target, timeout)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        with self._flush_lock:
+            try:
+                unwritten = self._write_rows(batch)
+                if unwritten:
+                    logging.error(f"Spooling {len(unwritten)} history logs")
+                    self._append(self.spool_path, [self._line(row) for row in unwritten])
+            finally:
+                with self._progress:
+                    self._handled += len(batch)
+                    self._progress.notify_all()
+            if not unwritten:
+                self._replay_spool()
+
+    def _insert(self, rows: List[Dict[str, Any]], skip_existing: bool = False) -> None:
+        with SessionLocal() as db:
+            if skip_existing:
+                # Another worker may already have replayed part of the spool
+                existing = set(
+                    db.execute(
+                        select(HistoryLog.id).where(
+                            HistoryLog.id.in_([row["id"] for row in rows])
+                        )
+                    ).scalars()
+                )
+                rows = [row for row in rows if row["id"] not in existing]
+            if rows:
+                encoded = [self._encode(row) for row in rows]
+                db.execute(insert(HistoryLog), encoded)
+                stats_recorder.apply(db, stats_recorder.new_log_deltas(encoded))
+                search_index.add(db, encoded)
+            db.commit()
+
+    def _write_rows(
+        self, rows: List[Dict[str, Any]], skip_existing: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Insert rows in one transaction, or one by one if that fails for another reason
+        than the connection; rows that still fail are moved to the dead-letter file.
+
+        Returns:
+            List[Dict[str, Any]]: The rows left unwritten because MySQL is unreachable.
+        """
+        try:
+            self._insert(rows, skip_existing)
+            return []
+        except CONNECTION_ERRORS as e:
+            logging.error(f"Writing {len(rows)} history logs failed: {e}")
+            return rows
+        except Exception as e:
+            logging.error(f"Writing {len(rows)} history logs failed, retrying each: {e}")
+        for index, row in enumerate(rows):
+            try:
+                self._insert([row], skip_existing)
+            except CONNECTION_ERRORS as e:
+                logging.error(f"Writing history logs failed: {e}")
+                return rows[index:]
+            except Exception as e:
+                logging.error(
+                    f"Moving history log {row.get('id')} to {self.dead_letter_path}: {e}"
+                )
+                self._append(self.dead_letter_path, [self._line(row)])
+        return []
+
+    @staticmethod
+    def _encode(row: Dict[str, Any]) -> Dict[str, Any]:
+        # Queued and spooled rows keep the rendered prompt; it is stored compactly here
+        row = dict(row)
+        reference = row.pop("prompt_reference", None)
+        row.update(prompt_storage.encode(row["prompt"], reference))
+        return row
+
+    @staticmethod
+    def _line(row: Dict[str, Any]) -> str:
+        if isinstance(row.get("created_at"), datetime):
+            row = dict(row, created_at=row["created_at"].isoformat())
+        return json.dumps(row, ensure_ascii=False) + "\n"
+
+    @staticmethod
+    def _append(path: str, lines: List[str]) -> None:
+        with open(path, "a", encoding="utf-8") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.writelines(lines)
+                file.flush()
+                os.fsync(file.fileno())
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _rewrite(spool, lines: List[str]) -> None:
+        spool.seek(0)
+        spool.truncate()
+        spool.writelines(lines)
+        spool.flush()
+        os.fsync(spool.fileno())
+
+    def _replay_spool(self) -> None:
+        if not os.path.exists(self.spool_path) or not os.path.getsize(self.spool_path):
+            return
+        with open(self.spool_path, "r+", encoding="utf-8") as spool:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+            try:
+                rows = []
+                for line in spool:
+                    if not line.strip():
+                        continue
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        logging.error(f"Moving a corrupt spool line to {self.dead_letter_path}")
+                        self._append(self.dead_letter_path, [line])
+                if any(row.get("id") is None for row in rows):
+                    # Ids are written back to the spool before the insert, so a replay
+                    # interrupted after its commit cannot insert these rows twice
+                    for row in rows:
+                        if row.get("id") is None:
+                            row["id"] = self.allocator.next_id()
+                    self._rewrite(spool, [self._line(row) for row in rows])
+
+                remaining = []
+                for start in range(0, len(rows), self.batch_size):
+                    chunk = [
+                        dict(row, created_at=datetime.fromisoformat(row["created_at"]))
+                        for row in rows[start : start + self.batch_size]
+                    ]
+                    unwritten = self._write_rows(chunk, skip_existing=True)
+                    if unwritten:
+                        remaining = rows[start + len(chunk) - len(unwritten) :]
+                        break
+                # Committed chunks leave the spool; the rest waits for the next replay
+                self._rewrite(spool, [self._line(row) for row in remaining])
+                logging.info(
+                    f"Replayed {len(rows) - len(remaining)} spooled history logs, "
+                    f"{len(remaining)} left"
+                )
+            except Exception as e:
+                logging.error(f"Replaying spooled history logs failed: {e}")
+            finally:
+                fcntl.flock(spool, fcntl.LOCK_UN)
+
+history_log_writer = HistoryLogWriter()
@@ -0,0 +1,26 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+LLM_REQUESTS = Counter(
+    "llm_requests_total",
+    "Number of LLM generations by route",
+    ["route"],
+)
+LLM_LATENCY = Histogram(
+    "llm_latency_seconds",
+    "LLM generation latency by route",
+    ["route"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+LLM_ERRORS = Counter(
+    "llm_errors_total",
+    "Number of failed LLM generations by route",
+    ["route"],
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth",
+    "Number of LLM generations running or waiting in this worker",
+)
+LLM_BUDGET_LEVEL = Gauge(
+    "llm_budget_level",
+    "Current generation budget level (0 = full budget)",
+)
@@ -3,6 +3,7 @@ from fastapi.requests import Request
 import time
 import logging
 from fastapi.middleware.cors import CORSMiddleware
+from src.db.database import QueryCounter, query_counter
 
 logger = logging.getLogger("uvicorn.access")
 logger.disabled = True
@@ -13,11 +14,16 @@ def register_middleware(app: FastAPI):
     @app.middleware("http")
     async def custom_logging(request: Request, call_next):
         start_time = time.time()
+        counter = QueryCounter()
+        token = query_counter.set(counter)
 
-        response = await call_next(request)
+        try:
+            response = await call_next(request)
+        finally:
+            query_counter.reset(token)
         processing_time = time.time() - start_time
 
-        message = f"{request.client.host}:{request.client.port} - {request.method} - {request.url.path} - {response.status_code} completed after {processing_time}s"
+        message = f"{request.client.host}:{request.client.port} - {request.method} - {request.url.path} - {response.status_code} completed after {processing_time}s with {counter.count} queries"
 
         print(message)
         return response
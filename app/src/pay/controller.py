@@ -3,6 +3,7 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import List
 from .schemas import CreatePaymentSchema, PaymentResponseSchema, PayStatus
 from .service import PayService, payOS
 from src.auth.service import UserService
@@ -38,6 +39,23 @@ async def create_payment(
     )
     return payment
 
+@pay_router.get("/", response_model=List[PaymentResponseSchema])
+def get_payments(
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> List[PaymentResponseSchema]:
+    """
+    List the purchase orders of the logged-in user, newest first.
+
+    Args:
+        db (Session): The database session.
+        current_user: The logged-in user.
+
+    Returns:
+        List[PaymentResponseSchema]: The user's purchase orders.
+    """
+    return pay_service.get_purchase_orders_by_user(db=db, user=current_user)
+
 @pay_router.post("/webhook")
 async def payment_webhook(request: Request, db: Session = Depends(get_db),):
     try:
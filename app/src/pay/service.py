@@ -2,7 +2,6 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 from src.db.models import Payment, User
-from src.auth.service import UserService
 from src.errors import UserNotFound, PaymentNotFound
 from .schemas import CreatePaymentSchema, PaymentResponseSchema
 from src.auth.schemas import UserResponse
@@ -16,8 +15,6 @@ api_key = os.environ.get("PAYOS_API_KEY")
 checksum_key = os.environ.get("PAYOS_CHECKSUM_KEY")
 payOS = PayOS(client_id=client_id, api_key=api_key, checksum_key=checksum_key)
 
-user_service = UserService()
-
 
 class PayService:
     """
@@ -69,26 +66,24 @@ class PayService:
             raise Exception(f"Database error while creating purchase order: {str(e)}")
 
     def get_purchase_orders_by_user(
-        self, db: Session, user_email: str
+        self, db: Session, user: UserResponse
     ) -> list[Payment]:
         """
         Retrieve all purchase orders associated with a given user.
 
         Args:
             db (Session): The database session.
-            user_email (str): The email address of the user.
+            user (UserResponse): The authenticated user, already loaded.
 
         Returns:
             list[Payment]: A list of payment objects associated with the user.
-
-        Raises:
-            UserNotFound: If the user cannot be found.
         """
-        user = user_service.get_user_by_email(user_email, db)
-        if not user:
-            raise UserNotFound()
-
-        return db.query(Payment).filter_by(user_id=user.id).all()
+        return (
+            db.query(Payment)
+            .filter_by(user_id=user.uid)
+            .order_by(Payment.created_at.desc())
+            .all()
+        )
 
     def update_purchase_order_status(
         self, db: Session, order_id: int, new_status: str
@@ -0,0 +1,50 @@
+import hashlib
+from typing import Any, Optional
+from fastapi import Request, Response
+
+# Per-user responses: only the browser may keep them, and must revalidate each time
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag from the values a response is derived from.
+
+    Args:
+        *parts (Any): The values, e.g. a version number and the requested fields.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    digest = hashlib.sha1("\x1f".join(map(str, parts)).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def not_modified(
+    request: Request, response: Response, etag: str, cache_control: str
+) -> Optional[Response]:
+    """
+    Set the ETag and Cache-Control headers and check the request's If-None-Match.
+
+    Args:
+        request (Request): The request.
+        response (Response): The response the route will return, for the headers.
+        etag (str): The ETag of the current representation.
+        cache_control (str): The Cache-Control header value.
+
+    Returns:
+        Optional[Response]: A 304 response if the client already has this representation,
+        otherwise None and the route returns its body as usual.
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison; CDNs may weaken the ETags they pass on
+    if "*" in candidates or etag in [c.removeprefix("W/") for c in candidates]:
+        return Response(
+            status_code=304, headers={"ETag": etag, "Cache-Control": cache_control}
+        )
+    return None
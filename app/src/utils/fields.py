@@ -0,0 +1,78 @@
+from typing import Any, Iterable, List, Optional, Type
+from fastapi import Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from src.errors import InvalidFields
+
+
+class SparseFields:
+    """
+    Dependency parsing a `fields=` query parameter into the fields to return.
+
+    Listings use it to select only the matching columns and serialize only the requested
+    fields. Without the parameter, every field of the response model is returned.
+    """
+
+    def __init__(self, model: Type[BaseModel], required: Iterable[str] = ("id",)):
+        """
+        Initialize the dependency for a response model.
+
+        Args:
+            model (Type[BaseModel]): The response model whose fields can be requested.
+            required (Iterable[str]): Fields that are always returned.
+        """
+        self.allowed = set(model.model_fields)
+        self.required = list(required)
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(
+            None, description="Comma-separated fields to return, e.g. `id,question`"
+        ),
+    ) -> Optional[List[str]]:
+        """
+        Parse the requested fields.
+
+        Args:
+            fields (Optional[str]): The comma-separated field names.
+
+        Returns:
+            Optional[List[str]]: The fields to return, or None to return every field.
+
+        Raises:
+            InvalidFields: If a field is not part of the response model.
+        """
+        if not fields:
+            return None
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        if not requested or not self.allowed.issuperset(requested):
+            raise InvalidFields()
+        return list(dict.fromkeys(self.required + requested))
+
+
+def sparse_response(
+    content: Any, fields: Optional[List[str]], response: Optional[Response] = None
+) -> Any:
+    """
+    Return a listing as is, or as JSON limited to the fields set on it.
+
+    Sparse items are built without their other fields, so they cannot go through the
+    route's `response_model`; they are encoded directly instead.
+
+    Args:
+        content (Any): The listing returned by the service.
+        fields (Optional[List[str]]): The requested fields, or None for every field.
+        response (Optional[Response]): The route's response, whose headers (e.g. ETag
+            and Cache-Control) are copied onto the JSONResponse.
+
+    Returns:
+        Any: The listing, or a JSONResponse with only the requested fields.
+    """
+    if fields is None:
+        return content
+    headers = dict(response.headers) if response is not None else None
+    if headers is not None:
+        # Recomputed by the JSONResponse for its own body
+        headers.pop("content-length", None)
+    return JSONResponse(jsonable_encoder(content, exclude_unset=True), headers=headers)
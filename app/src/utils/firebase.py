@@ -1,6 +1,10 @@
 import firebase_admin
 from firebase_admin import credentials, storage
 import os
+from typing import BinaryIO
+
+# Resumable uploads send the file in chunks of this size (a multiple of 256 KB)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 # Initialize Firebase Admin SDK
@@ -15,3 +19,16 @@ def upload_file_to_firebase(file_path: str, file_name: str):
     blob.upload_from_filename(file_path)
     blob.make_public()
     return blob.public_url
+
+
+def upload_stream_to_firebase(file: BinaryIO, file_name: str, content_type: str):
+    """
+    Upload a file object to Firebase Storage in chunks, without reading it into memory.
+
+    Blocking; call it from a worker thread in async code.
+    """
+    bucket = storage.bucket()
+    blob = bucket.blob(file_name, chunk_size=UPLOAD_CHUNK_SIZE)
+    blob.upload_from_file(file, content_type=content_type, rewind=True)
+    blob.make_public()
+    return blob.public_url
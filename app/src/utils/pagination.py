@@ -0,0 +1,41 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+from src.errors import InvalidCursor
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """
+    Encode the position of a row in a (created_at, id) ordered listing as an opaque cursor.
+
+    Args:
+        created_at (datetime): The creation time of the last row of the page.
+        id (int): The ID of the last row of the page.
+
+    Returns:
+        str: The URL-safe cursor.
+    """
+    raw = json.dumps([created_at.isoformat(), id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): The cursor.
+
+    Returns:
+        Tuple[datetime, int]: The creation time and ID of the row the cursor points at.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise InvalidCursor()
@@ -0,0 +1,178 @@
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Tuple
+from redis.exceptions import RedisError
+from src.config import Config
+from src.errors import RateLimitExceeded
+from src.utils.redis import redis_client
+
+RATE_LIMIT_PREFIX = "ratelimit"
+
+# KEYS: bucket keys; ARGV[1]: cost, then the capacity and refill rate (tokens/s) of
+# each bucket in KEYS order. Returns {allowed, retry_after_ms}. The tokens are taken
+# from every bucket or from none. The time is taken from Redis so that every worker
+# refills the buckets against the same clock.
+TOKEN_BUCKET_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local tokens = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call("HMGET", key, "tokens", "updated_at")
+    local available = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    available = math.min(capacity, available + math.max(0, now - updated_at) * rate)
+    if available < cost then
+        retry_after = math.max(retry_after, math.ceil((cost - available) / rate * 1000))
+    end
+    tokens[i] = available
+end
+
+local allowed = 0
+if retry_after == 0 then
+    allowed = 1
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    if allowed == 1 then
+        tokens[i] = tokens[i] - cost
+    end
+    redis.call("HSET", key, "tokens", tostring(tokens[i]), "updated_at", tostring(now))
+    redis.call("PEXPIRE", key, math.ceil(capacity / rate * 1000) + 1000)
+end
+return {allowed, retry_after}
+"""
+
+# A bucket: its key, capacity and refill rate (tokens/s)
+Bucket = Tuple[str, float, float]
+
+
+class TokenBucketLimiter:
+    """
+    Token-bucket rate limiter shared by all workers through Redis.
+
+    Each bucket holds up to `capacity` tokens and refills at `rate` tokens per second; a
+    request takes `cost` tokens from each of its buckets, or is refused with the time
+    until all of them have enough tokens again. The check-and-take runs as one Lua
+    script over all the buckets, so concurrent requests cannot overdraw a bucket and a
+    refused request takes nothing from any of them. If Redis is unreachable, the buckets
+    are kept in process memory instead, which limits each worker separately until Redis
+    is back.
+    """
+
+    def __init__(self):
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._lock = threading.Lock()
+        self._local: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, buckets: List[Bucket], cost: float = 1) -> float:
+        """
+        Take `cost` tokens from every bucket, or from none of them.
+
+        Args:
+            buckets (List[Bucket]): The (key, capacity, rate) of each bucket, e.g.
+                ("user:<uid>", 20, 0.2). The capacity is the allowed burst and the rate
+                the number of tokens added back per second.
+            cost (float): The number of tokens the request needs.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the number of seconds to wait
+            before retrying.
+        """
+        args: List[float] = [cost]
+        for _, capacity, rate in buckets:
+            args += [capacity, rate]
+        try:
+            allowed, retry_after_ms = self._script(
+                keys=[f"{RATE_LIMIT_PREFIX}:{key}" for key, _, _ in buckets], args=args
+            )
+            return 0.0 if allowed else retry_after_ms / 1000
+        except RedisError as e:
+            logging.warning(f"Rate limiter falling back to local buckets: {e}")
+            return self._take_local(buckets, cost)
+
+    def _take_local(self, buckets: List[Bucket], cost: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens = {}
+            retry_after = 0.0
+            for key, capacity, rate in buckets:
+                available, updated_at = self._local.get(key, (capacity, now))
+                tokens[key] = min(capacity, available + (now - updated_at) * rate)
+                if tokens[key] < cost:
+                    retry_after = max(retry_after, (cost - tokens[key]) / rate)
+            for key, _, _ in buckets:
+                self._local[key] = (tokens[key] - (0 if retry_after else cost), now)
+            return retry_after
+
+
+class ChatRateLimiter:
+    """
+    Limits chat requests per user, by role, and per character, across all users.
+
+    The user bucket keeps one client from monopolising the LLM; the character bucket
+    bounds the total load a single character can put on it.
+    """
+
+    def __init__(
+        self,
+        role_limits: Dict[str, Dict[str, float]] = Config.CHAT_RATE_LIMITS,
+        character_limit: Dict[str, float] = Config.CHAT_CHARACTER_RATE_LIMIT,
+        character_overrides: Dict[
+            str, Dict[str, float]
+        ] = Config.CHAT_CHARACTER_RATE_LIMIT_OVERRIDES,
+    ):
+        self.role_limits = role_limits
+        self.character_limit = character_limit
+        self.character_overrides = character_overrides
+        self.limiter = TokenBucketLimiter()
+
+    def check(self, user_uid: str, role: str, character_id: int, cost: int = 1) -> None:
+        """
+        Take `cost` requests from the user's and the character's buckets.
+
+        Both buckets are checked before either is charged, so a request refused by the
+        character's bucket does not use up the user's, and the other way round.
+
+        Args:
+            user_uid (str): The unique identifier of the user.
+            role (str): The role of the user, which selects the user's limit.
+            character_id (int): The ID of the character being asked.
+            cost (int): The number of questions in the request.
+
+        Raises:
+            RateLimitExceeded: If either bucket does not have enough tokens left, or the
+            request costs more than a bucket can ever hold.
+        """
+        user_limit = self.role_limits.get(role, self.role_limits.get("user"))
+        character_limit = self.character_overrides.get(
+            str(character_id), self.character_limit
+        )
+        buckets = [
+            (key, limit["capacity"], limit["rate"])
+            for key, limit in (
+                (f"user:{user_uid}", user_limit),
+                (f"character:{character_id}", character_limit),
+            )
+            if limit
+        ]
+        if not buckets:
+            return
+        # A request larger than the burst could never pass; it is refused without taking
+        # anything, and the client has to split it
+        for _, capacity, rate in buckets:
+            if cost > capacity:
+                raise RateLimitExceeded(retry_after=max(1, math.ceil(capacity / rate)))
+        retry_after = self.limiter.take(buckets, cost)
+        if retry_after:
+            raise RateLimitExceeded(retry_after=max(1, math.ceil(retry_after)))
+
+
+chat_rate_limiter = ChatRateLimiter()
@@ -1,4 +1,5 @@
 import aioredis
+import redis
 from src.config import Config
 
 JTI_EXPIRY = 3600
@@ -7,6 +8,15 @@ token_blocklist = aioredis.StrictRedis(
     host=Config.REDIS_HOST, port=Config.REDIS_PORT, db=0
 )
 
+async_redis_client = aioredis.StrictRedis(
+    host=Config.REDIS_HOST, port=Config.REDIS_PORT, db=0, decode_responses=True
+)
+
+# Client đồng bộ cho các service chạy trong threadpool (chat, cache, ...)
+redis_client = redis.StrictRedis(
+    host=Config.REDIS_HOST, port=Config.REDIS_PORT, db=0, decode_responses=True
+)
+
 
 async def add_jti_to_blocklist(jti: str) -> None:
     await token_blocklist.set(name=jti, value="", ex=JTI_EXPIRY)
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import uuid
+import pytest
+
+# The tests run against a throwaway SQLite database, never the configured one
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+
+from src.auth.utils import create_access_token
+from src.db.database import SessionLocal, init_db
+from src.db.models import Character, User
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    init_db()
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as db:
+        yield db
+
+
+@pytest.fixture
+def user(db) -> User:
+    uid = str(uuid.uuid4())
+    user = User(
+        uid=uid,
+        username=f"user-{uid[:8]}",
+        email=f"{uid}@example.com",
+        password_hash="x",
+        role="user",
+        balance=100,
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def auth_headers(user) -> dict:
+    token = create_access_token({"email": user.email, "user_uid": user.uid})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def character(db) -> Character:
+    short_name = f"c{uuid.uuid4().hex[:8]}"
+    character = Character(short_name=short_name, name=short_name.upper(), new_price=10)
+    db.add(character)
+    db.commit()
+    return character
@@ -0,0 +1,157 @@
+"""
+Query plans of the service queries on history_logs, payments and user_character.
+
+The SQL each service method emits is captured and explained, so the tests follow the
+code: each query must be served by its index, including the ORDER BY, rather than by a
+full scan or a sort.
+"""
+import re
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Tuple
+import pytest
+from sqlalchemy import event
+from src.characters.catalog import catalog_cache
+from src.characters.ownership import ownership_cache
+from src.characters.service import CharacterService
+from src.db.database import engine
+from src.db.models import user_character_association
+from src.history_logs.service import HistoryLogService
+from src.pay.service import PayService
+from src.utils.pagination import encode_cursor
+
+history_service = HistoryLogService()
+character_service = CharacterService()
+pay_service = PayService()
+
+
+@contextmanager
+def captured_selects():
+    """
+    Collect the SELECT statements, with their parameters, sent to the database.
+    """
+    statements: List[Tuple[str, tuple]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def explain(db, statement: str, parameters) -> str:
+    """
+    Get the plan of a statement as text: EXPLAIN QUERY PLAN on SQLite, EXPLAIN on MySQL.
+    """
+    dialect = db.get_bind().dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    rows = db.connection().exec_driver_sql(prefix + statement, parameters)
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+
+# The table list of a SELECT, up to its first clause
+FROM_CLAUSE = re.compile(r"\bFROM\s+(.*?)(?:\bWHERE\b|\bORDER BY\b|\bLIMIT\b|$)", re.S)
+
+
+def reads(statement: str, table: str) -> bool:
+    tables = FROM_CLAUSE.search(statement)
+    return tables is not None and re.search(rf"\b{table}\b", tables.group(1)) is not None
+
+
+def plan_of(db, statements, table: str) -> str:
+    """
+    Get the plan of the one captured statement reading `table`.
+    """
+    matching = [
+        (statement, parameters)
+        for statement, parameters in statements
+        if reads(statement, table)
+    ]
+    assert len(matching) == 1, statements
+    return explain(db, *matching[0])
+
+
+def assert_uses_index(plan: str, index: str) -> None:
+    assert index in plan, plan
+    assert "TEMP B-TREE" not in plan and "filesort" not in plan, plan
+
+
+# An old cursor, so the keyset condition is part of the query
+CURSOR = encode_cursor(datetime(2000, 1, 1), 1)
+
+
+@pytest.mark.parametrize("cursor", [None, CURSOR])
+def test_logs_by_user_id_use_index(db, user, cursor):
+    # GET /log/me
+    with captured_selects() as statements:
+        history_service.get_history_logs_by_user_id(db, user.uid, 10, cursor)
+
+    assert_uses_index(
+        plan_of(db, statements, "history_logs"), "ix_history_logs_user_created"
+    )
+
+
+def test_logs_by_user_email_use_index(db, user):
+    # GET /log/user
+    with captured_selects() as statements:
+        history_service.get_history_logs_by_user(db, user.email, 10, CURSOR)
+
+    assert_uses_index(
+        plan_of(db, statements, "history_logs"), "ix_history_logs_user_created"
+    )
+
+
+@pytest.mark.parametrize("cursor", [None, CURSOR])
+def test_logs_by_character_use_index(db, character, cursor):
+    # GET /log/character/{character_id}
+    with captured_selects() as statements:
+        history_service.get_history_logs_by_character(db, character.id, 10, cursor)
+
+    assert_uses_index(
+        plan_of(db, statements, "history_logs"), "ix_history_logs_character_created"
+    )
+
+
+def test_payments_by_user_use_index(db, user):
+    # GET /pay/
+    with captured_selects() as statements:
+        pay_service.get_purchase_orders_by_user(db, user)
+
+    assert_uses_index(plan_of(db, statements, "payments"), "ix_payments_user_created")
+
+
+def test_user_characters_use_primary_keys(db, user):
+    # GET /characters/users, with both caches cold
+    catalog_cache.invalidate()
+    ownership_cache.invalidate(user.uid)
+    with captured_selects() as statements:
+        character_service.get_user_characters(user, db)
+
+    # The (user_uid, character_id) primary key; SQLite names it sqlite_autoindex_...
+    ownership = plan_of(db, statements, "user_character")
+    assert any(
+        key in ownership for key in ("sqlite_autoindex_user_character_1", "PRIMARY")
+    ), ownership
+    # The whole catalog is read, in primary-key order without a sort
+    catalog = plan_of(db, statements, "characters")
+    assert "TEMP B-TREE" not in catalog and "filesort" not in catalog, catalog
+
+
+def test_character_owners_use_index(db, user, character):
+    # DELETE /characters/{character_id} loads the owners to delete their user_character rows
+    db.execute(
+        user_character_association.insert().values(
+            user_uid=user.uid, character_id=character.id
+        )
+    )
+    db.commit()
+    with captured_selects() as statements:
+        character_service.delete_character(character.id, db)
+
+    assert "ix_user_character_character_user" in plan_of(
+        db, statements, "user_character"
+    )
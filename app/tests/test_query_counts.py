@@ -0,0 +1,86 @@
+"""
+Number of SQL statements issued by the hot authenticated endpoints.
+
+The authenticated user is loaded once by `get_current_user` and passed down, so these
+counts only grow if a service starts querying the user (or anything else) again.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.characters.controller import char_router
+from src.chat.controller import chat_router
+from src.chat.service import ChatService
+from src.db.database import QueryCounter, query_counter
+from src.db.models import Payment, user_character_association
+from src.errors import register_error_handlers
+from src.pay.controller import pay_router
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    register_error_handlers(app)
+    app.include_router(char_router, prefix="/characters")
+    app.include_router(chat_router, prefix="/chat")
+    app.include_router(pay_router, prefix="/pay")
+    app.state.counters = []
+
+    @app.middleware("http")
+    async def count_queries(request, call_next):
+        counter = QueryCounter()
+        token = query_counter.set(counter)
+        try:
+            return await call_next(request)
+        finally:
+            query_counter.reset(token)
+            app.state.counters.append(counter)
+
+    client = TestClient(app)
+    client.queries = lambda: app.state.counters[-1].count
+    return client
+
+
+def test_chat_queries(client, db, user, auth_headers, character, monkeypatch):
+    monkeypatch.setattr(
+        ChatService,
+        "_generate",
+        lambda self, question, short_name, name: ("prompt", "answer", None),
+    )
+    db.execute(
+        user_character_association.insert().values(
+            user_uid=user.uid, character_id=character.id
+        )
+    )
+    db.commit()
+    body = {"character_id": character.id, "question": "Xin chào?"}
+
+    # The first request warms the ownership cache and reserves a block of log ids
+    assert client.post("/chat/", json=body, headers=auth_headers).status_code == 200
+    response = client.post("/chat/", json=body, headers=auth_headers)
+
+    assert response.status_code == 200
+    # The user by email and the character by id; the log is written behind
+    assert client.queries() == 2
+
+
+def test_buy_character_queries(client, user, auth_headers, character):
+    response = client.post(
+        f"/characters/buy-character/{character.id}", headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    # The user, the character, the owned characters, the user_character INSERT and
+    # the balance UPDATE; nothing is reloaded after the commit
+    assert client.queries() == 5
+
+
+def test_purchase_list_queries(client, db, user, auth_headers):
+    db.add(Payment(user_id=user.uid, amount=3000, status="PENDING"))
+    db.commit()
+
+    response = client.get("/pay/", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    # The user and their payments
+    assert client.queries() == 2
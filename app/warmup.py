@@ -0,0 +1,124 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy.orm import Session
+from src.db.database import SessionLocal
+from src.db.models import Character
+from src.AI.service import AIService
+from src.AI.setup import get_collection
+from src.AI.cache import AnswerCache
+from src.AI.scheduler import LOW
+from src.config import Config
+from src.utils.redis import redis_client
+
+answer_cache = AnswerCache()
+
+# Giữ tiến độ lâu hơn TTL của cache để lần chạy lại không làm lại các câu đã xong
+PROGRESS_TTL = Config.ANSWER_CACHE_TTL * 2
+
+
+def progress_key(short_name: str) -> str:
+    version = answer_cache.version(short_name)
+    return f"warmup:{short_name}:{version}:done"
+
+
+def warm_question(short_name: str, name: str, question: str) -> None:
+    if answer_cache.get(short_name, question):
+        return
+    prompt, answer = AIService.rag(question, short_name, name, priority=LOW)
+    answer_cache.set(short_name, question, prompt, answer)
+
+
+def warm_character(character: Character, concurrency: int, reset: bool = False):
+    short_name = character.short_name
+    if reset:
+        version = answer_cache.invalidate(short_name)
+        print(f"[{short_name}] Answer cache invalidated, now at version {version}")
+
+    key = progress_key(short_name)
+    done = redis_client.smembers(key)
+    pending, seen = [], set(done)
+    for doc in AIService.list_questions(get_collection(short_name)):
+        normalized = answer_cache.normalize(doc["question"])
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+        pending.append(doc)
+
+    total = len(pending) + len(done)
+    completed, failed = len(done), 0
+    print(f"[{short_name}] {completed}/{total} questions already warmed")
+    started_at = time.time()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(warm_question, short_name, character.name, doc["question"]): doc
+            for doc in pending
+        }
+        for future in as_completed(futures):
+            doc = futures[future]
+            try:
+                future.result()
+                redis_client.sadd(key, answer_cache.normalize(doc["question"]))
+                redis_client.expire(key, PROGRESS_TTL)
+                completed += 1
+            except Exception as e:
+                failed += 1
+                print(f"[{short_name}] Error warming question {doc['id']}: {e}")
+            if (completed + failed) % 20 == 0 or completed + failed == total:
+                elapsed = time.time() - started_at
+                print(
+                    f"[{short_name}] {completed}/{total} warmed, {failed} failed "
+                    f"({completed * 100 / max(total, 1):.1f}%, {elapsed:.0f}s)"
+                )
+
+    print(f"[{short_name}] Warm-up finished: {completed}/{total} warmed, {failed} failed")
+
+
+def warm_up(short_names: list[str], concurrency: int, reset: bool = False):
+    db: Session = SessionLocal()
+    try:
+        query = db.query(Character)
+        if short_names:
+            query = query.filter(Character.short_name.in_(short_names))
+        characters = query.all()
+    finally:
+        db.close()
+
+    if not characters:
+        print("Error: No characters found!")
+        return
+    for character in characters:
+        try:
+            warm_character(character, concurrency, reset)
+        except Exception as e:
+            print(f"Error warming up character {character.short_name}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Precompute answers for the questions in each character's knowledge base."
+    )
+    parser.add_argument(
+        "short_names", nargs="*", help="Characters to warm up (default: all)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=Config.WARMUP_CONCURRENCY,
+        help="Maximum number of concurrent generations",
+    )
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="Invalidate cached answers first (use after the character's data changes)",
+    )
+    args = parser.parse_args()
+
+    # os.nice chỉ hạ độ ưu tiên CPU của chính tiến trình này (embedding, dựng prompt), không
+    # ảnh hưởng tới LLM. Việc nhường LLM cho API do LLMScheduler đảm nhận: các lượt sinh
+    # priority=LOW chờ đến khi không còn yêu cầu nào của người dùng trong tập llm:inflight
+    # trên Redis, do mọi worker API cùng ghi vào.
+    os.nice(10)
+    warm_up(args.short_names, args.concurrency, args.reset)